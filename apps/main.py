@@ -35,6 +35,7 @@ def main() -> None:
     # 可用环境变量控制（仅 UI 层参数）
     max_turns = int(os.getenv("CLI_MAX_TURNS", "20"))
     enable_tools = (os.getenv("CLI_ENABLE_TOOLS", "1").strip() in ("1", "true", "yes", "y", "on"))
+    stream = (os.getenv("CLI_STREAM", "0").strip() in ("1", "true", "yes", "y", "on"))
 
     sb = SecondBrain(mode="self", max_turns=max_turns, enable_tools=enable_tools)
 
@@ -55,6 +56,17 @@ def main() -> None:
         if isinstance(mapped, str):
             user_input = mapped
 
+        if stream:
+            # 流式输出：首个 token 到达即打印，不用等整段生成完
+            print("\nSecond Brain:")
+            try:
+                for piece in sb.stream_answer(user_input):
+                    print(piece, end="", flush=True)
+                print()
+            except Exception as e:
+                print(f"\n[Error] {e}")
+            continue
+
         try:
             reply = sb.answer(user_input)
         except Exception as e:
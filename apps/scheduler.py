@@ -1,13 +1,14 @@
 from __future__ import annotations
 
+import json
 import os
 import sys
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import redirect_stderr, redirect_stdout
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Callable, Optional
 
 _ROOT = Path(__file__).resolve().parents[1]
 if str(_ROOT) not in sys.path:
@@ -17,11 +18,14 @@ import schedule
 
 from connectors.notion_sync import fetch_updates as notion_fetch_updates
 from connectors.x_sync import fetch_updates as x_fetch_updates
+from core.config import env_float, env_int, env_str
 from core.processor import run_incremental_ingest, update_user_profile_incremental
+from infra.dag import Step, run_dag
 
 
 _LOG_DIR = _ROOT / "logs"
 _LOG_PATH = _LOG_DIR / "scheduler.log"
+_RUNS_PATH = _LOG_DIR / "scheduler_runs.jsonl"
 
 
 def _now() -> str:
@@ -34,18 +38,27 @@ def _append_log(line: str) -> None:
         f.write(line.rstrip() + "\n")
 
 
-def _run_step(name: str, fn: Callable[[], object]) -> bool:
+def _step_timeouts() -> dict[str, float]:
     """
-    单步执行：异常捕获 + 记录，保证 scheduler 不崩。
+    SB_SCHEDULER_TIMEOUTS=notion_sync=900,x_sync=900,ingest=1800,profile_update=1800
+    未列出的步骤用 SB_SCHEDULER_STEP_TIMEOUT（秒，<=0 表示不限时）。
     """
-    try:
-        _append_log(f"[{_now()}] step.start {name}")
-        fn()
-        _append_log(f"[{_now()}] step.ok {name}")
-        return True
-    except Exception:
-        _append_log(f"[{_now()}] step.fail {name}\n{traceback.format_exc()}")
-        return False
+    out: dict[str, float] = {}
+    for part in env_str("SB_SCHEDULER_TIMEOUTS", "").split(","):
+        if "=" not in part:
+            continue
+        name, sec = part.split("=", 1)
+        try:
+            out[name.strip()] = float(sec.strip())
+        except Exception:
+            continue
+    return out
+
+
+def _append_run_record(record: dict) -> None:
+    _LOG_DIR.mkdir(parents=True, exist_ok=True)
+    with _RUNS_PATH.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
 
 
 def _get_x_usernames() -> list[str]:
@@ -60,36 +73,112 @@ def _get_x_usernames() -> list[str]:
     return out
 
 
+def _x_sync_one(username: str) -> dict:
+    """
+    单个账号的 X 同步：吞掉异常（不影响其他账号），记录耗时与新增条数。
+    """
+    name = f"x_sync.fetch_updates @{username}"
+    t0 = time.perf_counter()
+    _append_log(f"[{_now()}] step.start {name}")
+    try:
+        n = int(x_fetch_updates(username) or 0)
+        ok = True
+    except Exception:
+        n = 0
+        ok = False
+        _append_log(f"[{_now()}] step.fail {name}\n{traceback.format_exc()}")
+    elapsed = time.perf_counter() - t0
+    if ok:
+        _append_log(f"[{_now()}] step.ok {name} tweets={n} seconds={elapsed:.2f}")
+    return {"user": username, "ok": ok, "tweets": n, "seconds": round(elapsed, 2)}
+
+
+def _run_x_sync(usernames: list[str]) -> list[dict]:
+    """
+    多账号并发同步（X_SYNC_CONCURRENCY 个线程）；RapidAPI 的总请求速率由 x_sync 的共享限速器控制，
+    x_state.json 的写入在 x_sync 内加锁合并。
+    """
+    workers = max(1, min(env_int("X_SYNC_CONCURRENCY", "4"), len(usernames)))
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="x_sync") as pool:
+        results = list(pool.map(_x_sync_one, usernames))
+    summary = " ".join(
+        f"@{r['user']}={r['tweets'] if r['ok'] else 'fail'}/{r['seconds']}s" for r in results
+    )
+    _append_log(
+        f"[{_now()}] x_sync.summary accounts={len(results)} workers={workers} "
+        f"tweets={sum(r['tweets'] for r in results)} seconds={time.perf_counter() - t0:.2f} {summary}"
+    )
+    return results
+
+
+def _build_steps() -> list[Step]:
+    """
+    每日任务的依赖图：
+      notion_sync ─┐
+                   ├─> ingest ─> profile_update
+      x_sync ──────┘
+    两个 sync 互不依赖、并行执行；sync 失败不阻止 ingest（已落盘的 raw 照常入库），
+    sync 超时且轮到 ingest 时仍在后台写 raw，则跳过 ingest（避免读到写了一半的文件，下次运行再补），
+    超时的 sync 在此之前已跑完则照常 ingest；ingest 超时则跳过 profile_update（ingest 仍在后台追加 corpus）。
+    """
+    default_timeout = env_float("SB_SCHEDULER_STEP_TIMEOUT", "3600")
+    timeouts = _step_timeouts()
+
+    def _t(name: str) -> float:
+        return timeouts.get(name, default_timeout)
+
+    steps = [Step("notion_sync", lambda: notion_fetch_updates(), timeout=_t("notion_sync"))]
+    usernames = _get_x_usernames()
+    if usernames:
+        steps.append(Step("x_sync", lambda: _run_x_sync(usernames), timeout=_t("x_sync")))
+    else:
+        print(f"[{_now()}] step.skip x_sync.fetch_updates (X_USERNAMES empty)")
+    syncs = tuple(s.name for s in steps)
+    steps.append(Step("ingest", lambda: run_incremental_ingest(full=False), deps=syncs, timeout=_t("ingest")))
+    steps.append(
+        Step("profile_update", lambda: update_user_profile_incremental(), deps=("ingest",), timeout=_t("profile_update"), strict=True)
+    )
+    return steps
+
+
 def run_daily_job() -> None:
     """
-    每日任务：按顺序执行
-    1) Notion sync
-    2) X sync（按 X_USERNAMES）
-    3) ingest（增量）
-    4) profile_update（增量）
+    每日任务：按依赖图执行（见 _build_steps）
+    1) Notion sync 与 X sync（按 X_USERNAMES，多账号并发）并行
+    2) ingest（增量）
+    3) profile_update（增量）
 
     关键要求：静默运行
     - 同步/处理过程中产生的 print 全部重定向到 logs/scheduler.log
     - 任何异常不抛出到外层（防止 scheduler 退出）
+    - 每次运行追加一条结构化记录到 logs/scheduler_runs.jsonl（各步骤状态 / 耗时 / 结果摘要）
     """
     _LOG_DIR.mkdir(parents=True, exist_ok=True)
 
     def _do_job() -> None:
         print(f"\n[{_now()}] job.start daily")
+        started_at = datetime.now().isoformat(timespec="seconds")
+        t0 = time.perf_counter()
+        try:
+            records = run_dag(_build_steps(), log=lambda line: _append_log(f"[{_now()}] {line}"))
+        except Exception:
+            _append_log(f"[{_now()}] job.fail daily\n{traceback.format_exc()}")
+            records = {}
+        elapsed = time.perf_counter() - t0
+        try:
+            _append_run_record({
+                "job": "daily",
+                "started_at": started_at,
+                "ended_at": datetime.now().isoformat(timespec="seconds"),
+                "seconds": round(elapsed, 3),
+                "ok": bool(records) and all(r.get("status") == "ok" for r in records.values()),
+                "steps": records,
+            })
+        except Exception:
+            _append_log(f"[{_now()}] run_record.fail\n{traceback.format_exc()}")
 
-        _run_step("notion_sync.fetch_updates", lambda: notion_fetch_updates())
-
-        usernames = _get_x_usernames()
-        if usernames:
-            for u in usernames:
-                _run_step(f"x_sync.fetch_updates @{u}", lambda u=u: x_fetch_updates(u))
-        else:
-            print(f"[{_now()}] step.skip x_sync.fetch_updates (X_USERNAMES empty)")
-
-        _run_step("ingest.ingest(incremental)", lambda: run_incremental_ingest(full=False))
-        _run_step("profile_update.update_user_profile", lambda: update_user_profile_incremental())
-
-        print(f"[{_now()}] job.end daily")
+        print(f"[{_now()}] job.end daily seconds={elapsed:.2f}")
 
     # 默认静默：把同步过程的 print 都重定向到 logs/scheduler.log
     # 测试模式（前台观察）可用 SB_SCHEDULER_FOREGROUND=1 关闭重定向，让终端直接滚动输出
@@ -3,8 +3,9 @@ from __future__ import annotations
 import asyncio
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict
+from typing import Optional
 
 _ROOT = Path(__file__).resolve().parents[1]
 if str(_ROOT) not in sys.path:
@@ -12,25 +13,110 @@ if str(_ROOT) not in sys.path:
 
 from core import SecondBrain
 from infra.conversation_logger import log_telegram_turn
+from infra.session_store import SessionStore
 
 
-# chat_id -> SecondBrain（每个会话一个实例，隔离上下文）
-_BRAINS: Dict[int, SecondBrain] = {}
-_LOCKS: Dict[int, asyncio.Lock] = {}
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _new_brain(chat_id: int) -> SecondBrain:
+    max_turns = int(os.getenv("TG_MAX_TURNS", "20"))
+    enable_tools = (os.getenv("TG_ENABLE_TOOLS", "1").strip() in ("1", "true", "yes", "y", "on"))
+    return SecondBrain(mode="friend", max_turns=max_turns, enable_tools=enable_tools)
+
+
+# chat_id -> SecondBrain（每个会话一个实例，隔离上下文）；LRU + 空闲超时，防止随 chat 数无限增长
+_spill_dir = (os.getenv("TG_SESSION_SPILL_DIR") or "").strip()
+_SESSIONS = SessionStore(
+    _new_brain,
+    max_sessions=_env_int("TG_MAX_SESSIONS", 500),
+    idle_seconds=_env_int("TG_SESSION_IDLE_SECONDS", 3600),
+    spill_dir=(_ROOT / _spill_dir) if _spill_dir else None,
+)
+
+# 全局并发上限：同一时刻最多 TG_MAX_CONCURRENCY 个 LLM 调用在跑（各 chat 内仍由 _LOCKS 保序）。
+# brain.answer 是同步阻塞调用，放到有界线程池执行，事件循环只负责收发。
+_SEMAPHORE: Optional[asyncio.Semaphore] = None
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+
+def _max_concurrency() -> int:
+    try:
+        return max(1, int(os.getenv("TG_MAX_CONCURRENCY", "8")))
+    except Exception:
+        return 8
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    # 延迟创建：需要在事件循环内构造（兼容 Python 3.8/3.9 的 loop 绑定行为）
+    global _SEMAPHORE
+    if _SEMAPHORE is None:
+        _SEMAPHORE = asyncio.Semaphore(_max_concurrency())
+    return _SEMAPHORE
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(max_workers=_max_concurrency(), thread_name_prefix="tg-llm")
+    return _EXECUTOR
 
 
 def _get_lock(chat_id: int) -> asyncio.Lock:
-    if chat_id not in _LOCKS:
-        _LOCKS[chat_id] = asyncio.Lock()
-    return _LOCKS[chat_id]
+    return _SESSIONS.lock_for(chat_id)
 
 
 def _get_brain(chat_id: int) -> SecondBrain:
-    if chat_id not in _BRAINS:
-        max_turns = int(os.getenv("TG_MAX_TURNS", "20"))
-        enable_tools = (os.getenv("TG_ENABLE_TOOLS", "1").strip() in ("1", "true", "yes", "y", "on"))
-        _BRAINS[chat_id] = SecondBrain(mode="friend", max_turns=max_turns, enable_tools=enable_tools)
-    return _BRAINS[chat_id]
+    return _SESSIONS.get(chat_id)
+
+
+def _stream_enabled() -> bool:
+    return (os.getenv("TG_STREAM", "0").strip() in ("1", "true", "yes", "y", "on"))
+
+
+async def _reply_streaming(brain: SecondBrain, message, text: str) -> str:
+    """
+    流式回复：首段文本到达即发送，之后按 TG_STREAM_EDIT_SECONDS 节流编辑同一条消息
+    （Telegram 对 editMessage 有频率限制），生成结束后再做一次最终编辑。
+    返回完整回复文本；发送/编辑失败不影响生成与历史记录。
+    """
+    try:
+        interval = max(0.3, float(os.getenv("TG_STREAM_EDIT_SECONDS", "1.0")))
+    except Exception:
+        interval = 1.0
+
+    loop = asyncio.get_running_loop()
+    parts = []
+    sent = None
+    shown = ""
+    last_edit = 0.0
+    async for piece in brain.astream_answer(text):
+        parts.append(piece)
+        current = "".join(parts)
+        now = loop.time()
+        try:
+            if sent is None:
+                sent = await message.reply_text(current)
+                shown, last_edit = current, now
+            elif now - last_edit >= interval and current != shown:
+                await sent.edit_text(current)
+                shown, last_edit = current, now
+        except Exception:
+            pass
+
+    reply = "".join(parts)
+    try:
+        if sent is None:
+            await message.reply_text(reply or "（空回复）")
+        elif reply != shown:
+            await sent.edit_text(reply)
+    except Exception:
+        pass
+    return reply
 
 
 async def _handle_message(update, context) -> None:
@@ -47,33 +133,47 @@ async def _handle_message(update, context) -> None:
     if not chat_id or not text:
         return
 
+    # lock_for 记一次在途（排队等锁也算），处理完 release：在途会话不会被淘汰
     lock = _get_lock(chat_id)
-    async with lock:
-        brain = _get_brain(chat_id)
-        try:
-            reply = brain.answer(text)
-        except Exception as e:
-            reply = f"系统错误：{e}"
-
-        try:
-            await message.reply_text(reply)
-        except Exception:
-            # 发送失败也不要炸
-            pass
-
-        # 旁路日志（不影响回复）
-        try:
-            user = getattr(message, "from_user", None)
-            log_telegram_turn(
-                chat_id=chat_id,
-                user_id=getattr(user, "id", None),
-                username=getattr(user, "username", None),
-                user_text=text,
-                bot_text=reply,
-                meta={"mode": "friend"},
-            )
-        except Exception:
-            pass
+    try:
+        async with lock:
+            loop = asyncio.get_running_loop()
+            replied = False
+            try:
+                async with _get_semaphore():
+                    # 新建 SecondBrain 会读画像/corpus，同样不能放在事件循环里
+                    brain = await loop.run_in_executor(_get_executor(), _get_brain, chat_id)
+                    if _stream_enabled():
+                        reply = await _reply_streaming(brain, message, text)
+                        replied = True
+                    else:
+                        reply = await loop.run_in_executor(_get_executor(), brain.answer, text)
+            except Exception as e:
+                reply = f"系统错误：{e}"
+                replied = False
+
+            if not replied:
+                try:
+                    await message.reply_text(reply)
+                except Exception:
+                    # 发送失败也不要炸
+                    pass
+
+            # 旁路日志（不影响回复）
+            try:
+                user = getattr(message, "from_user", None)
+                log_telegram_turn(
+                    chat_id=chat_id,
+                    user_id=getattr(user, "id", None),
+                    username=getattr(user, "username", None),
+                    user_text=text,
+                    bot_text=reply,
+                    meta={"mode": "friend"},
+                )
+            except Exception:
+                pass
+    finally:
+        _SESSIONS.release(chat_id)
 
 
 def main() -> None:
@@ -87,7 +187,8 @@ def main() -> None:
     # 延迟 import：避免在测试/无依赖环境 import apps.tg_bot 时直接失败
     from telegram.ext import Application, MessageHandler, filters
 
-    app = Application.builder().token(token).build()
+    # concurrent_updates：允许不同 chat 的消息并发进入 handler（默认 PTB 串行处理 update）
+    app = Application.builder().token(token).concurrent_updates(_max_concurrency() * 4).build()
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, _handle_message))
     app.run_polling()
 
@@ -1,12 +1,21 @@
 import os
+import sys
 import json
-import requests
 import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 
 # 项目根目录（connectors/ 的上一级）
 _BASE = Path(__file__).resolve().parents[1]
+if str(_BASE) not in sys.path:
+    sys.path.insert(0, str(_BASE))
+
+from core.config import env_int
+from core.utils.io_helper import atomic_write_text
+from infra.http import get_client
 try:
     load_dotenv(dotenv_path=_BASE / ".env")
 except Exception:
@@ -24,6 +33,15 @@ headers = {
     "Notion-Version": "2022-06-28"
 }
 
+# 并发抓取正文的线程数；总请求速率由共享 HTTP 客户端对 api.notion.com 的限速（默认 3 rps）约束
+NOTION_FETCH_WORKERS = env_int("NOTION_FETCH_WORKERS", "4")
+# 嵌套块最大递归深度（toggle / 列表子项 / 分栏等）
+NOTION_MAX_DEPTH = env_int("NOTION_MAX_DEPTH", "8")
+
+# 这些类型的子块是独立页面/数据库，不并入当前笔记
+_SKIP_CHILDREN = {"child_page", "child_database"}
+_LIST_TYPES = {"bulleted_list_item", "numbered_list_item", "to_do"}
+
 def _parse_iso(ts: str) -> datetime.datetime:
     # Notion 经常是 ...Z
     if ts.endswith("Z"):
@@ -33,32 +51,117 @@ def _parse_iso(ts: str) -> datetime.datetime:
 def _safe_filename(s: str) -> str:
     return "".join(c if c.isalnum() or c in "._-+" else "_" for c in s)
 
+class NotionFetchError(RuntimeError):
+    pass
+
+
+def _list_children(block_id: str) -> List[Dict[str, Any]]:
+    """
+    取某个块的全部直接子块（按 has_more / next_cursor 翻页）。
+    """
+    url = f"https://api.notion.com/v1/blocks/{block_id}/children"
+    out: List[Dict[str, Any]] = []
+    cursor: Optional[str] = None
+    while True:
+        params: Dict[str, Any] = {"page_size": 100}
+        if cursor:
+            params["start_cursor"] = cursor
+        response = get_client().get(url, headers=headers, params=params, timeout=20)
+        if response.status_code != 200:
+            raise NotionFetchError(f"HTTP {response.status_code}: {response.text[:200]}")
+        data = response.json()
+        out.extend(data.get("results", []))
+        cursor = data.get("next_cursor")
+        if not data.get("has_more") or not cursor:
+            return out
+
+
+def _rich_text(block: Dict[str, Any], b_type: str) -> str:
+    return "".join(rt.get("plain_text", "") for rt in block.get(b_type, {}).get("rich_text", []))
+
+
+def _render_blocks(blocks: List[Dict[str, Any]], depth: int, lines: List[str]) -> None:
+    indent = "  " * depth
+    for block in blocks:
+        b_type = block.get("type") or ""
+        if b_type and "heading" in b_type:
+            heading = _rich_text(block, b_type)
+            if heading.strip():
+                lines.append(f"\n【{heading.strip()}】")
+        elif b_type in _LIST_TYPES:
+            text = _rich_text(block, b_type)
+            if b_type == "to_do":
+                mark = "[x] " if block.get("to_do", {}).get("checked") else "[ ] "
+            else:
+                mark = ""
+            lines.append(f"{indent}- {mark}{text}")
+        elif b_type in ("paragraph", "quote", "callout", "toggle", "code"):
+            lines.append(indent + _rich_text(block, b_type))
+
+        if block.get("has_children") and b_type not in _SKIP_CHILDREN:
+            if depth + 1 > NOTION_MAX_DEPTH:
+                continue
+            _render_blocks(_list_children(block["id"]), depth + 1, lines)
+
+
 def fetch_page_content(page_id: str) -> str:
-    block_url = f"https://api.notion.com/v1/blocks/{page_id}/children"
+    """
+    抓取页面完整正文：子块全部翻页，并递归进入嵌套块。
+    失败时抛出 NotionFetchError（调用方决定是否推进断点）。
+    """
+    lines: List[str] = []
+    _render_blocks(_list_children(page_id), 0, lines)
+    content_text = "\n".join(lines)
+    return content_text.strip() if content_text.strip() else "[该笔记没有文本内容]"
+
+
+def _page_title(page: Dict[str, Any]) -> str:
+    for _, val in page.get("properties", {}).items():
+        if val.get("id") == "title" and val.get("title"):
+            return val["title"][0]["plain_text"]
+    return "无标题"
+
+
+_PRINT_LOCK = threading.Lock()
+
+
+def _sync_page(page: Dict[str, Any], out_dir: str) -> Tuple[datetime.datetime, bool]:
+    """
+    抓取并落盘一篇笔记（在线程池中运行）。返回 (last_edited_time, 是否成功)。
+    """
+    page_id = page["id"]
+    last_edit = page["last_edited_time"]
+    last_edit_dt = _parse_iso(last_edit)
+    title = _page_title(page)
+
     try:
-        response = requests.get(block_url, headers=headers, timeout=20)
-        if response.status_code != 200:
-            return "[API 限制无法读取内容]"
-
-        blocks = response.json().get("results", [])
-        content_text = ""
-
-        for block in blocks:
-            b_type = block.get("type")
-            if b_type == "paragraph":
-                rich_text = block.get("paragraph", {}).get("rich_text", [])
-                for rt in rich_text:
-                    content_text += rt.get("plain_text", "")
-                content_text += "\n"
-            elif b_type and "heading" in b_type:
-                rich_text = block.get(b_type, {}).get("rich_text", [])
-                heading = "".join(rt.get("plain_text", "") for rt in rich_text)
-                if heading.strip():
-                    content_text += f"\n【{heading.strip()}】\n"
-
-        return content_text.strip() if content_text.strip() else "[该笔记没有文本内容]"
+        content = fetch_page_content(page_id)
     except Exception as e:
-        return f"[读取错误: {e}]"
+        with _PRINT_LOCK:
+            print(f"   ❌ 读取失败: {title} ({e})")
+        return last_edit_dt, False
+
+    # ✅ 每篇笔记一个文件：避免 ingest 反复把旧内容吃进去
+    safe_ts = _safe_filename(last_edit_dt.isoformat())
+    safe_title = _safe_filename(title)[:80]
+    file_path = os.path.join(out_dir, f"{safe_ts}_{page_id}_{safe_title}.md")
+
+    doc = (
+        f"# {title}\n"
+        f"- source: notion\n"
+        f"- notion_page_id: {page_id}\n"
+        f"- last_edited_time: {last_edit}\n\n"
+        f"{content}\n"
+    )
+    atomic_write_text(Path(file_path), doc)
+    with _PRINT_LOCK:
+        print(f"   -> 已同步: {title}")
+    return last_edit_dt, True
+
+
+def _save_state(ts: str) -> None:
+    atomic_write_text(Path(STATE_FILE), json.dumps({"last_synced_time": ts}, ensure_ascii=False, indent=2))
+
 
 def fetch_updates() -> int:
     print(">>> 🔄 开始智能同步 Notion...")
@@ -85,92 +188,74 @@ def fetch_updates() -> int:
     out_dir = str(_BASE / "data" / "raw" / "notion")
     os.makedirs(out_dir, exist_ok=True)
 
-    # Notion 数据库 query 有分页（最多 100/页）
+    # Notion 数据库 query 有分页（最多 100/页）；每拿到一页就把正文抓取提交到线程池，
+    # 查询翻页与正文抓取重叠进行，文件在各自抓取完成时立即落盘
     start_cursor = None
     total_candidates = 0
-    new_count = 0
-    newest_dt = last_synced_dt
+    futures = []
 
-    while True:
-        payload = {
-            "page_size": 100,
-            "filter": {
-                "timestamp": "last_edited_time",
-                "last_edited_time": {"on_or_after": last_synced_dt.isoformat()},
-            },
-            # 稳定排序：从旧到新，方便观察全量同步进度
-            "sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}],
-        }
-        if start_cursor:
-            payload["start_cursor"] = start_cursor
-
-        response = requests.post(query_url, json=payload, headers=headers, timeout=30)
-        if response.status_code != 200:
-            print(f"❌ 数据库连接失败: {response.text}")
-            return 0
-
-        data = response.json()
-        results = data.get("results", [])
-        has_more = bool(data.get("has_more"))
-        start_cursor = data.get("next_cursor")
-
-        if not results and total_candidates == 0:
-            print("✅ 没有发现新内容。")
-            current_time_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
-            with open(STATE_FILE, "w", encoding="utf-8") as f:
-                json.dump({"last_synced_time": current_time_iso}, f, ensure_ascii=False, indent=2)
-            return 0
-
-        total_candidates += len(results)
-        if results:
-            print(f"📦 本页发现 {len(results)} 条候选笔记（累计 {total_candidates}），正在抓取正文...")
+    with ThreadPoolExecutor(max_workers=max(1, NOTION_FETCH_WORKERS), thread_name_prefix="notion") as pool:
+        while True:
+            payload = {
+                "page_size": 100,
+                "filter": {
+                    "timestamp": "last_edited_time",
+                    "last_edited_time": {"on_or_after": last_synced_dt.isoformat()},
+                },
+                # 稳定排序：从旧到新，方便观察全量同步进度
+                "sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}],
+            }
+            if start_cursor:
+                payload["start_cursor"] = start_cursor
 
-        for page in results:
-            page_id = page["id"]
-            last_edit = page["last_edited_time"]
-            last_edit_dt = _parse_iso(last_edit)
+            response = get_client().post(query_url, json=payload, headers=headers, timeout=30)
+            if response.status_code != 200:
+                print(f"❌ 数据库连接失败: {response.text}")
+                # 已提交的抓取仍会完成，但不推进断点：下次运行从原断点重来
+                for fut in futures:
+                    fut.cancel()
+                return 0
 
-            # 二次保险：Notion 过滤是 on_or_after（包含断点时刻本身）
-            if last_edit_dt <= last_synced_dt:
-                continue
+            data = response.json()
+            results = data.get("results", [])
+            has_more = bool(data.get("has_more"))
+            start_cursor = data.get("next_cursor")
 
-            props = page.get("properties", {})
-            title = "无标题"
-            for _, val in props.items():
-                if val.get("id") == "title" and val.get("title"):
-                    title = val["title"][0]["plain_text"]
-                    break
+            total_candidates += len(results)
+            if results:
+                print(f"📦 本页发现 {len(results)} 条候选笔记（累计 {total_candidates}），正在抓取正文...")
 
-            print(f"   -> 正在读取: {title} ...")
-            content = fetch_page_content(page_id)
+            for page in results:
+                # 二次保险：Notion 过滤是 on_or_after（包含断点时刻本身）
+                if _parse_iso(page["last_edited_time"]) <= last_synced_dt:
+                    continue
+                futures.append(pool.submit(_sync_page, page, out_dir))
 
-            # ✅ 每篇笔记一个文件：避免 ingest 反复把旧内容吃进去
-            safe_ts = _safe_filename(last_edit_dt.isoformat())
-            safe_title = _safe_filename(title)[:80]
-            file_path = os.path.join(out_dir, f"{safe_ts}_{page_id}_{safe_title}.md")
+            if not has_more or not start_cursor:
+                break
 
-            doc = (
-                f"# {title}\n"
-                f"- source: notion\n"
-                f"- notion_page_id: {page_id}\n"
-                f"- last_edited_time: {last_edit}\n\n"
-                f"{content}\n"
-            )
+        if total_candidates == 0:
+            print("✅ 没有发现新内容。")
+            _save_state(datetime.datetime.now(datetime.timezone.utc).isoformat())
+            return 0
 
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(doc)
+        done: List[Tuple[datetime.datetime, bool]] = [fut.result() for fut in as_completed(futures)]
 
-            new_count += 1
-            if last_edit_dt > newest_dt:
-                newest_dt = last_edit_dt
+    new_count = sum(1 for _, ok in done if ok)
+    failed = [dt for dt, ok in done if not ok]
 
-        if not has_more:
-            break
+    # 断点只推进到“最早失败笔记”之前：失败的笔记下次运行会被重新抓取
+    ok_times = [dt for dt, ok in done if ok]
+    if failed:
+        first_failed = min(failed)
+        ok_times = [dt for dt in ok_times if dt < first_failed]
+        print(f"⚠️ {len(failed)} 条笔记读取失败，下次同步重试")
+    newest_dt = max(ok_times) if ok_times else last_synced_dt
 
     # 只要有新内容，就把断点推进到最新一篇的时间
+    if newest_dt > last_synced_dt:
+        _save_state(newest_dt.isoformat())
     if new_count > 0:
-        with open(STATE_FILE, "w", encoding="utf-8") as f:
-            json.dump({"last_synced_time": newest_dt.isoformat()}, f, ensure_ascii=False, indent=2)
         print(f"🎉 成功同步 {new_count} 条笔记正文！")
     else:
         print("✅ 结果都是旧的，无需更新。")
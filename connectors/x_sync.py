@@ -1,15 +1,21 @@
 import os
+import sys
 import json
-import time
-import requests
 import re
+import threading
 from datetime import datetime
+from pathlib import Path
 from dotenv import load_dotenv
 
+_BASE = Path(__file__).resolve().parents[1]
+if str(_BASE) not in sys.path:
+    sys.path.insert(0, str(_BASE))
+
+from core.utils.io_helper import atomic_write_text
+from infra.http import get_client
+
 # 加载配置（容错：避免在测试/CI 环境因 .env 不可读导致 import 崩溃）
 try:
-    from pathlib import Path
-    _BASE = Path(__file__).resolve().parents[1]
     load_dotenv(dotenv_path=_BASE / ".env")
 except Exception:
     pass
@@ -26,12 +32,31 @@ HEADERS = {
 
 # --- ⚙️ 抓取设置 ---
 MAX_PAGES = 10     # 想抓多少页？(每页约40条)
-TIME_SLEEP = 2     # 翻页间隔秒数 (防封)
+TIME_SLEEP = 2     # 翻页间隔秒数 (防封)；由共享 HTTP 客户端按 host 限速实现，多账号共用
 # 注意：ingest 也会使用 state/sync_state.json 存“文件哈希状态”，不能和 connector 混用
 STATE_PATH = str(_BASE / "state" / "x_state.json")
 DATA_DIR = str(_BASE / "data" / "raw" / "x")
 LOG_DIR = str(_BASE / "logs" / "x")
 
+# 多账号并发同步时：x_state.json 的读-改-写、限速器初始化都要串行
+_STATE_LOCK = threading.Lock()
+_CLIENT_LOCK = threading.Lock()
+
+
+def _client():
+    """
+    共享 HTTP 客户端；RapidAPI host 默认限速 1/TIME_SLEEP 次/秒（X_RATE_LIMIT_RPS 可覆盖）。
+    """
+    client = get_client()
+    with _CLIENT_LOCK:
+        if API_HOST and client.limiter_for(API_HOST) is None:
+            try:
+                rps = float(os.getenv("X_RATE_LIMIT_RPS") or (1.0 / TIME_SLEEP))
+            except Exception:
+                rps = 1.0 / TIME_SLEEP
+            client.set_rate(API_HOST, rps)
+    return client
+
 
 def _safe_filename(s: str) -> str:
     return "".join(c if c.isalnum() or c in "._-+" else "_" for c in s)
@@ -125,7 +150,7 @@ def get_user_id(username):
     params = {"username": username}
 
     try:
-        response = requests.get(url, headers=HEADERS, params=params)
+        response = _client().get(url, headers=HEADERS, params=params)
         data = response.json()
         
         # 尝试多层提取
@@ -175,9 +200,16 @@ def _load_state() -> dict:
     return {}
 
 def _save_state(state: dict) -> None:
-    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
-    with open(STATE_PATH, "w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+    atomic_write_text(Path(STATE_PATH), json.dumps(state, ensure_ascii=False, indent=2))
+
+def _update_user_state(username: str, updates: dict) -> None:
+    """
+    只合并某个账号的条目：加锁后重新读盘再写，避免并发同步的账号互相覆盖。
+    """
+    with _STATE_LOCK:
+        state = _load_state()
+        _get_x_users_state(state).setdefault(username, {}).update(updates)
+        _save_state(state)
 
 def _get_x_users_state(state: dict) -> dict:
     state.setdefault("x_users", {})
@@ -275,9 +307,8 @@ def fetch_updates(username: str, max_pages: int = 2) -> int:
         print("⚠️ [X] 缺少 RAPIDAPI_KEY 或 RAPIDAPI_HOST，跳过同步")
         return 0
 
-    state = _load_state()
-    x_users = _get_x_users_state(state)
-    u = x_users.setdefault(username, {})
+    with _STATE_LOCK:
+        u = dict(_get_x_users_state(_load_state()).get(username) or {})
 
     user_id = u.get("user_id")
     if not user_id:
@@ -301,7 +332,7 @@ def fetch_updates(username: str, max_pages: int = 2) -> int:
         if cursor:
             params["cursor"] = cursor
 
-        resp = requests.get(url, headers=HEADERS, params=params)
+        resp = _client().get(url, headers=HEADERS, params=params)
         if resp.status_code != 200:
             print(f"❌ [X] 请求失败: {resp.status_code} {resp.text[:120]}")
             break
@@ -322,7 +353,6 @@ def fetch_updates(username: str, max_pages: int = 2) -> int:
         if not next_cursor or next_cursor == cursor:
             break
         cursor = next_cursor
-        time.sleep(TIME_SLEEP)
 
     # 去重
     uniq = []
@@ -343,9 +373,11 @@ def fetch_updates(username: str, max_pages: int = 2) -> int:
     except Exception:
         latest_id = uniq[0]["id"]
 
-    u["latest_id"] = latest_id
-    u["last_sync_at"] = datetime.now().isoformat(timespec="seconds")
-    _save_state(state)
+    _update_user_state(username, {
+        "user_id": user_id,
+        "latest_id": latest_id,
+        "last_sync_at": datetime.now().isoformat(timespec="seconds"),
+    })
 
     # 写新增文件：每条 tweet 一个 md（统一 raw 格式）
     for t in uniq:
@@ -399,7 +431,7 @@ def fetch_all_tweets(username, user_id):
             params["cursor"] = cursor
             
         try:
-            response = requests.get(url, headers=HEADERS, params=params)
+            response = _client().get(url, headers=HEADERS, params=params)
             
             if response.status_code != 200:
                 print(f" ❌ 失败: {response.status_code}")
@@ -414,7 +446,6 @@ def fetch_all_tweets(username, user_id):
             if next_cursor and next_cursor != cursor:
                 cursor = next_cursor
                 print(f" (找到下一页)")
-                time.sleep(TIME_SLEEP)
             else:
                 print(" (已到末尾)")
                 break
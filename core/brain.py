@@ -1,15 +1,19 @@
 from __future__ import annotations
 
+import asyncio
+import threading
+import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, List, Optional, Sequence
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
 
 from core.modes import BrainMode, MODE_TO_PROMPT_MD
-from core.prompt_loader import load_prompt, render_prompt
-from core.privacy import apply_privacy_gate
+from core.config import env_bool, env_float, env_int, log_telemetry
+from core.prompt_loader import load_prompt, prompt_path, render_prompt
+from core.privacy import apply_privacy_gate, exclude_file
 from core.settings import settings
 from core.utils.io_helper import read_text_file
-from core.retrieval import get_recent_corpus_snippets, load_recent_user_memory
+from core.retrieval import RetrievalHit, get_recent_corpus_snippets, load_recent_user_memory, retrieve_from_corpus
 from core.llm_provider import get_llm_backend, normalize_reply
 
 
@@ -23,6 +27,57 @@ class BrainContext:
     private_memory: str = ""
 
 
+# ---------- 进程级上下文缓存 ----------
+# 多个会话（如 TG 每个 chat_id 一个 SecondBrain）共享同一份已渲染的上下文与 system prompt，
+# 直到任一输入文件（画像/corpus/私密日志/prompt 模板）的 (mtime, size) 变化或超过 TTL。
+# 每个“槽位”（mode + 路径 + 参数）只保留最新一份，避免文件频繁变化时无限增长。
+
+_CONTEXT_LOCK = threading.Lock()
+_CONTEXT_CACHE: Dict[tuple, Tuple[tuple, float, BrainContext, str]] = {}
+
+
+def _file_stamp(path: Optional[Path]) -> Optional[Tuple[int, int]]:
+    if path is None:
+        return None
+    try:
+        st = Path(path).stat()
+        return int(st.st_mtime_ns), int(st.st_size)
+    except Exception:
+        return None
+
+
+def clear_context_cache() -> None:
+    with _CONTEXT_LOCK:
+        _CONTEXT_CACHE.clear()
+
+
+def _est_tokens(text: str) -> int:
+    # 粗估：中英混排约 2 字符 / token（与 profile_update 的切批估算一致）
+    return (len(text or "") + 1) // 2
+
+
+def format_retrieved(hits: Sequence[RetrievalHit], *, token_budget: int, max_chars_per_hit: int = 600) -> str:
+    """
+    把检索命中渲染成注入块；按排序依次加入，超出 token 预算即停止（至少保留 1 条）。
+    """
+    lines: List[str] = []
+    used = 0
+    for h in hits:
+        text = " ".join((h.text or "").split())
+        if not text:
+            continue
+        if len(text) > max_chars_per_hit:
+            text = text[:max_chars_per_hit] + "…"
+        date = (h.created_at or "")[:10]
+        line = f"- [{h.source}{' ' + date if date else ''}] {text}"
+        cost = _est_tokens(line)
+        if lines and used + cost > token_budget:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
+
+
 class SecondBrain:
     """
     Core Brain 主体。
@@ -46,10 +101,22 @@ class SecondBrain:
         max_retries: int = 2,
         enable_tools: bool = True,
         max_turns: int = 20,
+        retrieval: Optional[bool] = None,
     ) -> None:
         self.mode: BrainMode = self._validate_mode(mode)
         self.days = int(days)
+
+        # 每轮检索（RAG）：按用户消息从 corpus 取 topK 片段注入本轮请求（SB_RAG=0 关闭）；
+        # 开启时 system prompt 里的静态“最近摘要”缩到 SB_RAG_RECENT_ITEMS 条
+        self.retrieval = env_bool("SB_RAG", "1") if retrieval is None else bool(retrieval)
+        self.rag_top_k = env_int("SB_RAG_TOP_K", "6")
+        self.rag_token_budget = env_int("SB_RAG_TOKEN_BUDGET", "1200")
+        self.rag_min_similarity = env_float("SB_RAG_MIN_SIMILARITY", "0.05")
+        self.rag_max_scan = env_int("SB_RAG_MAX_SCAN", "4000")
+        if self.retrieval:
+            max_corpus_items = min(int(max_corpus_items), env_int("SB_RAG_RECENT_ITEMS", "6"))
         self.max_corpus_items = int(max_corpus_items)
+        self.last_turn: Dict[str, Any] = {}
         self.max_user_memory_entries = int(max_user_memory_entries)
 
         # 路径初始化：优先使用传入路径，否则使用 settings 默认路径
@@ -68,33 +135,170 @@ class SecondBrain:
         self._llm = None  # lazy init
 
         # 初始化会话
-        ctx = self.load_context()
-        system_prompt = self.build_prompt(ctx)
-        self._messages = self._new_session(system_prompt)
+        self._messages = self._new_session(self._session_prompt())
 
     def answer(self, user_input: str) -> str:
         text = (user_input or "").strip()
         if not text:
             return ""
 
-        from langchain_core.messages import HumanMessage
-        human = HumanMessage(content=text)
-        send_messages = list(self._messages) + [human]
+        human, send_messages = self._prepare_turn(text, self._retrieve_block(text))
 
         reply, extra_messages = self.call_llm(send_messages)
 
-        self._messages.append(human)
-        if extra_messages:
-            self._messages.extend(extra_messages)
+        self._commit_turn(human, extra_messages)
+        return reply
 
-        self._trim_history()
+    async def aanswer(self, user_input: str) -> str:
+        """
+        answer() 的异步版本（llm.ainvoke），历史记录规则完全一致。
+        """
+        text = (user_input or "").strip()
+        if not text:
+            return ""
+
+        block = await asyncio.to_thread(self._retrieve_block, text)
+        human, send_messages = self._prepare_turn(text, block)
+
+        reply, extra_messages = await self.acall_llm(send_messages)
+
+        self._commit_turn(human, extra_messages)
         return reply
 
+    def stream_answer(self, user_input: str) -> Iterator[str]:
+        """
+        流式回答（llm.stream）：逐段 yield 增量文本。
+        只有完整生成结束后才写入历史；中途异常/提前中断则本轮不计入历史。
+        """
+        text = (user_input or "").strip()
+        if not text:
+            return
+
+        human, send_messages = self._prepare_turn(text, self._retrieve_block(text))
+
+        full = None
+        for chunk in self._get_llm().stream(send_messages):
+            full = chunk if full is None else full + chunk
+            piece = normalize_reply(chunk.content)
+            if piece:
+                yield piece
+
+        self._commit_turn(human, self._stream_result(full))
+
+    async def astream_answer(self, user_input: str) -> AsyncIterator[str]:
+        """
+        stream_answer() 的异步版本（llm.astream），供 TG 等 async 入口使用。
+        """
+        text = (user_input or "").strip()
+        if not text:
+            return
+
+        block = await asyncio.to_thread(self._retrieve_block, text)
+        human, send_messages = self._prepare_turn(text, block)
+
+        full = None
+        async for chunk in self._get_llm().astream(send_messages):
+            full = chunk if full is None else full + chunk
+            piece = normalize_reply(chunk.content)
+            if piece:
+                yield piece
+
+        self._commit_turn(human, self._stream_result(full))
+
+    def _retrieve_block(self, text: str) -> str:
+        """
+        本轮检索：隐私闸门决定 corpus 能否读取，命中的来源文件也逐条过闸门；
+        结果按 SB_RAG_TOKEN_BUDGET 截断。失败时返回空串（不影响回答）。
+        """
+        self.last_turn = {}
+        if not self.retrieval or self.rag_top_k <= 0:
+            return ""
+        if self.corpus_path not in set(apply_privacy_gate(self.mode, [self.corpus_path])):
+            return ""
+
+        t0 = time.perf_counter()
+        try:
+            hits = retrieve_from_corpus(
+                corpus_path=self.corpus_path,
+                query=text,
+                top_k=self.rag_top_k,
+                max_scan=self.rag_max_scan,
+                min_similarity=self.rag_min_similarity,
+            )
+        except Exception as e:
+            log_telemetry(f"rag error: {e}")
+            return ""
+        if self.mode != "self":
+            hits = [h for h in hits if not (h.file_path and exclude_file(h.file_path))]
+        block = format_retrieved(hits, token_budget=self.rag_token_budget)
+
+        self.last_turn = {
+            "rag_ms": round((time.perf_counter() - t0) * 1000, 2),
+            "rag_hits": len(hits),
+            "rag_tokens": _est_tokens(block),
+            "system_tokens": _est_tokens(str(self._messages[0].content)),
+        }
+        log_telemetry(
+            "rag turn: "
+            + " ".join(f"{k}={v}" for k, v in self.last_turn.items())
+        )
+        return block
+
+    def _prepare_turn(self, text: str, block: str) -> Tuple[Any, List[Any]]:
+        """
+        返回 (写入历史的 HumanMessage, 本轮发送给 LLM 的消息列表)。
+        检索片段只拼进本轮发送的用户消息，不进入历史，避免历史随轮数膨胀。
+        """
+        from langchain_core.messages import HumanMessage
+
+        human = HumanMessage(content=text)
+        if not block:
+            return human, list(self._messages) + [human]
+        augmented = HumanMessage(
+            content=f"【与这条消息相关的笔记片段（检索所得，仅供参考）】\n{block}\n\n【用户消息】\n{text}"
+        )
+        return human, list(self._messages) + [augmented]
+
     def switch_mode(self, mode: BrainMode) -> None:
         self.mode = self._validate_mode(mode)
-        ctx = self.load_context()
-        system_prompt = self.build_prompt(ctx)
-        self._messages = self._new_session(system_prompt)
+        self._messages = self._new_session(self._session_prompt())
+
+    def _session_prompt(self) -> str:
+        """
+        新会话的 system prompt：优先复用进程级缓存（SB_CONTEXT_CACHE=0 可关闭）。
+
+        缓存 key：mode + 各输入文件路径 + days/max_items 等参数；
+        命中条件：各输入文件与 prompt 模板的 (mtime, size) 均未变化，且未超过
+        SB_CONTEXT_CACHE_TTL_SECONDS（默认 3600；最近摘要带时间衰减，不能无限期复用）。
+        """
+        if not env_bool("SB_CONTEXT_CACHE", "1"):
+            return self.build_prompt(self.load_context())
+
+        try:
+            template_path: Optional[Path] = prompt_path(MODE_TO_PROMPT_MD.get(self.mode) or "")
+        except Exception:
+            template_path = None
+        inputs = (self.profile_path, self.corpus_path, self.brain_memory_path, template_path)
+        slot = (
+            self.mode,
+            tuple(str(p) if p is not None else "" for p in inputs),
+            self.days,
+            self.max_corpus_items,
+            self.max_user_memory_entries,
+        )
+        ttl = env_float("SB_CONTEXT_CACHE_TTL_SECONDS", "3600")
+
+        # 整个加载过程持锁：一批新会话同时到达时只做一次 corpus 扫描（single-flight）
+        with _CONTEXT_LOCK:
+            stamp = tuple(_file_stamp(p) for p in inputs)
+            hit = _CONTEXT_CACHE.get(slot)
+            if hit is not None and hit[0] == stamp and (time.monotonic() - hit[1]) <= ttl:
+                return hit[3]
+
+            ctx = self.load_context()
+            system_prompt = self.build_prompt(ctx)
+            _CONTEXT_CACHE[slot] = (stamp, time.monotonic(), ctx, system_prompt)
+            return system_prompt
 
     def load_context(self) -> BrainContext:
         """
@@ -147,6 +351,45 @@ class SecondBrain:
         reply = normalize_reply(response.content)
         return reply, [response]
 
+    async def acall_llm(self, messages: Sequence[Any]) -> tuple[str, List[Any]]:
+        llm = self._get_llm()
+        response = await llm.ainvoke(list(messages))
+        reply = normalize_reply(response.content)
+        return reply, [response]
+
+    @staticmethod
+    def _stream_result(full: Any) -> List[Any]:
+        """
+        把流式 chunk 的累加结果转成与 invoke 一致的 AIMessage（便于后续轮次复用历史）。
+        """
+        from langchain_core.messages import AIMessage
+
+        if full is None:
+            return [AIMessage(content="")]
+        try:
+            from langchain_core.messages import message_chunk_to_message
+            return [message_chunk_to_message(full)]
+        except Exception:
+            return [AIMessage(content=getattr(full, "content", "") or "")]
+
+    def export_history(self) -> List[dict]:
+        """
+        导出对话历史（不含 system prompt，恢复时按当前上下文重新生成）。
+        """
+        from langchain_core.messages import messages_to_dict
+        return messages_to_dict(self._messages[1:])
+
+    def import_history(self, items: Sequence[dict]) -> None:
+        from langchain_core.messages import messages_from_dict
+        self._messages = [self._messages[0]] + messages_from_dict(list(items or []))
+        self._trim_history()
+
+    def _commit_turn(self, human: Any, extra_messages: Optional[List[Any]]) -> None:
+        self._messages.append(human)
+        if extra_messages:
+            self._messages.extend(extra_messages)
+        self._trim_history()
+
     @staticmethod
     def _validate_mode(mode: str) -> BrainMode:
         m = (mode or "").strip().lower()
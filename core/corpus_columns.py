@@ -0,0 +1,399 @@
+"""
+corpus 列式旁路存储（corpus.cols/，与 corpus.jsonl 行一一对应）。
+
+JSONL 仍是唯一事实来源；这里只是热路径要用的少数字段的紧凑副本，随时可从 JSONL 重建：
+- 定长数值列（原生字节序，mmap 后 memoryview.cast 直接按数组访问）：
+  line_off(u64) / source(u16，下标指向 meta.sources) / created_at(f64, epoch 秒) / dt(f64) /
+  depth_score(f64) / cog_weight(f64) / weight(f64)
+- 变长字符串列：uid / text，各自是 “结束偏移表(u64) + blob”
+- 预分词列 tok：每行去重后的 token 集合，存成升序的 int32 哈希 id（token_id），
+  同样是 “结束偏移表(u64，单位=id 个数) + blob(i32)”；分词与 retrieval._tokenize 一致，
+  ingest 时算一次，检索扫描路径只做整数集合求交，不再逐条分词
+- 缺失值用 NaN；坏行/空行也占一行（source=SOURCE_INVALID），保证行号与 corpus、倒排索引 doc 对齐
+
+字段口径与 retrieval 保持一致：
+- created_at：只解析显式 created_at（naive 视为 UTC），检索侧的 time_weight 用它
+- dt：created_at 缺失时对 notion 再按文件名推断，最近摘要用它
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import mmap
+import sys
+import threading
+import zlib
+from array import array
+from bisect import bisect_left
+from datetime import timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .utils.io_helper import atomic_write_text
+from .utils.time_helper import infer_dt_from_notion_filename, parse_dt
+
+COLUMNS_VERSION = 3
+
+NAN = float("nan")
+# 坏行哨兵，只给坏行用；有效 source 最多 SOURCE_INVALID 种，超出直接报错
+SOURCE_INVALID = 0xFFFF
+
+# 列名 -> array typecode
+_NUM_COLUMNS: Dict[str, str] = {
+    "line_off": "Q",
+    "source": "H",
+    "created_at": "d",
+    "dt": "d",
+    "depth_score": "d",
+    "cog_weight": "d",
+    "weight": "d",
+}
+_STR_COLUMNS = ("uid", "text")
+
+
+def token_id(tok: str) -> int:
+    """
+    token -> 非负 int32 哈希 id（crc32，跨进程稳定）。冲突概率极低，冲突时最多让相似度略偏高。
+    """
+    return zlib.crc32(tok.encode("utf-8")) & 0x7FFFFFFF
+
+
+def token_id_set(tokens: Iterable[str]) -> List[int]:
+    """
+    去重 + 升序的 token id 列表（列存 tok 列的存储口径）。
+    """
+    return sorted({token_id(t) for t in tokens})
+
+
+def count_common(sorted_ids: Sequence[int], query_ids: Sequence[int]) -> int:
+    """
+    整数集合求交的大小：query 通常只有十几个 id，对升序的文档 id 逐个二分查找。
+    """
+    n = len(sorted_ids)
+    if n == 0:
+        return 0
+    hit = 0
+    for q in query_ids:
+        j = bisect_left(sorted_ids, q)
+        if j < n and sorted_ids[j] == q:
+            hit += 1
+    return hit
+
+
+def columns_dir_for(corpus_path: Path) -> Path:
+    """
+    data/corpus.jsonl -> data/corpus.cols/
+    """
+    p = Path(corpus_path)
+    return p.with_name(f"{p.stem}.cols")
+
+
+def _epoch(dt: Any) -> float:
+    if dt is None:
+        return NAN
+    try:
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return float(dt.timestamp())
+    except Exception:
+        return NAN
+
+
+def _num_or_nan(v: Any, *, invalid: float = NAN) -> float:
+    if v is None:
+        return NAN
+    try:
+        return float(v)
+    except Exception:
+        return invalid
+
+
+def _row_from_line(offset: int, raw: bytes, sources: List[str]) -> Tuple[Dict[str, float], str, str]:
+    """
+    JSONL 一行 -> (数值列, uid, text)。坏行返回 source=SOURCE_INVALID 的空行。
+    """
+    row: Dict[str, float] = {name: NAN for name in _NUM_COLUMNS}
+    row["line_off"] = int(offset)
+    row["source"] = SOURCE_INVALID
+    try:
+        obj = json.loads(raw.decode("utf-8"))
+        if not isinstance(obj, dict):
+            raise ValueError("not an object")
+    except Exception:
+        return row, "", ""
+
+    source = str(obj.get("source", "unknown"))
+    if source not in sources:
+        if len(sources) >= SOURCE_INVALID:
+            raise ValueError(f"source 种类超过列存上限 {SOURCE_INVALID}: {source!r}")
+        sources.append(source)
+    row["source"] = sources.index(source)
+
+    created_at = obj.get("created_at")
+    created = _epoch(parse_dt(str(created_at))) if created_at else NAN
+    row["created_at"] = created
+    dt = created
+    if math.isnan(dt) and source == "notion":
+        dt = _epoch(infer_dt_from_notion_filename(str(obj.get("file_path", "") or "")))
+    row["dt"] = dt
+
+    # 与 retrieval 的兼容口径一致：depth_score 非法按 0.5，cog_weight 非法按 1
+    row["depth_score"] = _num_or_nan(obj.get("depth_score"), invalid=0.5)
+    row["cog_weight"] = _num_or_nan(obj.get("cog_weight"), invalid=1.0)
+    row["weight"] = _num_or_nan(obj.get("weight"), invalid=1.0)
+
+    return row, str(obj.get("uid") or ""), str(obj.get("text") or "")
+
+
+def _read_meta(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except Exception:
+        return None
+    if not isinstance(meta, dict) or meta.get("version") != COLUMNS_VERSION:
+        return None
+    if meta.get("byteorder") != sys.byteorder:
+        return None
+    return meta
+
+
+def _truncate(path: Path, size: int) -> None:
+    with open(path, "ab") as f:
+        f.truncate(int(size))
+
+
+def sync_columns(corpus_path: Path) -> Dict[str, Any]:
+    """
+    让列存追上 corpus（与 sync_index 同一套新鲜度规则）：
+    - meta 缺失/版本不符/inode 变化/corpus 变短：全量重建
+    - 否则只追加 corpus_bytes 之后的完整行
+    列文件先写，meta 最后原子替换；崩溃留下的多余尾巴下次按 meta 截断。
+    """
+    from .corpus_index import _iter_lines_from
+    from .retrieval import _tokenize
+
+    corpus_path = Path(corpus_path)
+    cdir = columns_dir_for(corpus_path)
+    meta_path = cdir / "meta.json"
+    if not corpus_path.exists() or not corpus_path.is_file():
+        return {"columns": str(cdir), "rebuilt": False, "added_rows": 0}
+
+    st = corpus_path.stat()
+    meta = _read_meta(meta_path)
+    rebuilt = False
+    if (
+        meta is None
+        or int(meta.get("corpus_inode") or 0) != int(st.st_ino)
+        or int(meta.get("corpus_bytes") or 0) > int(st.st_size)
+    ):
+        meta = {"n": 0, "corpus_bytes": 0, "sources": [], "blob_bytes": {c: 0 for c in _STR_COLUMNS}, "tok_count": 0}
+        rebuilt = True
+
+    cdir.mkdir(parents=True, exist_ok=True)
+    if rebuilt:
+        # 先 unlink 再新建：其它进程已 mmap 的旧文件 inode 仍然有效，不会因截断触发 SIGBUS
+        for old in cdir.iterdir():
+            if old.is_file():
+                old.unlink()
+    n = int(meta["n"])
+    sources: List[str] = list(meta.get("sources") or [])
+    blob_bytes: Dict[str, int] = {c: int((meta.get("blob_bytes") or {}).get(c, 0)) for c in _STR_COLUMNS}
+    tok_count = int(meta.get("tok_count") or 0)
+
+    # 对齐到 meta 记录的长度（丢弃上次崩溃留下的半截追加）
+    for name, code in _NUM_COLUMNS.items():
+        _truncate(cdir / f"{name}.bin", n * array(code).itemsize)
+    for name in _STR_COLUMNS:
+        _truncate(cdir / f"{name}.off", n * array("Q").itemsize)
+        _truncate(cdir / f"{name}.blob", blob_bytes[name])
+    _truncate(cdir / "tok.off", n * array("Q").itemsize)
+    _truncate(cdir / "tok.blob", tok_count * array("i").itemsize)
+
+    nums: Dict[str, array] = {name: array(code) for name, code in _NUM_COLUMNS.items()}
+    offs: Dict[str, array] = {name: array("Q") for name in _STR_COLUMNS}
+    blobs: Dict[str, List[bytes]] = {name: [] for name in _STR_COLUMNS}
+    tok_off = array("Q")
+    tok_ids = array("i")
+
+    end = int(meta["corpus_bytes"])
+    added = 0
+    for offset, raw in _iter_lines_from(corpus_path, end):
+        end = offset + len(raw)
+        row, uid, text = _row_from_line(offset, raw, sources)
+        for name in _NUM_COLUMNS:
+            nums[name].append(row[name])
+        for name, val in (("uid", uid), ("text", text)):
+            b = val.encode("utf-8")
+            blobs[name].append(b)
+            blob_bytes[name] += len(b)
+            offs[name].append(blob_bytes[name])
+        tok_ids.extend(token_id_set(_tokenize(text)))
+        tok_off.append(tok_count + len(tok_ids))
+        added += 1
+
+    if added:
+        for name in _NUM_COLUMNS:
+            with open(cdir / f"{name}.bin", "ab") as f:
+                nums[name].tofile(f)
+        for name in _STR_COLUMNS:
+            with open(cdir / f"{name}.off", "ab") as f:
+                offs[name].tofile(f)
+            with open(cdir / f"{name}.blob", "ab") as f:
+                f.write(b"".join(blobs[name]))
+        with open(cdir / "tok.off", "ab") as f:
+            tok_off.tofile(f)
+        with open(cdir / "tok.blob", "ab") as f:
+            tok_ids.tofile(f)
+        tok_count += len(tok_ids)
+
+    if added or rebuilt:
+        new_meta = {
+            "version": COLUMNS_VERSION,
+            "byteorder": sys.byteorder,
+            "corpus_bytes": int(end),
+            "corpus_inode": int(st.st_ino),
+            "n": n + added,
+            "sources": sources,
+            "blob_bytes": blob_bytes,
+            "tok_count": tok_count,
+        }
+        atomic_write_text(meta_path, json.dumps(new_meta, ensure_ascii=False, indent=2))
+
+    return {"columns": str(cdir), "rebuilt": rebuilt, "added_rows": int(added)}
+
+
+class CorpusColumns:
+    """
+    只读视图：数值列是 memoryview（按下标取值即可，后续可零拷贝交给 NumPy），
+    字符串列按需解码，不碰的行不会产生任何解析成本。
+    """
+
+    def __init__(self, cdir: Path, meta: Dict[str, Any]) -> None:
+        self.dir = Path(cdir)
+        self.n = int(meta["n"])
+        self.corpus_bytes = int(meta["corpus_bytes"])
+        self.corpus_inode = int(meta["corpus_inode"])
+        self.sources: List[str] = list(meta.get("sources") or [])
+        self._maps: List[mmap.mmap] = []
+
+        for name, code in _NUM_COLUMNS.items():
+            setattr(self, name, self._map_array(self.dir / f"{name}.bin", code, self.n))
+        self._str_off = {name: self._map_array(self.dir / f"{name}.off", "Q", self.n) for name in _STR_COLUMNS}
+        self._str_blob = {
+            name: self._map_bytes(self.dir / f"{name}.blob", int((meta.get("blob_bytes") or {}).get(name, 0)))
+            for name in _STR_COLUMNS
+        }
+        self.tok_count = int(meta.get("tok_count") or 0)
+        self._tok_off = self._map_array(self.dir / "tok.off", "Q", self.n)
+        self._tok_ids = self._map_array(self.dir / "tok.blob", "i", self.tok_count)
+
+    def _map_bytes(self, path: Path, size: int) -> memoryview:
+        if size <= 0:
+            return memoryview(b"")
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mm) < size:
+            raise ValueError(f"列文件长度不足: {path}")
+        self._maps.append(mm)
+        return memoryview(mm)[:size]
+
+    def _map_array(self, path: Path, code: str, n: int) -> memoryview:
+        width = array(code).itemsize
+        mv = self._map_bytes(path, n * width)
+        return mv.cast(code) if n > 0 else memoryview(array(code))
+
+    def _string(self, name: str, i: int) -> str:
+        off = self._str_off[name]
+        start = int(off[i - 1]) if i > 0 else 0
+        return bytes(self._str_blob[name][start:int(off[i])]).decode("utf-8", errors="replace")
+
+    def uid(self, i: int) -> str:
+        return self._string("uid", int(i))
+
+    def text(self, i: int) -> str:
+        return self._string("text", int(i))
+
+    def token_ids(self, i: int) -> memoryview:
+        """
+        第 i 行去重后的升序 token id（int32 memoryview，零拷贝）。
+        """
+        i = int(i)
+        start = int(self._tok_off[i - 1]) if i > 0 else 0
+        return self._tok_ids[start:int(self._tok_off[i])]
+
+    def np_tokens(self):
+        """
+        预分词列的 NumPy 视图：(ends[u64, 长 n], ids[i32])，第 i 行是 ids[ends[i-1]:ends[i]]。需要 NumPy。
+        """
+        import numpy as np
+
+        return np.frombuffer(self._tok_off, dtype=np.uint64), np.frombuffer(self._tok_ids, dtype=np.int32)
+
+    def source_name(self, i: int) -> str:
+        code = int(self.source[int(i)])  # type: ignore[attr-defined]
+        return self.sources[code] if code < len(self.sources) else "unknown"
+
+    def np_column(self, name: str):
+        """
+        数值列的 NumPy 零拷贝视图（np.frombuffer 直接包 mmap）；需要 NumPy。
+        """
+        import numpy as np
+
+        code = _NUM_COLUMNS[name]
+        return np.frombuffer(getattr(self, name), dtype=np.dtype(code))
+
+    def is_valid(self, i: int) -> bool:
+        return int(self.source[int(i)]) != SOURCE_INVALID  # type: ignore[attr-defined]
+
+
+_LOCK = threading.Lock()
+_CACHE: Dict[Path, Tuple[int, int, CorpusColumns]] = {}
+
+
+def load_fresh_columns(corpus_path: Path) -> Optional[CorpusColumns]:
+    """
+    读取与当前 corpus 完全同步（字节数 + inode）的列存；缺失/过期返回 None（调用方回退 JSONL）。
+    """
+    corpus_path = Path(corpus_path)
+    cdir = columns_dir_for(corpus_path)
+    meta_path = cdir / "meta.json"
+    try:
+        cst = corpus_path.stat()
+        mst = meta_path.stat()
+    except Exception:
+        return None
+
+    key = (int(mst.st_mtime_ns), int(mst.st_size))
+    with _LOCK:
+        hit = _CACHE.get(cdir)
+    if hit is not None and (hit[0], hit[1]) == key:
+        cols = hit[2]
+    else:
+        meta = _read_meta(meta_path)
+        if meta is None:
+            return None
+        try:
+            cols = CorpusColumns(cdir, meta)
+        except Exception:
+            return None
+        with _LOCK:
+            _CACHE[cdir] = (key[0], key[1], cols)
+
+    if cols.corpus_bytes != int(cst.st_size) or cols.corpus_inode != int(cst.st_ino):
+        return None
+    return cols
+
+
+def read_line_obj(corpus_path: Path, offset: int) -> Optional[Dict[str, Any]]:
+    """
+    按列存里的 line_off 回读 JSONL 原行（只对最终需要完整字段的少数行使用）。
+    """
+    try:
+        with open(corpus_path, "rb") as f:
+            f.seek(int(offset))
+            obj = json.loads(f.readline().decode("utf-8"))
+        return obj if isinstance(obj, dict) else None
+    except Exception:
+        return None
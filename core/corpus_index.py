@@ -0,0 +1,497 @@
+"""
+corpus 倒排索引（落盘在 corpus.jsonl 旁边：清单 corpus.index.json + 分段目录 corpus.index.d/）。
+
+- 分词与 retrieval._tokenize 完全一致（英文 word + 中文 2-gram）
+- docs：按 corpus 行号排列，每行记录 [byte_offset, uid, 去重 token 数, token 总数]；
+  空文本/坏行记为 None（保持行号与 corpus 对齐，便于复用 max_scan 语义）
+- postings：token -> [doc, tf, doc, tf, ...]（扁平数组，省空间）
+- 新鲜度：记录已索引的字节数与 inode；corpus 只追加时可增量补齐，
+  被重写（compact/rename）后 inode 变化则整体重建
+- 落盘格式可追加：每次增量只把新行写成一个分段文件（docs + 新行的 postings，doc 号全局连续），
+  再原子替换小清单（分段列表、字节数、inode、unique_uids），写入代价与新增行数成正比；
+  分段超过 MAX_SEGMENTS 个时合并重写成一个。读取侧按清单依次合并分段，
+  进程内缓存已合并的结果，清单变化时只读新增的分段
+- unique_uids：所有有效行的 uid 均非空且互不重复（ingest 不写重复 uid 时成立），
+  检索侧据此跳过查询期去重
+- 统计量（corpus.stats.json）：文档数 / token 总数 / 平均 chunk 长度 / 各 token 的 df，
+  随索引一起在 ingest 时写出（增量时在旧统计上累加新分段），供 BM25 打分直接读取
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .utils.io_helper import atomic_write_text
+
+INDEX_VERSION = 2
+
+MAX_SEGMENTS = 16
+
+
+@dataclass
+class CorpusIndex:
+    corpus_bytes: int = 0
+    corpus_inode: int = 0
+    docs: List[Optional[list]] = field(default_factory=list)
+    postings: Dict[str, List[int]] = field(default_factory=dict)
+    unique_uids: bool = False
+    # 已合并进来的分段文件名（按顺序）；读取侧据此只补读新增分段
+    segments: List[str] = field(default_factory=list)
+
+    def uids(self) -> List[str]:
+        return [str(d[1]) for d in self.docs if d]
+
+    def merged_with(self, seg: Dict[str, Any], name: str) -> "CorpusIndex":
+        """
+        追加一个分段，返回新对象（只复制被分段触及的 posting list，旧对象仍可被并发读者使用）。
+        """
+        postings = dict(self.postings)
+        for tok, plist in (seg.get("postings") or {}).items():
+            old = postings.get(tok)
+            postings[tok] = old + plist if old else list(plist)
+        return CorpusIndex(
+            corpus_bytes=int(seg.get("corpus_bytes") or 0),
+            corpus_inode=self.corpus_inode,
+            docs=self.docs + list(seg.get("docs") or []),
+            postings=postings,
+            unique_uids=self.unique_uids,
+            segments=self.segments + [name],
+        )
+
+
+def index_path_for(corpus_path: Path) -> Path:
+    """
+    data/corpus.jsonl -> data/corpus.index.json（清单）
+    """
+    p = Path(corpus_path)
+    return p.with_name(f"{p.stem}.index.json")
+
+
+def segments_dir_for(corpus_path: Path) -> Path:
+    """
+    data/corpus.jsonl -> data/corpus.index.d/
+    """
+    p = Path(corpus_path)
+    return p.with_name(f"{p.stem}.index.d")
+
+
+def stats_path_for(corpus_path: Path) -> Path:
+    """
+    data/corpus.jsonl -> data/corpus.stats.json
+    """
+    p = Path(corpus_path)
+    return p.with_name(f"{p.stem}.stats.json")
+
+
+@dataclass(frozen=True)
+class CorpusStats:
+    """
+    BM25 所需的全局统计量（以 corpus 行为文档单位）。
+    """
+    n_docs: int = 0
+    avgdl: float = 0.0
+    df: Dict[str, int] = field(default_factory=dict)
+    total_tokens: int = 0
+
+    @classmethod
+    def from_index(cls, idx: "CorpusIndex") -> "CorpusStats":
+        lens = [int(d[3]) for d in idx.docs if d]
+        n = len(lens)
+        return cls(
+            n_docs=n,
+            avgdl=(float(sum(lens)) / n) if n else 0.0,
+            df={tok: len(plist) // 2 for tok, plist in idx.postings.items()},
+            total_tokens=int(sum(lens)),
+        )
+
+    @classmethod
+    def from_token_counts(cls, docs: Iterable[Dict[str, int]]) -> "CorpusStats":
+        """
+        无落盘统计时的兜底：直接用一批文档的 tf 现算（例如扫描窗口内）。
+        """
+        n = 0
+        total = 0
+        df: Dict[str, int] = {}
+        for tf in docs:
+            n += 1
+            total += int(sum(tf.values()))
+            for tok in tf:
+                df[tok] = df.get(tok, 0) + 1
+        return cls(n_docs=n, avgdl=(float(total) / n) if n else 0.0, df=df, total_tokens=total)
+
+
+def _read_json(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+        return None
+    return data
+
+
+def _read_segment(sdir: Path, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    seg = _read_json(sdir / str(entry.get("file")))
+    if seg is None or int(seg.get("first_doc", -1)) != int(entry.get("first_doc", -2)):
+        return None
+    if len(seg.get("docs") or []) != int(entry.get("n_docs", -1)):
+        return None
+    return seg
+
+
+def _iter_lines_from(corpus_path: Path, start: int) -> Iterable[Tuple[int, bytes]]:
+    """
+    从 start 字节处开始按行产出 (offset, raw_line)。
+    末尾没有换行的半行（可能正在写入）不产出，等下次再索引。
+    """
+    with open(corpus_path, "rb") as f:
+        f.seek(int(start))
+        offset = int(start)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            yield offset, raw
+            offset += len(raw)
+
+
+def _index_tail(idx: CorpusIndex, corpus_path: Path, start: int, first_doc: int = 0) -> int:
+    """
+    把 corpus 中 start 之后的完整行追加进 idx（doc 号从 first_doc + len(idx.docs) 起），返回新增行数。
+    """
+    from .retrieval import _tokenize
+
+    added = 0
+    end = int(start)
+    for offset, raw in _iter_lines_from(corpus_path, start):
+        end = offset + len(raw)
+        doc_id = int(first_doc) + len(idx.docs)
+        added += 1
+
+        try:
+            obj = json.loads(raw.decode("utf-8"))
+            text = (obj.get("text") or "").strip()
+        except Exception:
+            idx.docs.append(None)
+            continue
+        if not text:
+            idx.docs.append(None)
+            continue
+
+        tf = Counter(_tokenize(text))
+        idx.docs.append([int(offset), str(obj.get("uid") or ""), len(tf), int(sum(tf.values()))])
+        for tok, n in tf.items():
+            idx.postings.setdefault(tok, []).extend((doc_id, int(n)))
+
+    idx.corpus_bytes = end
+    return added
+
+
+def _write_segment(sdir: Path, inode: int, first_doc: int, seg: CorpusIndex) -> Dict[str, Any]:
+    """
+    写一个分段文件，返回清单条目。文件名含 inode / 起始 doc / 结束字节数，内容不同则名字不同，
+    旧清单的读者不会读到被改写的分段。
+    """
+    name = f"seg-{int(inode)}-{int(first_doc)}-{int(seg.corpus_bytes)}.json"
+    payload = {
+        "version": INDEX_VERSION,
+        "first_doc": int(first_doc),
+        "corpus_bytes": int(seg.corpus_bytes),
+        "docs": seg.docs,
+        "postings": seg.postings,
+    }
+    atomic_write_text(sdir / name, json.dumps(payload, ensure_ascii=False, separators=(",", ":")))
+    return {"file": name, "first_doc": int(first_doc), "n_docs": len(seg.docs), "corpus_bytes": int(seg.corpus_bytes)}
+
+
+def _write_manifest(ipath: Path, inode: int, corpus_bytes: int, unique_uids: bool, segments: List[Dict[str, Any]]) -> None:
+    payload = {
+        "version": INDEX_VERSION,
+        "corpus_bytes": int(corpus_bytes),
+        "corpus_inode": int(inode),
+        "unique_uids": bool(unique_uids),
+        "n_docs": sum(int(e["n_docs"]) for e in segments),
+        "segments": segments,
+    }
+    atomic_write_text(ipath, json.dumps(payload, ensure_ascii=False, separators=(",", ":")))
+
+
+def _remove_unlisted_segments(sdir: Path, segments: List[Dict[str, Any]]) -> None:
+    keep = {str(e["file"]) for e in segments}
+    try:
+        names = os.listdir(sdir)
+    except Exception:
+        return
+    for name in names:
+        if name.startswith("seg-") and name not in keep:
+            try:
+                (sdir / name).unlink()
+            except Exception:
+                pass
+
+
+def _uids_unique(uids: List[str], existing: Optional[Iterable[str]] = None) -> bool:
+    if not all(uids) or len(set(uids)) != len(uids):
+        return False
+    return existing is None or not (set(uids) & set(existing))
+
+
+def sync_index(corpus_path: Path) -> Dict[str, Any]:
+    """
+    让索引追上 corpus：
+    - 清单缺失/版本不符/inode 变化/corpus 变短/分段缺失：全量重建成一个分段
+    - 否则只把 corpus_bytes 之后新追加的行写成一个新分段（ingest 每次追加后调用），
+      分段数超过 MAX_SEGMENTS 时合并重写
+    """
+    corpus_path = Path(corpus_path)
+    ipath = index_path_for(corpus_path)
+    sdir = segments_dir_for(corpus_path)
+    spath = stats_path_for(corpus_path)
+    if not corpus_path.exists() or not corpus_path.is_file():
+        return {"index": str(ipath), "rebuilt": False, "added_lines": 0}
+
+    st = corpus_path.stat()
+    inode = int(st.st_ino)
+    manifest = _read_json(ipath) if ipath.exists() else None
+    segments: List[Dict[str, Any]] = list((manifest or {}).get("segments") or [])
+    if (
+        manifest is None
+        or int(manifest.get("corpus_inode") or 0) != inode
+        or int(manifest.get("corpus_bytes") or 0) > int(st.st_size)
+        or not all((sdir / str(e.get("file"))).exists() for e in segments)
+    ):
+        seg = CorpusIndex(corpus_inode=inode)
+        added = _index_tail(seg, corpus_path, 0)
+        unique = _uids_unique(seg.uids())
+        segments = [_write_segment(sdir, inode, 0, seg)]
+        _write_manifest(ipath, inode, seg.corpus_bytes, unique, segments)
+        _remove_unlisted_segments(sdir, segments)
+        _write_stats(spath, seg.corpus_bytes, CorpusStats.from_index(seg))
+        return {"index": str(ipath), "stats": str(spath), "rebuilt": True, "added_lines": int(added), "unique_uids": unique}
+
+    start = int(manifest.get("corpus_bytes") or 0)
+    n_docs = int(manifest.get("n_docs") or 0)
+    unique = bool(manifest.get("unique_uids", False))
+    seg = CorpusIndex(corpus_inode=inode, corpus_bytes=start)
+    added = _index_tail(seg, corpus_path, start, first_doc=n_docs)
+    if added:
+        if unique:
+            # 旧行的 uid 从已合并的索引里取（本进程 ingest 去重时通常已加载过，命中缓存）
+            old = _load_index(ipath)
+            unique = old is not None and _uids_unique(seg.uids(), old.uids())
+        segments.append(_write_segment(sdir, inode, n_docs, seg))
+        stats = _add_stats(_read_stats_at(spath, start), CorpusStats.from_index(seg))
+        if len(segments) > MAX_SEGMENTS or stats is None:
+            merged = _load_index(ipath)
+            if merged is not None:
+                merged = merged.merged_with({"corpus_bytes": seg.corpus_bytes, "docs": seg.docs, "postings": seg.postings}, "")
+                if len(segments) > MAX_SEGMENTS:
+                    segments = [_write_segment(sdir, inode, 0, merged)]
+                stats = CorpusStats.from_index(merged)
+        _write_manifest(ipath, inode, seg.corpus_bytes, unique, segments)
+        _remove_unlisted_segments(sdir, segments)
+        if stats is not None:
+            _write_stats(spath, seg.corpus_bytes, stats)
+    elif not spath.exists():
+        merged = _load_index(ipath)
+        if merged is not None:
+            _write_stats(spath, merged.corpus_bytes, CorpusStats.from_index(merged))
+
+    return {
+        "index": str(ipath),
+        "stats": str(spath),
+        "rebuilt": False,
+        "added_lines": int(added),
+        "segments": len(segments),
+        "unique_uids": bool(unique),
+    }
+
+
+def _read_stats_at(spath: Path, corpus_bytes: int) -> Optional[CorpusStats]:
+    """
+    读取恰好覆盖到 corpus_bytes 的统计量（增量累加的前提）；对不上返回 None。
+    """
+    data = _read_json(spath) if spath.exists() else None
+    if data is None or int(data.get("corpus_bytes", -1)) != int(corpus_bytes) or "total_tokens" not in data:
+        return None
+    return CorpusStats(
+        n_docs=int(data.get("n_docs") or 0),
+        avgdl=float(data.get("avgdl") or 0.0),
+        df={str(k): int(v) for k, v in (data.get("df") or {}).items()},
+        total_tokens=int(data.get("total_tokens") or 0),
+    )
+
+
+def _add_stats(old: Optional[CorpusStats], new: CorpusStats) -> Optional[CorpusStats]:
+    if old is None:
+        return None
+    df = dict(old.df)
+    for tok, n in new.df.items():
+        df[tok] = df.get(tok, 0) + int(n)
+    total = old.total_tokens + new.total_tokens
+    n_docs = old.n_docs + new.n_docs
+    return CorpusStats(n_docs=n_docs, avgdl=(float(total) / n_docs) if n_docs else 0.0, df=df, total_tokens=total)
+
+
+def _write_stats(path: Path, corpus_bytes: int, st: CorpusStats) -> None:
+    payload = {
+        "version": INDEX_VERSION,
+        "corpus_bytes": int(corpus_bytes),
+        "n_docs": int(st.n_docs),
+        "total_tokens": int(st.total_tokens),
+        "avgdl": float(st.avgdl),
+        "df": st.df,
+    }
+    atomic_write_text(path, json.dumps(payload, ensure_ascii=False, separators=(",", ":")))
+
+
+# ---------- 查询侧：进程内缓存（按索引文件 mtime/size 失效） ----------
+
+_LOCK = threading.Lock()
+_CACHE: Dict[Path, Tuple[int, int, CorpusIndex]] = {}
+
+
+def _load_index(ipath: Path) -> Optional[CorpusIndex]:
+    """
+    按清单合并各分段（不检查新鲜度）。缓存的结果与清单同 inode、且其分段是清单的前缀时，只补读新增分段。
+    清单/分段缺失或不一致（例如读到一半被重建）返回 None。
+    """
+    try:
+        ist = ipath.stat()
+    except Exception:
+        return None
+    key = (int(ist.st_mtime_ns), int(ist.st_size))
+    with _LOCK:
+        hit = _CACHE.get(ipath)
+    if hit is not None and (hit[0], hit[1]) == key:
+        return hit[2]
+
+    manifest = _read_json(ipath)
+    if manifest is None:
+        return None
+    inode = int(manifest.get("corpus_inode") or 0)
+    entries = list(manifest.get("segments") or [])
+    names = [str(e.get("file")) for e in entries]
+
+    base = hit[2] if hit is not None else None
+    if base is None or base.corpus_inode != inode or names[: len(base.segments)] != base.segments:
+        base = CorpusIndex(corpus_inode=inode)
+    idx = base
+    sdir = ipath.with_name(ipath.name[: -len(".json")] + ".d")
+    for entry in entries[len(base.segments):]:
+        if int(entry.get("first_doc", -1)) != len(idx.docs):
+            return None
+        seg = _read_segment(sdir, entry)
+        if seg is None:
+            return None
+        idx = idx.merged_with(seg, str(entry.get("file")))
+    idx = replace(
+        idx,
+        corpus_bytes=int(manifest.get("corpus_bytes") or 0),
+        unique_uids=bool(manifest.get("unique_uids", False)),
+    )
+
+    with _LOCK:
+        _CACHE[ipath] = (key[0], key[1], idx)
+    return idx
+
+
+def load_fresh_index(corpus_path: Path) -> Optional[CorpusIndex]:
+    """
+    读取“新鲜”的索引：索引覆盖的字节数/inode 必须与当前 corpus 完全一致。
+    缺失或过期返回 None（调用方回退到全量扫描）。
+    """
+    corpus_path = Path(corpus_path)
+    try:
+        cst = corpus_path.stat()
+    except Exception:
+        return None
+    idx = _load_index(index_path_for(corpus_path))
+    if idx is None:
+        return None
+    if idx.corpus_bytes != int(cst.st_size) or idx.corpus_inode != int(cst.st_ino):
+        return None
+    return idx
+
+
+_STATS_CACHE: Dict[Path, Tuple[int, int, CorpusStats]] = {}
+
+
+def load_stats(corpus_path: Path) -> Optional[CorpusStats]:
+    """
+    读取 corpus.stats.json（按文件 mtime/size 缓存）。
+    统计量随语料缓慢变化，这里不要求与 corpus 严格同步；缺失返回 None。
+    """
+    spath = stats_path_for(Path(corpus_path))
+    try:
+        st = spath.stat()
+    except Exception:
+        return None
+
+    key = (int(st.st_mtime_ns), int(st.st_size))
+    with _LOCK:
+        hit = _STATS_CACHE.get(spath)
+    if hit is not None and (hit[0], hit[1]) == key:
+        return hit[2]
+
+    try:
+        with open(spath, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            return None
+        stats = CorpusStats(
+            n_docs=int(data.get("n_docs") or 0),
+            avgdl=float(data.get("avgdl") or 0.0),
+            df={str(k): int(v) for k, v in (data.get("df") or {}).items()},
+            total_tokens=int(data.get("total_tokens") or 0),
+        )
+    except Exception:
+        return None
+
+    with _LOCK:
+        _STATS_CACHE[spath] = (key[0], key[1], stats)
+    return stats
+
+
+def match_candidates(
+    idx: CorpusIndex, query_tokens: Iterable[str], *, max_scan: int = 0
+) -> Dict[int, Dict[str, int]]:
+    """
+    从 posting list 收集候选：doc -> {命中的 query token: tf}。
+    命中个数即 binary cosine 的交集大小；tf 供 BM25 使用。
+    max_scan > 0 时只看最后 max_scan 行（与扫描路径的 tail 语义一致）。
+    """
+    min_doc = 0
+    if int(max_scan) > 0:
+        min_doc = max(0, len(idx.docs) - int(max_scan))
+
+    matched: Dict[int, Dict[str, int]] = {}
+    for tok in set(query_tokens):
+        plist = idx.postings.get(tok)
+        if not plist:
+            continue
+        for i in range(0, len(plist), 2):
+            doc = plist[i]
+            if doc >= min_doc:
+                matched.setdefault(doc, {})[tok] = int(plist[i + 1])
+    return matched
+
+
+def read_lines_at(corpus_path: Path, offsets: Iterable[int]) -> Iterable[Tuple[int, str]]:
+    """
+    按字节偏移随机读取 corpus 行（只读候选行，不碰其余内容）。
+    """
+    with open(corpus_path, "rb") as f:
+        for off in offsets:
+            f.seek(int(off))
+            raw = f.readline()
+            try:
+                yield int(off), raw.decode("utf-8")
+            except Exception:
+                continue
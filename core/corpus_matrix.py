@@ -0,0 +1,215 @@
+"""
+corpus 的稀疏 chunk×token 二值矩阵（CSR，落盘在 corpus.csr/，一个数组一个 .npy）。
+
+由列存的预分词列 tok 派生（tok 本身就是按行排列的 CSR：结束偏移 = indptr，token id = 列号），
+这里只是把哈希 id 压成连续列号并补上转置，供扫描路径一次算完所有 chunk 的 binary cosine：
+- vocab.npy(i32)：出现过的 token id，升序；列号 = 在 vocab 中的下标
+- indptr.npy(i64, n+1) / indices.npy(i32)：CSR，第 i 行的列号是 indices[indptr[i]:indptr[i+1]]（行内升序）
+- t_indptr.npy(i64, V+1) / t_indices.npy(i32)：转置（CSC），第 c 列的行号升序；
+  query 向量只有十几个非零列，X·q 按列累加只碰这些列的非零元，代价与 corpus 大小无关（计数用 np.unique，不开 n 长数组）
+- |d| 就是 indptr 的差分，不另存；打分用 inter / sqrt(|q|·|d|)，与 _score_token_ids 逐位一致
+- meta.json：corpus_bytes / inode / 行数 / unique_uids（有效行 uid 全部非空且互不重复）
+
+新鲜度规则与倒排索引/列存相同（字节数 + inode）。.npy 不能原地追加，列存有变化时整体重建
+（10 万 chunk 约 1 秒，在 ingest 末尾做一次）；需要 NumPy，没有时跳过，检索回退逐行求交。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .corpus_columns import load_fresh_columns
+from .utils.io_helper import atomic_write_text
+
+MATRIX_VERSION = 1
+
+_ARRAYS = ("vocab", "indptr", "indices", "t_indptr", "t_indices")
+
+
+def matrix_dir_for(corpus_path: Path) -> Path:
+    """
+    data/corpus.jsonl -> data/corpus.csr/
+    """
+    p = Path(corpus_path)
+    return p.with_name(f"{p.stem}.csr")
+
+
+def _read_meta(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    if not isinstance(data, dict) or data.get("version") != MATRIX_VERSION:
+        return None
+    return data
+
+
+def _save_npy(path: Path, arr: Any) -> None:
+    import numpy as np
+
+    # 先写临时文件再替换：已 mmap 旧文件的读者不受影响
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, arr, allow_pickle=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def sync_matrix(corpus_path: Path) -> Dict[str, Any]:
+    """
+    让 CSR 矩阵追上列存（需先 sync_columns）；列存不新鲜或没有 NumPy 时跳过。
+    """
+    corpus_path = Path(corpus_path)
+    mdir = matrix_dir_for(corpus_path)
+    try:
+        import numpy as np
+    except Exception:
+        return {"matrix": str(mdir), "skipped": "numpy 不可用"}
+
+    cols = load_fresh_columns(corpus_path)
+    if cols is None:
+        return {"matrix": str(mdir), "skipped": "列存不存在或已过期"}
+
+    meta = _read_meta(mdir / "meta.json")
+    if (
+        meta is not None
+        and int(meta.get("corpus_bytes") or 0) == cols.corpus_bytes
+        and int(meta.get("corpus_inode") or 0) == cols.corpus_inode
+        and int(meta.get("n") or 0) == cols.n
+    ):
+        return {"matrix": str(mdir), "rebuilt": False, "n": cols.n}
+
+    ends, ids = cols.np_tokens()
+    n = int(cols.n)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = ends
+    vocab = np.unique(ids).astype(np.int32)
+    indices = np.searchsorted(vocab, ids).astype(np.int32)
+
+    # 转置：按列号稳定排序非零元，行号在每列内保持升序
+    row_of = np.repeat(np.arange(n, dtype=np.int32), np.diff(indptr))
+    order = np.argsort(indices, kind="stable")
+    t_indices = row_of[order]
+    t_indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    t_indptr[1:] = np.cumsum(np.bincount(indices, minlength=len(vocab)))
+
+    seen: set = set()
+    unique_uids = True
+    for i in range(n):
+        if not cols.is_valid(i):
+            continue
+        uid = cols.uid(i)
+        if not uid or uid in seen:
+            unique_uids = False
+            break
+        seen.add(uid)
+
+    mdir.mkdir(parents=True, exist_ok=True)
+    for name, arr in (
+        ("vocab", vocab),
+        ("indptr", indptr),
+        ("indices", indices),
+        ("t_indptr", t_indptr),
+        ("t_indices", t_indices),
+    ):
+        _save_npy(mdir / f"{name}.npy", arr)
+
+    new_meta = {
+        "version": MATRIX_VERSION,
+        "corpus_bytes": cols.corpus_bytes,
+        "corpus_inode": cols.corpus_inode,
+        "n": n,
+        "nnz": int(len(indices)),
+        "vocab": int(len(vocab)),
+        "unique_uids": bool(unique_uids),
+    }
+    atomic_write_text(mdir / "meta.json", json.dumps(new_meta, ensure_ascii=False, indent=2))
+    return {"matrix": str(mdir), "rebuilt": True, "n": n, "nnz": int(len(indices))}
+
+
+class CorpusMatrix:
+    """
+    只读视图：各数组以 mmap 方式 np.load，首次查询才真正读页。
+    """
+
+    def __init__(self, mdir: Path, meta: Dict[str, Any]) -> None:
+        import numpy as np
+
+        self.dir = Path(mdir)
+        self.n = int(meta["n"])
+        self.corpus_bytes = int(meta["corpus_bytes"])
+        self.corpus_inode = int(meta["corpus_inode"])
+        self.unique_uids = bool(meta.get("unique_uids", False))
+        for name in _ARRAYS:
+            setattr(self, name, np.load(self.dir / f"{name}.npy", mmap_mode="r", allow_pickle=False))
+        if len(self.indptr) != self.n + 1 or int(self.indptr[-1]) != len(self.indices):
+            raise ValueError(f"CSR 形状与 meta 不符: {self.dir}")
+        if len(self.t_indptr) != len(self.vocab) + 1 or int(self.t_indptr[-1]) != len(self.t_indices):
+            raise ValueError(f"转置形状与 meta 不符: {self.dir}")
+        self.doc_len = np.diff(self.indptr)
+
+    def overlap(self, query_ids: Any, start: int = 0) -> Tuple[Any, Any]:
+        """
+        X·q（q 为 query 的二值向量）：返回 (rows, inter)，只含交集非空且行号 >= start 的行，行号升序。
+        """
+        import numpy as np
+
+        q = np.asarray(query_ids, dtype=np.int32)
+        c = np.searchsorted(self.vocab, q)
+        ok = c < len(self.vocab)
+        c, q = c[ok], q[ok]
+        c = c[self.vocab[c] == q]  # corpus 里没出现过的 query token 不贡献交集
+        if len(c) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        parts = [self.t_indices[self.t_indptr[j]:self.t_indptr[j + 1]] for j in c.tolist()]
+        rows = np.concatenate(parts) if len(parts) > 1 else np.asarray(parts[0])
+        if start > 0:
+            rows = rows[rows >= start]
+        # 按命中的 posting 计数（O(nnz log nnz)），不分配 O(corpus) 的稠密计数数组
+        hit, inter = np.unique(rows, return_counts=True)
+        return hit.astype(np.int64, copy=False), inter
+
+
+_LOCK = threading.Lock()
+_CACHE: Dict[Path, Tuple[int, int, CorpusMatrix]] = {}
+
+
+def load_fresh_matrix(corpus_path: Path) -> Optional[CorpusMatrix]:
+    """
+    读取与当前 corpus 完全同步（字节数 + inode）的矩阵；缺失/过期/无 NumPy 返回 None。
+    """
+    corpus_path = Path(corpus_path)
+    mdir = matrix_dir_for(corpus_path)
+    meta_path = mdir / "meta.json"
+    try:
+        cst = corpus_path.stat()
+        mst = meta_path.stat()
+    except Exception:
+        return None
+
+    key = (int(mst.st_mtime_ns), int(mst.st_size))
+    with _LOCK:
+        hit = _CACHE.get(mdir)
+    if hit is not None and (hit[0], hit[1]) == key:
+        mat = hit[2]
+    else:
+        meta = _read_meta(meta_path)
+        if meta is None:
+            return None
+        try:
+            mat = CorpusMatrix(mdir, meta)
+        except Exception:
+            return None
+        with _LOCK:
+            _CACHE[mdir] = (key[0], key[1], mat)
+
+    if mat.corpus_bytes != int(cst.st_size) or mat.corpus_inode != int(cst.st_ino):
+        return None
+    return mat
@@ -0,0 +1,236 @@
+"""
+corpus 的稠密向量存储（corpus.vec/，与 corpus.jsonl 行一一对应）。
+
+- vectors.f16：n×dim 的 float16 行主序原始矩阵（已 L2 归一化），np.memmap 只读映射，按行追加
+- meta.json：向量器 name / dim / 行数 / corpus_bytes / inode
+- 坏行/空正文也占一行（零向量），保证行号与列存、倒排索引对齐
+- 新鲜度规则与列存相同（字节数 + inode）；向量器变化、inode 变化、corpus 变短时整体重算，
+  否则只给 corpus_bytes 之后的新行算向量（ingest 末尾调用，SB_EMBED=1 时才维护）
+- 检索是暴力内积（行已归一化 = cosine）。NumPy 的 float16 没有 BLAS，转 float32 又很慢（10 万×256 约 100ms），
+  所以默认在进程内常驻一份 float32 副本（首次检索时转换，存储更新后随新视图重建；10 万×256 约 100MB），
+  之后每次检索就是一次 float32 矩阵-向量乘（约十几毫秒）；SB_EMBED_F32_CACHE=0 时改为每次分块转换，省内存但慢
+- 规模再大再换 IVF
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import env_bool
+from .utils.io_helper import atomic_write_text
+
+VECTORS_VERSION = 1
+
+_SEARCH_BLOCK = 16384
+
+
+def vectors_dir_for(corpus_path: Path) -> Path:
+    """
+    data/corpus.jsonl -> data/corpus.vec/
+    """
+    p = Path(corpus_path)
+    return p.with_name(f"{p.stem}.vec")
+
+
+def _read_meta(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except Exception:
+        return None
+    if not isinstance(meta, dict) or meta.get("version") != VECTORS_VERSION:
+        return None
+    if meta.get("byteorder") != sys.byteorder:
+        return None
+    return meta
+
+
+def _line_text(raw: bytes) -> str:
+    try:
+        obj = json.loads(raw.decode("utf-8"))
+    except Exception:
+        return ""
+    if not isinstance(obj, dict):
+        return ""
+    return str(obj.get("text") or "").strip()
+
+
+def sync_vectors(corpus_path: Path, embedder: Any = None, *, batch: int = 256) -> Dict[str, Any]:
+    """
+    让向量存储追上 corpus：只为新增行算向量并追加；向量文件先写，meta 最后原子替换。
+    """
+    from .corpus_index import _iter_lines_from
+    from .embedding import get_embedder
+
+    corpus_path = Path(corpus_path)
+    vdir = vectors_dir_for(corpus_path)
+    meta_path = vdir / "meta.json"
+    try:
+        import numpy as np
+    except Exception:
+        return {"vectors": str(vdir), "skipped": "numpy 不可用"}
+    if not corpus_path.exists() or not corpus_path.is_file():
+        return {"vectors": str(vdir), "rebuilt": False, "added_rows": 0}
+
+    embedder = embedder or get_embedder()
+    dim = int(embedder.dim)
+    st = corpus_path.stat()
+    meta = _read_meta(meta_path)
+    rebuilt = False
+    if (
+        meta is None
+        or meta.get("embedder") != embedder.name
+        or int(meta.get("dim") or 0) != dim
+        or int(meta.get("corpus_inode") or 0) != int(st.st_ino)
+        or int(meta.get("corpus_bytes") or 0) > int(st.st_size)
+    ):
+        meta = {"n": 0, "corpus_bytes": 0}
+        rebuilt = True
+
+    vdir.mkdir(parents=True, exist_ok=True)
+    vec_path = vdir / "vectors.f16"
+    if rebuilt and vec_path.exists():
+        # 先 unlink 再新建：其它进程已 mmap 的旧文件不受影响
+        vec_path.unlink()
+    n = int(meta["n"])
+    row_bytes = dim * 2
+    with open(vec_path, "ab") as f:
+        f.truncate(n * row_bytes)
+
+    end = int(meta["corpus_bytes"])
+    added = 0
+    texts: List[str] = []
+
+    def _flush() -> None:
+        nonlocal texts
+        if not texts:
+            return
+        out = np.zeros((len(texts), dim), dtype=np.float16)
+        live = [i for i, t in enumerate(texts) if t]
+        if live:
+            out[live] = embedder.embed([texts[i] for i in live]).astype(np.float16)
+        with open(vec_path, "ab") as f:
+            out.tofile(f)
+        texts = []
+
+    for offset, raw in _iter_lines_from(corpus_path, end):
+        end = offset + len(raw)
+        texts.append(_line_text(raw))
+        added += 1
+        if len(texts) >= int(batch):
+            _flush()
+    _flush()
+
+    if added or rebuilt:
+        new_meta = {
+            "version": VECTORS_VERSION,
+            "byteorder": sys.byteorder,
+            "embedder": embedder.name,
+            "dim": dim,
+            "corpus_bytes": int(end),
+            "corpus_inode": int(st.st_ino),
+            "n": n + added,
+        }
+        atomic_write_text(meta_path, json.dumps(new_meta, ensure_ascii=False, indent=2))
+
+    return {"vectors": str(vdir), "rebuilt": rebuilt, "added_rows": int(added), "embedder": embedder.name}
+
+
+class CorpusVectors:
+    def __init__(self, vdir: Path, meta: Dict[str, Any]) -> None:
+        import numpy as np
+
+        self.dir = Path(vdir)
+        self.n = int(meta["n"])
+        self.dim = int(meta["dim"])
+        self.embedder = str(meta.get("embedder") or "")
+        self.corpus_bytes = int(meta["corpus_bytes"])
+        self.corpus_inode = int(meta["corpus_inode"])
+        if self.n > 0:
+            self.vectors = np.memmap(self.dir / "vectors.f16", dtype=np.float16, mode="r", shape=(self.n, self.dim))
+        else:
+            self.vectors = np.zeros((0, self.dim), dtype=np.float16)
+        self._f32: Any = None
+        self._f32_lock = threading.Lock()
+
+    def _working_copy(self) -> Any:
+        import numpy as np
+
+        with self._f32_lock:
+            if self._f32 is None:
+                self._f32 = np.asarray(self.vectors, dtype=np.float32)
+            return self._f32
+
+    def scores(self, query_vec: Any, start: int = 0) -> Any:
+        """
+        第 start 行起每行与 query 的 cosine（float32，长 n - start）。
+        """
+        import numpy as np
+
+        q = np.asarray(query_vec, dtype=np.float32).reshape(-1)
+        if env_bool("SB_EMBED_F32_CACHE", "1"):
+            return self._working_copy()[int(start):] @ q
+        out = np.empty(max(0, self.n - int(start)), dtype=np.float32)
+        for s in range(int(start), self.n, _SEARCH_BLOCK):
+            e = min(self.n, s + _SEARCH_BLOCK)
+            out[s - int(start):e - int(start)] = self.vectors[s:e].astype(np.float32) @ q
+        return out
+
+    def search(self, query_vec: Any, top_n: int, start: int = 0) -> Tuple[Any, Any]:
+        """
+        暴力检索：返回 (rows, scores)，按分数降序，只含分数 > 0 的行。
+        """
+        import numpy as np
+
+        sc = self.scores(query_vec, start=start)
+        k = min(int(top_n), len(sc))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = np.argpartition(-sc, k - 1)[:k]
+        top = top[np.argsort(-sc[top], kind="stable")]
+        top = top[sc[top] > 0]
+        return top + int(start), sc[top]
+
+
+_LOCK = threading.Lock()
+_CACHE: Dict[Path, Tuple[int, int, CorpusVectors]] = {}
+
+
+def load_fresh_vectors(corpus_path: Path, embedder_name: Optional[str] = None) -> Optional[CorpusVectors]:
+    """
+    读取与当前 corpus 完全同步（字节数 + inode）、且由同一向量器生成的向量存储；否则返回 None。
+    """
+    corpus_path = Path(corpus_path)
+    vdir = vectors_dir_for(corpus_path)
+    meta_path = vdir / "meta.json"
+    try:
+        cst = corpus_path.stat()
+        mst = meta_path.stat()
+    except Exception:
+        return None
+
+    key = (int(mst.st_mtime_ns), int(mst.st_size))
+    with _LOCK:
+        hit = _CACHE.get(vdir)
+    if hit is not None and (hit[0], hit[1]) == key:
+        vecs = hit[2]
+    else:
+        meta = _read_meta(meta_path)
+        if meta is None:
+            return None
+        try:
+            vecs = CorpusVectors(vdir, meta)
+        except Exception:
+            return None
+        with _LOCK:
+            _CACHE[vdir] = (key[0], key[1], vecs)
+
+    if vecs.corpus_bytes != int(cst.st_size) or vecs.corpus_inode != int(cst.st_ino):
+        return None
+    if embedder_name is not None and vecs.embedder != embedder_name:
+        return None
+    return vecs
@@ -0,0 +1,120 @@
+"""
+文本向量化（语义检索用，SB_EMBED=1 时启用）。
+
+- hashing（默认）：确定性的哈希向量器，无模型依赖、跨进程稳定。特征 = 检索分词（英文 word + 中文 2-gram）
+  + 中文单字 + 英文 3-gram 子词（trade/trading、仓位/加仓 这类改写能共享一部分特征），
+  crc32 取桶与符号，次线性 tf，L2 归一化
+- 本地模型：SB_EMBED_MODEL 填 sentence-transformers 模型名或本地路径（如多语言 MiniLM），固定跑在 CPU；
+  未安装 sentence-transformers 或加载失败时回退 hashing
+
+name 写进向量存储的 meta：换模型/维度后下次 ingest 会整体重算。
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import threading
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+from .config import env_int, env_str
+
+HASH_VERSION = 1
+
+_ZH_CHAR = re.compile(r"[\u4e00-\u9fff]")
+_EN_WORD = re.compile(r"[a-z0-9]{3,}")
+
+
+def _hash_features(text: str) -> Dict[str, float]:
+    from .retrieval import _tokenize
+
+    t = (text or "").lower()
+    feats: Dict[str, float] = {}
+    for tok, tf in Counter(_tokenize(t)).items():
+        feats[f"t:{tok}"] = 1.0 + math.log(tf)
+    # 子词特征权重减半：只用来拉近改写，不盖过整词
+    for ch, tf in Counter(_ZH_CHAR.findall(t)).items():
+        feats[f"c:{ch}"] = 0.5 * (1.0 + math.log(tf))
+    grams: Counter = Counter()
+    for w in _EN_WORD.findall(t):
+        w = f"^{w}$"
+        grams.update(w[i : i + 3] for i in range(len(w) - 2))
+    for g, tf in grams.items():
+        feats[f"g:{g}"] = 0.5 * (1.0 + math.log(tf))
+    return feats
+
+
+class HashingEmbedder:
+    def __init__(self, dim: int = 256) -> None:
+        self.dim = max(8, int(dim))
+        self.name = f"hash-v{HASH_VERSION}-{self.dim}"
+
+    def embed_one(self, text: str) -> List[float]:
+        vec = [0.0] * self.dim
+        for feat, w in _hash_features(text).items():
+            h = zlib.crc32(feat.encode("utf-8"))
+            vec[h % self.dim] += w if (h >> 31) & 1 else -w
+        norm = math.sqrt(sum(x * x for x in vec))
+        if norm > 0:
+            vec = [x / norm for x in vec]
+        return vec
+
+    def embed(self, texts: Sequence[str]) -> Any:
+        import numpy as np
+
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            out[i] = self.embed_one(t)
+        return out
+
+
+class SentenceTransformerEmbedder:
+    """
+    本地 sentence-transformers 模型（CPU）；输出已 L2 归一化。
+    """
+
+    def __init__(self, model: str) -> None:
+        from sentence_transformers import SentenceTransformer
+
+        self._model = SentenceTransformer(model, device="cpu")
+        self.dim = int(self._model.get_sentence_embedding_dimension())
+        self.name = f"st:{model}:{self.dim}"
+
+    def embed(self, texts: Sequence[str]) -> Any:
+        import numpy as np
+
+        vecs = self._model.encode(
+            list(texts),
+            batch_size=env_int("SB_EMBED_BATCH", "64"),
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return np.asarray(vecs, dtype=np.float32)
+
+
+_EMBEDDER: Optional[Any] = None
+_EMBEDDER_KEY: Optional[tuple] = None
+_EMBEDDER_LOCK = threading.Lock()
+
+
+def get_embedder() -> Any:
+    """
+    进程级共享的向量器（按 SB_EMBED_MODEL / SB_EMBED_DIM 选择，配置变化时重建）。
+    """
+    global _EMBEDDER, _EMBEDDER_KEY
+    model = env_str("SB_EMBED_MODEL", "")
+    dim = env_int("SB_EMBED_DIM", "256")
+    key = (model, dim)
+    with _EMBEDDER_LOCK:
+        if _EMBEDDER is None or _EMBEDDER_KEY != key:
+            emb: Any = None
+            if model:
+                try:
+                    emb = SentenceTransformerEmbedder(model)
+                except Exception as e:
+                    print(f"⚠️ [embedding] 本地模型不可用（{type(e).__name__}: {e}），回退 hashing 向量")
+            _EMBEDDER = emb if emb is not None else HashingEmbedder(dim)
+            _EMBEDDER_KEY = key
+        return _EMBEDDER
@@ -50,6 +50,16 @@ def _sanitize_prompt_name(prompt_name: str) -> str:
     return name
 
 
+def prompt_path(prompt_name: str) -> Path:
+    """
+    prompt 文件的实际路径（不检查是否存在）。
+    """
+    fname = _sanitize_prompt_name(prompt_name)
+    # Card 6：允许通过环境变量覆盖 prompts 目录（迁移/测试用），默认仍是项目 prompts/
+    base_dir = Path(os.getenv("SB_PROMPTS_DIR", "")).expanduser() if os.getenv("SB_PROMPTS_DIR") else PROMPTS_DIR
+    return base_dir / fname
+
+
 def load_prompt(prompt_name: str) -> str:
     """
     读取 prompts/*.md 并缓存（基于文件 mtime 自动失效）。
@@ -58,9 +68,7 @@ def load_prompt(prompt_name: str) -> str:
     - 返回值会 strip()，并保证非空（否则抛 PromptError）
     """
     fname = _sanitize_prompt_name(prompt_name)
-    # Card 6：允许通过环境变量覆盖 prompts 目录（迁移/测试用），默认仍是项目 prompts/
-    base_dir = Path(os.getenv("SB_PROMPTS_DIR", "")).expanduser() if os.getenv("SB_PROMPTS_DIR") else PROMPTS_DIR
-    path = base_dir / fname
+    path = prompt_path(fname)
 
     if not path.exists():
         raise FileNotFoundError(f"prompt 不存在: {fname}（期望路径: {path}）")
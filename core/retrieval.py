@@ -4,15 +4,31 @@ import json
 import math
 import os
 import re
-from dataclasses import dataclass
+from collections import Counter
+from functools import lru_cache
+from dataclasses import asdict, dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Collection, Dict, Iterable, List, Optional, Tuple
 
-from .config import debug_log, env_bool, env_float, log_telemetry, weighting_mode
-from .weighting import compute_cog_weight, score_depth, score_time
+from .config import debug_log, env_bool, env_float, env_int, log_telemetry, weighting_mode
+from .corpus_columns import SOURCE_INVALID, CorpusColumns, count_common, load_fresh_columns, read_line_obj, token_id_set
+from .corpus_index import CorpusIndex, CorpusStats, load_fresh_index, load_stats, match_candidates, read_lines_at
+from .corpus_matrix import CorpusMatrix, load_fresh_matrix
+from .corpus_vectors import CorpusVectors, load_fresh_vectors
+from .embedding import get_embedder
+from .retrieval_cache import Candidate, corpus_stamp, get_retrieval_cache
+from .scoring import get_scorer, similarity_mode
+from .weighting import (
+    compute_cog_weight,
+    compute_cog_weight_batch,
+    numpy_available,
+    score_depth,
+    score_time,
+    score_time_batch,
+)
 from .utils.time_helper import parse_dt, infer_dt_from_notion_filename
-from .utils.io_helper import read_text_file
+from .utils.io_helper import iter_last_lines, read_text_file
 
 def get_recent_corpus_snippets(
     corpus_path: Path,
@@ -36,11 +52,24 @@ def get_recent_corpus_snippets(
     try:
         if not corpus_path.exists() or not corpus_path.is_file():
             return ""
-        lines = corpus_path.read_text(encoding="utf-8").splitlines()
+        cols = load_fresh_columns(corpus_path)
+        lines = [] if cols is not None else corpus_path.read_text(encoding="utf-8").splitlines()
     except Exception:
         return ""
 
     items: List[Dict[str, Any]] = []
+    if cols is not None:
+        # 列存：先在数值列上算完权重并过滤，只对入选的行解码正文
+        items = _recent_items_from_columns(
+            cols,
+            now=now,
+            decay_enabled=decay_enabled,
+            decay_window_days=decay_window_days,
+            decay_half_life_days=decay_half_life_days,
+            depth_alpha=depth_alpha,
+            max_items=int(max_items),
+            max_chars=int(max_chars),
+        )
     for ln in lines:
         try:
             obj = json.loads(ln)
@@ -96,6 +125,84 @@ def get_recent_corpus_snippets(
         out.append(f"- {dt_str} | {it['source']} | score={it['final_score']:.3f} | {it['text']}")
     return "\n".join(out)
 
+
+def _recent_items_from_columns(
+    cols: CorpusColumns,
+    *,
+    now: datetime,
+    decay_enabled: bool,
+    decay_window_days: float,
+    decay_half_life_days: float,
+    depth_alpha: float,
+    max_items: int,
+    max_chars: int,
+) -> List[Dict[str, Any]]:
+    """
+    get_recent_corpus_snippets 的列存实现：口径与 JSONL 逐行版一致
+    （dt 缺失跳过；depth_score 存在用 cog_weight，否则用 weight；窗口外低分过滤）。
+    """
+    scored: List[Tuple[int, datetime, float]] = []
+    if numpy_available() and cols.n:
+        import numpy as np
+
+        ts = cols.np_column("dt")
+        keep = (cols.np_column("source") != SOURCE_INVALID) & ~np.isnan(ts)
+        if decay_enabled:
+            tw = score_time_batch(ts, now, window_days=decay_window_days, half_life_days=decay_half_life_days)
+        else:
+            tw = np.ones(cols.n, dtype=np.float64)
+
+        ds = cols.np_column("depth_score")
+        w = cols.np_column("weight")
+        cw = np.where(
+            ~np.isnan(ds),
+            compute_cog_weight_batch(ds, alpha=depth_alpha),
+            np.where(np.isnan(w), 1.0, w),
+        )
+        final = cw * tw
+        keep &= ~((tw <= 0.01) & (final < 0.1))
+        for i in np.flatnonzero(keep).tolist():
+            scored.append((i, datetime.fromtimestamp(float(ts[i]), tz=timezone.utc), float(final[i])))
+    else:
+        for i in range(cols.n):
+            if not cols.is_valid(i):
+                continue
+            ts_i = cols.dt[i]
+            if math.isnan(ts_i):
+                continue
+            dt = datetime.fromtimestamp(ts_i, tz=timezone.utc)
+
+            tw_i = score_time(dt, now=now, window_days=decay_window_days, half_life_days=decay_half_life_days) if decay_enabled else 1.0
+
+            ds_val = cols.depth_score[i]
+            if not math.isnan(ds_val):
+                cw_i = compute_cog_weight(float(ds_val), alpha=depth_alpha)
+            else:
+                w_i = cols.weight[i]
+                cw_i = 1.0 if math.isnan(w_i) else float(w_i)
+
+            final_score = cw_i * tw_i
+            if tw_i <= 0.01 and final_score < 0.1:
+                continue
+            scored.append((i, dt, final_score))
+
+    # 稳定排序后按序解码正文，跳过空文本，凑够 max_items 即停
+    scored.sort(key=lambda x: x[2], reverse=True)
+    items: List[Dict[str, Any]] = []
+    for i, dt, final_score in scored:
+        text = cols.text(i).strip().replace("\n", " ")
+        if not text:
+            continue
+        items.append({
+            "dt": dt,
+            "source": cols.source_name(i),
+            "final_score": final_score,
+            "text": text[: int(max_chars)],
+        })
+        if len(items) >= int(max_items):
+            break
+    return items
+
 def load_recent_user_memory(log_path: Path, max_entries: int = 12) -> str:
     """
     兼容层：加载最近的私密日志。
@@ -146,16 +253,10 @@ def _infer_dt_from_notion_filename(file_path: str) -> Optional[datetime]:
 
 def _iter_last_lines(path: Path, max_lines: int) -> Iterable[str]:
     """
-    轻量 tail：不做复杂 seek，直接读全文后截断（对 max_lines 较小足够）。
-    未来 corpus 变大可替换为真正的 tail 实现。
+    tail：从文件末尾按块反向读取，只取最后 max_lines 行（max_lines<=0 时全量）。
+    读取成本只与 max_lines 相关，不随 corpus 总大小增长。
     """
-    try:
-        lines = path.read_text(encoding="utf-8").splitlines()
-    except Exception:
-        return []
-    if max_lines <= 0:
-        return lines
-    return lines[-int(max_lines) :]
+    return iter_last_lines(path, int(max_lines))
 
 
 def _tokenize(text: str) -> List[str]:
@@ -180,16 +281,20 @@ def _tokenize(text: str) -> List[str]:
     return out
 
 
+@lru_cache(maxsize=256)
+def _query_token_set(query: str) -> frozenset:
+    # 同一 query 对多条文本打分时只分词一次
+    return frozenset(_tokenize(query))
+
+
 def base_similarity(query: str, text: str) -> float:
     """
     base_similarity ∈ [0,1]：用 token overlap 的 cosine（binary）近似。
     """
-    q = _tokenize(query)
-    d = _tokenize(text)
-    if not q or not d:
+    qset = _query_token_set(query)
+    dset = set(_tokenize(text))
+    if not qset or not dset:
         return 0.0
-    qset = set(q)
-    dset = set(d)
     inter = len(qset & dset)
     if inter <= 0:
         return 0.0
@@ -211,6 +316,8 @@ class RetrievalHit:
     cog_weight: float
     time_weight: float
     final_score: float
+    # 语义检索（SB_EMBED=1）时的 cosine(query, chunk)；此时 base_similarity 是词法与它的加权和
+    dense_similarity: Optional[float] = None
 
 
 def rerank_with_weights(
@@ -234,6 +341,529 @@ def rerank_with_weights(
     return hits
 
 
+def _match_tf(query_tokens: Collection[str], doc_tf: Dict[str, int]) -> Dict[str, int]:
+    return {t: int(doc_tf[t]) for t in query_tokens if t in doc_tf}
+
+
+def _score_texts(
+    rows: Iterable[Tuple[Any, str]],
+    query_tokens: Collection[str],
+    scorer: Any,
+    *,
+    min_similarity: float,
+) -> Iterable[Tuple[Any, str, float]]:
+    """
+    扫描打分：rows 为 (key, text)，逐条分词后交给打分器，产出通过阈值的 (key, text, sim)。
+    query 只在调用方分词一次；BM25 缺少落盘统计量时，用本批 rows 现算 df/avgdl。
+    """
+    scored: List[Tuple[Any, str, Counter]] = [(key, text, Counter(_tokenize(text))) for key, text in rows]
+
+    if scorer.needs_stats and not scorer.stats.n_docs:
+        scorer.stats = CorpusStats.from_token_counts(tf for _, _, tf in scored)
+
+    for key, text, tf in scored:
+        sim = scorer.score(
+            query_tokens,
+            _match_tf(query_tokens, tf),
+            doc_len=int(sum(tf.values())),
+            doc_uniq=len(tf),
+        )
+        if sim < float(min_similarity):
+            continue
+        yield key, text, sim
+
+
+def _score_index(
+    index: CorpusIndex,
+    query_tokens: Collection[str],
+    scorer: Any,
+    *,
+    max_scan: int,
+    min_similarity: float,
+) -> List[Tuple[int, float]]:
+    """
+    索引打分：posting list 求交集（带 tf）→ 用预存的 token 数打分，不读任何正文。
+    返回按行号排序的 (doc, sim)，保证与扫描路径的排序/去重稳定性一致。
+    """
+    if not query_tokens:
+        return []
+    matched = match_candidates(index, query_tokens, max_scan=int(max_scan))
+
+    out: List[Tuple[int, float]] = []
+    for doc in sorted(matched):
+        meta = index.docs[doc]
+        if not meta or int(meta[2]) <= 0:
+            continue
+        sim = scorer.score(query_tokens, matched[doc], doc_len=int(meta[3]), doc_uniq=int(meta[2]))
+        if sim >= float(min_similarity):
+            out.append((doc, sim))
+    return out
+
+
+def _jsonl_candidates(
+    corpus_path: Path,
+    index: Optional[CorpusIndex],
+    query_tokens: Collection[str],
+    scorer: Any,
+    *,
+    max_scan: int,
+    min_similarity: float,
+) -> Iterable[Tuple[Dict[str, Any], str, float]]:
+    """
+    JSONL 路径：有新鲜索引则只回读通过阈值的行，否则扫描最后 max_scan 行。
+    """
+    if index is not None:
+        scored = _score_index(index, query_tokens, scorer, max_scan=max_scan, min_similarity=min_similarity)
+        sims = {int(index.docs[doc][0]): sim for doc, sim in scored}
+        for off, ln in read_lines_at(corpus_path, [int(index.docs[doc][0]) for doc, _ in scored]):
+            try:
+                obj = json.loads(ln)
+            except Exception:
+                continue
+            text = (obj.get("text") or "").strip()
+            if text:
+                yield obj, text, sims[off]
+        return
+
+    def _rows() -> Iterable[Tuple[Dict[str, Any], str]]:
+        for ln in _iter_last_lines(corpus_path, int(max_scan)):
+            try:
+                obj = json.loads(ln)
+            except Exception:
+                continue
+            text = (obj.get("text") or "").strip()
+            if text:
+                yield obj, text
+
+    yield from _score_texts(_rows(), query_tokens, scorer, min_similarity=min_similarity)
+
+
+def _column_candidates(
+    cols: CorpusColumns,
+    index: Optional[CorpusIndex],
+    query_tokens: Collection[str],
+    scorer: Any,
+    *,
+    max_scan: int,
+    min_similarity: float,
+) -> List[Tuple[int, float]]:
+    """
+    列存路径：返回 (row, sim)。有索引时完全不碰正文；否则只从 text blob 取正文分词（免 json 解析）。
+    倒排索引的 doc 与列存的 row 都是 corpus 行号，可直接互换。
+    """
+    if index is not None and len(index.docs) == cols.n:
+        return _score_index(index, query_tokens, scorer, max_scan=max_scan, min_similarity=min_similarity)
+
+    start = max(0, cols.n - int(max_scan)) if int(max_scan) > 0 else 0
+
+    # binary cosine 只需要去重 token 集合：直接用 ingest 预存的 token id 求交，不读正文、不分词。
+    # 阈值 <= 0 时零分行也要返回（需区分空正文），仍走正文路径
+    if scorer.name == "cosine" and float(min_similarity) > 0:
+        return _score_token_ids(cols, start, query_tokens, min_similarity=float(min_similarity))
+
+    def _rows() -> Iterable[Tuple[int, str]]:
+        for i in range(start, cols.n):
+            if not cols.is_valid(i):
+                continue
+            text = cols.text(i).strip()
+            if text:
+                yield i, text
+
+    return [(i, sim) for i, _, sim in _score_texts(_rows(), query_tokens, scorer, min_similarity=min_similarity)]
+
+
+def _score_token_ids(
+    cols: CorpusColumns,
+    start: int,
+    query_tokens: Collection[str],
+    *,
+    min_similarity: float,
+) -> List[Tuple[int, float]]:
+    """
+    预分词路径的 binary cosine：|q ∩ d| / sqrt(|q| * |d|)，口径与 CosineScorer 一致（|q| 用 token 字符串去重数）。
+    """
+    q_ids = token_id_set(query_tokens)
+    nq = len(set(query_tokens))
+    if not q_ids or nq <= 0:
+        return []
+    out: List[Tuple[int, float]] = []
+    for i in range(int(start), cols.n):
+        ids = cols.token_ids(i)
+        nd = len(ids)
+        if nd == 0:
+            continue
+        inter = count_common(ids, q_ids)
+        if inter <= 0:
+            continue
+        sim = min(1.0, inter / math.sqrt(nq * nd))
+        if sim >= min_similarity:
+            out.append((i, sim))
+    return out
+
+
+def _nan_to_none(v: float) -> Optional[float]:
+    return None if math.isnan(v) else float(v)
+
+
+def _hit_weights(
+    *,
+    dt: Optional[datetime],
+    has_created_at: bool,
+    ds_val: Any,
+    cw_val: Any,
+    now_dt: datetime,
+    decay_enabled: bool,
+    decay_window_days: float,
+    decay_half_life_days: float,
+    decay_floor: float,
+    cog_enabled: bool,
+    depth_alpha: float,
+) -> Tuple[Optional[float], float, float, float]:
+    """
+    单条候选的 (age_days, time_weight, depth_score, cog_weight)；JSONL 与列存两条路径共用同一口径。
+    """
+    # CARD-06：时间戳缺失 -> time_weight=1（默认不改变旧行为）
+    # 因此这里仅在显式 created_at 存在时才解析时间；缺失时不从文件名推断。
+    age_days: Optional[float] = None
+    if dt is not None:
+        age_days = (now_dt - dt).total_seconds() / 86400.0
+        if age_days < 0:
+            age_days = 0.0
+
+    tw = 1.0
+    # created_at 缺失：保持 time_weight=1（不做衰减）
+    if decay_enabled and has_created_at:
+        tw = score_time(
+            dt,
+            now=now_dt,
+            window_days=decay_window_days,
+            half_life_days=decay_half_life_days,
+            floor=decay_floor,
+        )
+
+    # 向后兼容策略（CARD-06）：
+    # - depth_score 缺失：按 0.5（中性，不逼重 ingest）
+    # - cog_weight 缺失：按 1
+    # - 时间戳缺失：time_weight=1（score_time 内部已处理）
+    #
+    # cog_weight：仅在启用时才读取/计算；否则强制 1（保证 legacy 不被历史数据影响）
+    if ds_val is None:
+        ds_val = 0.5
+    try:
+        ds_f = float(ds_val)
+    except Exception:
+        ds_f = 0.5
+
+    cw = 1.0
+    if cog_enabled:
+        cw = cw_val
+        if cw is None:
+            cw = compute_cog_weight(float(ds_f), alpha=float(depth_alpha))
+    try:
+        cw_f = float(cw)
+    except Exception:
+        cw_f = 1.0
+
+    return age_days, float(tw), ds_f, cw_f
+
+
+def _column_weights(
+    cols: CorpusColumns,
+    rows: List[int],
+    *,
+    now_dt: datetime,
+    decay_enabled: bool,
+    decay_window_days: float,
+    decay_half_life_days: float,
+    decay_floor: float,
+    cog_enabled: bool,
+    depth_alpha: float,
+) -> List[Tuple[Optional[float], float, float, float]]:
+    """
+    列存候选的 (age_days, time_weight, depth_score, cog_weight)：
+    有 NumPy 时对 epoch/深度数组整体向量化计算，否则逐行走 _hit_weights（口径相同）。
+    """
+    if not rows:
+        return []
+
+    if not numpy_available():
+        out: List[Tuple[Optional[float], float, float, float]] = []
+        for row in rows:
+            created = _nan_to_none(cols.created_at[row])
+            dt = datetime.fromtimestamp(created, tz=timezone.utc) if created is not None else None
+            out.append(_hit_weights(
+                dt=dt,
+                has_created_at=dt is not None,
+                ds_val=_nan_to_none(cols.depth_score[row]),
+                cw_val=_nan_to_none(cols.cog_weight[row]),
+                now_dt=now_dt,
+                decay_enabled=decay_enabled,
+                decay_window_days=decay_window_days,
+                decay_half_life_days=decay_half_life_days,
+                decay_floor=decay_floor,
+                cog_enabled=cog_enabled,
+                depth_alpha=depth_alpha,
+            ))
+        return out
+
+    age, has_ts, tw, ds, cw = _column_weight_arrays(
+        cols,
+        rows,
+        now_dt=now_dt,
+        decay_enabled=decay_enabled,
+        decay_window_days=decay_window_days,
+        decay_half_life_days=decay_half_life_days,
+        decay_floor=decay_floor,
+        cog_enabled=cog_enabled,
+        depth_alpha=depth_alpha,
+    )
+    return [
+        (float(age[i]) if has_ts[i] else None, float(tw[i]), float(ds[i]), float(cw[i]))
+        for i in range(len(rows))
+    ]
+
+
+def _column_weight_arrays(
+    cols: CorpusColumns,
+    rows: Any,
+    *,
+    now_dt: datetime,
+    decay_enabled: bool,
+    decay_window_days: float,
+    decay_half_life_days: float,
+    decay_floor: float,
+    cog_enabled: bool,
+    depth_alpha: float,
+) -> Tuple[Any, Any, Any, Any, Any]:
+    """
+    _column_weights 的 NumPy 版本：返回 (age_days, has_ts, time_weight, depth_score, cog_weight) 五个数组。
+    """
+    import numpy as np
+
+    idx = np.asarray(rows, dtype=np.int64)
+    created = cols.np_column("created_at")[idx]
+    has_ts = ~np.isnan(created)
+    age = np.maximum((now_dt.timestamp() - created) / 86400.0, 0.0)
+
+    if decay_enabled:
+        tw = score_time_batch(
+            created,
+            now_dt,
+            window_days=decay_window_days,
+            half_life_days=decay_half_life_days,
+            floor=decay_floor,
+        )
+    else:
+        tw = np.ones(len(idx), dtype=np.float64)
+
+    ds = cols.np_column("depth_score")[idx]
+    ds = np.where(np.isnan(ds), 0.5, ds)
+
+    if cog_enabled:
+        stored = cols.np_column("cog_weight")[idx]
+        cw = np.where(np.isnan(stored), compute_cog_weight_batch(ds, alpha=depth_alpha), stored)
+    else:
+        cw = np.ones(len(idx), dtype=np.float64)
+    return age, has_ts, tw, ds, cw
+
+
+def _matrix_candidates(
+    mat: CorpusMatrix,
+    cols: CorpusColumns,
+    query_tokens: Collection[str],
+    *,
+    start: int,
+    min_similarity: float,
+    keep: int,
+    weight_cfg: Dict[str, Any],
+    dense: Optional["_DenseQuery"] = None,
+) -> Tuple[List[Tuple[int, float]], List[Tuple[Optional[float], float, float, float]], Optional[List[float]]]:
+    """
+    CSR 矩阵路径：一次稀疏矩阵-向量乘得到所有行的 |q ∩ d|，再整体算 binary cosine（口径同 _score_token_ids）。
+    dense 非空时按 _blend_dense 的口径在数组上混入稠密分数（词法候选 ∪ 稠密 topN）。
+    keep > 0 时按分数上下界剪枝（见 _prune_rows），只为可能进入 topK 的行生成候选。
+    返回 (候选 (row, sim), 对应的 (age_days, time_weight, depth_score, cog_weight), 对应的稠密分数或 None)。
+    """
+    import numpy as np
+
+    q_ids = token_id_set(query_tokens)
+    nq = len(set(query_tokens))
+    if (not q_ids or nq <= 0) and dense is None:
+        return [], [], None
+    if q_ids and nq > 0:
+        rows, inter = mat.overlap(q_ids, start=int(start))
+        # 整数乘积后再开方：与标量路径 inter / math.sqrt(nq * nd) 逐位一致（不能拆成 sqrt(nq) * sqrt(nd)）
+        lex = np.minimum(1.0, inter / np.sqrt(float(nq) * mat.doc_len[rows]))
+    else:
+        rows, lex = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    ok = lex >= float(min_similarity)
+
+    d_sims = None
+    if dense is None:
+        rows, sims = rows[ok], lex[ok]
+    else:
+        # 稠密 topN 里词法没召回的行：词法分数从交集结果里查（不在交集里即为 0）
+        extra = dense.top_rows()
+        extra = extra[~np.isin(extra, rows[ok])]
+        extra = extra[cols.np_column("source")[extra] != SOURCE_INVALID]
+        j = np.minimum(np.searchsorted(rows, extra), max(0, len(rows) - 1))
+        extra_lex = np.where((len(rows) > 0) & (rows[j] == extra), lex[j], 0.0) if len(rows) else np.zeros(len(extra))
+        rows = np.concatenate([rows[ok], extra])
+        order = np.argsort(rows, kind="stable")
+        rows = rows[order]
+        d_sims = dense.at(rows)
+        sims = dense.blend(np.concatenate([lex[ok], extra_lex])[order], d_sims)
+        keep_mask = sims >= float(min_similarity)
+        rows, sims, d_sims = rows[keep_mask], sims[keep_mask], d_sims[keep_mask]
+
+    age, has_ts, tw, ds, cw = _column_weight_arrays(cols, rows, **weight_cfg)
+    if keep > 0:
+        sel = _prune_rows(sims, cw, has_ts, keep=keep, **weight_cfg)
+        rows, sims, age, has_ts, tw, ds, cw = (a[sel] for a in (rows, sims, age, has_ts, tw, ds, cw))
+        if d_sims is not None:
+            d_sims = d_sims[sel]
+
+    cands = list(zip(rows.tolist(), sims.tolist()))
+    weights = [
+        (a if h else None, t, d, c)
+        for a, h, t, d, c in zip(age.tolist(), has_ts.tolist(), tw.tolist(), ds.tolist(), cw.tolist())
+    ]
+    return cands, weights, (d_sims.tolist() if d_sims is not None else None)
+
+
+def _prune_rows(
+    sims: Any,
+    cw: Any,
+    has_ts: Any,
+    *,
+    keep: int,
+    decay_enabled: bool,
+    decay_window_days: float,
+    decay_half_life_days: float,
+    decay_floor: float,
+    cog_enabled: bool,
+    **_: Any,
+) -> Any:
+    """
+    只保留“某个时刻可能进入前 keep 名”的行（返回升序下标，保持行序以免改变同分时的稳定排序）。
+
+    final = sim * cw * tw，其中 tw ∈ [tw_min, 1] 与查询时间无关：
+    上界 = sim * cw，下界 = sim * cw * tw_min（无 created_at 的行 tw 恒为 1）。
+    上界低于第 keep 大的下界的行，任何时刻都排不进前 keep 名，剪掉后结果与全量排序完全相同，
+    因此剪枝后的候选也可以放进结果缓存、在之后按新的 now 重算 time_weight。
+    """
+    import numpy as np
+
+    n = len(sims)
+    if n <= keep:
+        return np.arange(n)
+    upper = sims * cw if cog_enabled else sims
+    if not bool(np.all(upper >= 0)):
+        return np.arange(n)
+    lower = upper
+    if decay_enabled:
+        fl = min(1.0, max(0.0, float(decay_floor)))
+        w, hl = float(decay_window_days or 0.0), float(decay_half_life_days or 0.0)
+        tw_min = min(fl, 2.0 ** (-w / hl)) if w > 0 and hl > 0 else fl
+        lower = np.where(has_ts, upper * tw_min, upper)
+    top = np.argpartition(-lower, keep - 1)[:keep]
+    # 留一点浮点余量：rerank 的乘法顺序与这里不同，可能差最后一位
+    thr = float(lower[top].min()) * (1.0 - 1e-9)
+    return np.flatnonzero(upper >= thr)
+
+
+def _fill_from_obj(h: RetrievalHit, obj: Dict[str, Any]) -> None:
+    """
+    用 JSONL 原行补齐命中的正文/来源字段（列存路径只对最终 topK 调用）。
+    """
+    created_at = obj.get("created_at")
+    meta = obj.get("meta") or {}
+    source_id = None
+    if isinstance(meta, dict):
+        source_id = meta.get("id") or meta.get("url")
+    if not source_id:
+        source_id = obj.get("uid") or None
+
+    h.uid = str(obj.get("uid") or "")
+    h.text = (obj.get("text") or "").strip()
+    h.source = str(obj.get("source", "unknown"))
+    h.file_path = str(obj.get("file_path", "") or "")
+    h.created_at = str(created_at) if created_at else None
+    h.meta = meta
+    h.source_id = str(source_id) if source_id else None
+
+
+def _cache_key(
+    q_tokens: Collection[str],
+    sim_mode: str,
+    *,
+    max_scan: int,
+    min_similarity: float,
+    top_k: int,
+    dense: tuple = (),
+    **cfg: Any,
+) -> tuple:
+    """
+    结果缓存的 key：规范化 query token（集合，排序）+ 候选相关参数 + 打分/权重配置。
+    now 不进 key：time_weight 在命中时按当前时间重算。
+    top_k 进 key：矩阵路径按 top_k 剪枝，缓存的候选只对同一 top_k 完整。
+    dense：语义检索实际生效时的 (向量器, alpha, top_n, 稠密阈值)，未生效为空。
+    """
+    bm25 = (env_float("SB_BM25_K1", "1.2"), env_float("SB_BM25_B", "0.75")) if sim_mode == "bm25" else ()
+    conf = tuple(sorted((k, v) for k, v in cfg.items() if k != "now_dt"))
+    return (
+        tuple(sorted(q_tokens)),
+        sim_mode,
+        bm25,
+        int(max_scan),
+        float(min_similarity),
+        int(top_k),
+        weighting_mode(),
+        conf,
+        tuple(dense),
+    )
+
+
+def _hits_from_cache(
+    cands: List[Candidate],
+    *,
+    now_dt: datetime,
+    decay_enabled: bool,
+    decay_window_days: float,
+    decay_half_life_days: float,
+    decay_floor: float,
+    **_: Any,
+) -> Tuple[List[RetrievalHit], Dict[int, int]]:
+    """
+    由缓存候选重建命中：静态字段原样复用，age_days / time_weight 按 now_dt 重算（口径同 _hit_weights）。
+    返回 (hits, {id(hit): 行偏移})，行偏移用于给最终 topK 补正文。
+    """
+    hits: List[RetrievalHit] = []
+    off_of: Dict[int, int] = {}
+    for fields, epoch, has_created, off in cands:
+        h = RetrievalHit(**{**fields, "meta": dict(fields.get("meta") or {})})
+        dt = datetime.fromtimestamp(epoch, tz=timezone.utc) if epoch is not None else None
+        h.age_days = max(0.0, (now_dt - dt).total_seconds() / 86400.0) if dt is not None else None
+        h.time_weight = 1.0
+        if decay_enabled and has_created:
+            h.time_weight = float(score_time(
+                dt,
+                now=now_dt,
+                window_days=decay_window_days,
+                half_life_days=decay_half_life_days,
+                floor=decay_floor,
+            ))
+        h.final_score = float(h.base_similarity)
+        if off is not None:
+            off_of[id(h)] = int(off)
+        hits.append(h)
+    return hits, off_of
+
+
+def retrieval_cache_stats() -> Dict[str, Any]:
+    return get_retrieval_cache().stats()
+
+
 def retrieve_from_corpus(
     *,
     corpus_path: Path,
@@ -244,7 +874,7 @@ def retrieve_from_corpus(
     now: Optional[datetime] = None,
 ) -> List[RetrievalHit]:
     """
-    从 corpus.jsonl 扫描候选 → 计算 base_similarity → 附加 cog/time 权重 → 只在排序阶段融合。
+    从 corpus.jsonl 取候选（倒排索引优先，缺失/过期回退扫描）→ 计算 base_similarity → 附加 cog/time 权重 → 只在排序阶段融合。
     """
     q = (query or "").strip()
     if not q:
@@ -287,131 +917,417 @@ def retrieve_from_corpus(
     )
     # endregion agent log
 
-    hits: List[RetrievalHit] = []
-    for ln in _iter_last_lines(corpus_path, int(max_scan)):
-        try:
-            obj = json.loads(ln)
-        except Exception:
-            continue
-
-        text = (obj.get("text") or "").strip()
-        if not text:
-            continue
+    q_tokens = set(_tokenize(q))
+    sim_mode = similarity_mode()
+    weight_cfg = dict(
+        now_dt=now_dt,
+        decay_enabled=decay_enabled,
+        decay_window_days=decay_window_days,
+        decay_half_life_days=decay_half_life_days,
+        decay_floor=decay_floor,
+        cog_enabled=cog_enabled,
+        depth_alpha=depth_alpha,
+    )
 
-        sim = base_similarity(q, text)
-        if sim < float(min_similarity):
-            continue
+    # 语义检索（SB_EMBED=1）：向量存储与列存都新鲜时，把 query 与 chunk 的稠密 cosine 混进 base_similarity；
+    # 任一缺失/过期（ingest 尚未补齐）就只用词法分数
+    embedder = get_embedder() if env_bool("SB_EMBED", "0") else None
+    vecs: Optional[CorpusVectors] = None
+    if embedder is not None and load_fresh_columns(corpus_path) is not None:
+        vecs = load_fresh_vectors(corpus_path, embedder.name)
+    embed_alpha = min(1.0, max(0.0, env_float("SB_EMBED_ALPHA", "0.5")))
+    embed_top_n = env_int("SB_EMBED_TOP_N", "50")
+    embed_min = env_float("SB_EMBED_MIN_SIMILARITY", "0.2")
+    dense_cfg = (embedder.name, embed_alpha, embed_top_n, embed_min) if vecs is not None and embedder is not None else ()
 
-        source = obj.get("source", "unknown")
-        file_path = obj.get("file_path", "") or ""
-        created_at = obj.get("created_at")
+    # 结果缓存（SB_RETRIEVAL_CACHE=0 关闭）：corpus 版本未变时复用去重后的候选，只重算 time_weight
+    cache = get_retrieval_cache() if env_bool("SB_RETRIEVAL_CACHE", "1") else None
+    stamp = corpus_stamp(corpus_path) if cache is not None else None
+    cache_key = (
+        _cache_key(
+            q_tokens,
+            sim_mode,
+            max_scan=int(max_scan),
+            min_similarity=float(min_similarity),
+            top_k=int(top_k),
+            dense=dense_cfg,
+            **weight_cfg,
+        )
+        if stamp is not None
+        else None
+    )
+    cached = cache.get(cache_key, stamp) if cache_key is not None else None
 
-        # CARD-06：时间戳缺失 -> time_weight=1（默认不改变旧行为）
-        # 因此这里仅在显式 created_at 存在时才解析时间；缺失时不从文件名推断。
-        dt = _parse_dt(created_at) if created_at else None
-        age_days: Optional[float] = None
-        if dt is not None:
-            age_days = (now_dt - dt).total_seconds() / 86400.0
-            if age_days < 0:
-                age_days = 0.0
-
-        tw = 1.0
-        # created_at 缺失：保持 time_weight=1（不做衰减）
-        if decay_enabled and created_at:
-            tw = score_time(
-                dt,
-                now=now_dt,
-                window_days=decay_window_days,
-                half_life_days=decay_half_life_days,
-                floor=decay_floor,
+    # off_of: id(hit) -> corpus 行偏移；列存路径/缓存命中时正文为空，最终 topK 据此回读 JSONL 行
+    index: Optional[CorpusIndex] = None
+    cols: Optional[CorpusColumns] = None
+    mat: Optional[CorpusMatrix] = None
+    if cached is not None:
+        hits, off_of = _hits_from_cache(cached, **weight_cfg)
+        cache.log_stats("hit")
+    else:
+        # 候选来源：倒排索引新鲜时走 posting list；缺失/过期才回退到 tail 全量扫描
+        # 打分器：SB_SIMILARITY=cosine（默认）/ bm25；bm25 的 df/avgdl 来自 ingest 预计算的 stats
+        index = load_fresh_index(corpus_path)
+        stats: Optional[CorpusStats] = None
+        if sim_mode == "bm25":
+            stats = load_stats(corpus_path)
+            if stats is None and index is not None:
+                stats = CorpusStats.from_index(index)
+        scorer = get_scorer(sim_mode, stats=stats)
+        # 列存新鲜时：相似度与 cog/time 权重全在数组上算完，只对最终 topK 回读 JSONL 行
+        cols = load_fresh_columns(corpus_path)
+        # CSR 矩阵（cosine 打分优先用它，倒排索引新鲜时也一样）：一次稀疏矩阵-向量乘打分 + argpartition 剪枝
+        mat = load_fresh_matrix(corpus_path) if cols is not None else None
+        certified = (index is not None and index.unique_uids) or (mat is not None and mat.unique_uids)
+        dense: Optional[_DenseQuery] = None
+        if vecs is not None and cols is not None and embedder is not None:
+            start = max(0, cols.n - int(max_scan)) if int(max_scan) > 0 else 0
+            dense = _DenseQuery(
+                scores=vecs.scores(embedder.embed([q])[0], start=start),
+                start=start,
+                alpha=embed_alpha,
+                top_n=embed_top_n,
+                min_dense=embed_min,
             )
+        hits, off_of, ts_of = _compute_hits(
+            corpus_path,
+            index,
+            cols,
+            q_tokens,
+            scorer,
+            weight_cfg,
+            max_scan,
+            min_similarity,
+            mat=mat,
+            keep=int(top_k) if certified else 0,
+            dense=dense,
+        )
+        hits = _dedup_hits(hits, certified=certified)
+        if cache is not None and cache_key is not None:
+            cands: List[Candidate] = []
+            for h in hits:
+                epoch, has_created = ts_of.get(id(h), (None, False))
+                cands.append((asdict(h), epoch, has_created, off_of.get(id(h))))
+            cache.put(cache_key, stamp, cands)
+            cache.log_stats("miss")
+    # region agent log
+    debug_log(
+        hypothesis_id="H8",
+        location="core/retrieval.py:retrieve_from_corpus",
+        message="candidates",
+        data={
+            "via": "cache" if cached is not None else ("index" if index is not None else "scan"),
+            "store": "matrix" if mat is not None else ("columns" if cols is not None else "jsonl"),
+            "similarity": sim_mode,
+            "dense": vecs.embedder if vecs is not None else None,
+            "n": len(hits),
+        },
+    )
+    # endregion agent log
 
-        # 向后兼容策略（CARD-06）：
-        # - depth_score 缺失：按 0.5（中性，不逼重 ingest）
-        # - cog_weight 缺失：按 1
-        # - 时间戳缺失：time_weight=1（score_time 内部已处理）
-        #
-        # cog_weight：仅在启用时才读取/计算；否则强制 1（保证 legacy 不被历史数据影响）
-        ds_val = obj.get("depth_score", None)
-        if ds_val is None:
-            ds_val = 0.5
-        try:
-            ds_f = float(ds_val)
-        except Exception:
-            ds_f = 0.5
+    # 只在排序阶段融合（按你的公式）
+    rerank_with_weights(hits, enable_cog=cog_enabled, enable_decay=decay_enabled)
 
-        cw = 1.0
-        if cog_enabled:
-            cw = obj.get("cog_weight", None)
-            if cw is None:
-                cw = compute_cog_weight(float(ds_f), alpha=float(depth_alpha))
-        try:
-            cw_f = float(cw)
-        except Exception:
-            cw_f = 1.0
+    top = hits[: int(top_k)]
+    for h in top:
+        off = off_of.get(id(h))
+        if off is not None and not h.text:
+            obj = read_line_obj(corpus_path, off)
+            if obj is not None:
+                _fill_from_obj(h, obj)
+    return _log_top(top, mode=mode, sim_name=sim_mode, decay_enabled=decay_enabled, depth_alpha=depth_alpha)
+
+
+def _compute_hits(
+    corpus_path: Path,
+    index: Optional[CorpusIndex],
+    cols: Optional[CorpusColumns],
+    q_tokens: Collection[str],
+    scorer: Any,
+    weight_cfg: Dict[str, Any],
+    max_scan: int,
+    min_similarity: float,
+    *,
+    mat: Optional[CorpusMatrix] = None,
+    keep: int = 0,
+    dense: Optional[_DenseQuery] = None,
+) -> Tuple[List[RetrievalHit], Dict[int, int], Dict[int, Tuple[Optional[float], bool]]]:
+    """
+    候选打分 + 权重（未去重、未排序）。返回 (hits, 行偏移表, 时间戳表)。
+    keep > 0（调用方已确认去重是空操作）时矩阵路径只返回可能进入前 keep 名的候选。
+    dense 非空（只在列存新鲜时）时混入稠密分数：矩阵路径在数组上做，其它列存路径由 _blend_dense 事后补。
+    """
+    hits: List[RetrievalHit] = []
+    off_of: Dict[int, int] = {}
+    ts_of: Dict[int, Tuple[Optional[float], bool]] = {}
+    use_matrix = (
+        cols is not None
+        and mat is not None
+        and mat.n == cols.n
+        and scorer.name == "cosine"
+        and float(min_similarity) > 0
+    )
+    if cols is not None:
+        if use_matrix:
+            start = max(0, cols.n - int(max_scan)) if int(max_scan) > 0 else 0
+            cands, weights, d_sims = _matrix_candidates(
+                mat,
+                cols,
+                q_tokens,
+                start=start,
+                min_similarity=float(min_similarity),
+                keep=int(keep),
+                weight_cfg=weight_cfg,
+                dense=dense,
+            )
+            _append_column_hits(corpus_path, cols, cands, weights, hits, off_of, ts_of, dense=d_sims)
+        else:
+            cands = _column_candidates(
+                cols, index, q_tokens, scorer, max_scan=int(max_scan), min_similarity=float(min_similarity)
+            )
+            weights = _column_weights(cols, [row for row, _ in cands], **weight_cfg)
+            _append_column_hits(corpus_path, cols, cands, weights, hits, off_of, ts_of)
+            if dense is not None:
+                hits = _blend_dense(
+                    corpus_path,
+                    cols,
+                    dense,
+                    q_tokens,
+                    hits,
+                    off_of,
+                    ts_of,
+                    min_similarity=float(min_similarity),
+                    lexical_cosine=scorer.name == "cosine",
+                    weight_cfg=weight_cfg,
+                )
+    else:
+        for obj, text, sim in _jsonl_candidates(
+            corpus_path, index, q_tokens, scorer, max_scan=int(max_scan), min_similarity=float(min_similarity)
+        ):
+            created_at = obj.get("created_at")
+            dt = _parse_dt(created_at) if created_at else None
+            age_days, tw, ds_f, cw_f = _hit_weights(
+                dt=dt,
+                has_created_at=bool(created_at),
+                ds_val=obj.get("depth_score", None),
+                cw_val=obj.get("cog_weight", None),
+                **weight_cfg,
+            )
+            hit = RetrievalHit(
+                uid="",
+                text=text,
+                source="",
+                file_path="",
+                created_at=None,
+                meta={},
+                source_id=None,
+                base_similarity=float(sim),
+                depth_score=float(ds_f),
+                age_days=float(age_days) if age_days is not None else None,
+                cog_weight=float(cw_f),
+                time_weight=float(tw),
+                final_score=float(sim),  # 初始=base；后续 rerank 再融合
+            )
+            _fill_from_obj(hit, obj)
+            ts_of[id(hit)] = (dt.timestamp() if dt is not None else None, bool(created_at))
+            hits.append(hit)
+    return hits, off_of, ts_of
 
-        meta = obj.get("meta") or {}
-        source_id = None
-        if isinstance(meta, dict):
-            source_id = meta.get("id") or meta.get("url")
-        if not source_id:
-            source_id = obj.get("uid") or None
 
+def _append_column_hits(
+    corpus_path: Path,
+    cols: CorpusColumns,
+    cands: List[Tuple[int, float]],
+    weights: List[Tuple[Optional[float], float, float, float]],
+    hits: List[RetrievalHit],
+    off_of: Dict[int, int],
+    ts_of: Dict[int, Tuple[Optional[float], bool]],
+    *,
+    dense: Optional[List[float]] = None,
+) -> None:
+    """
+    列存候选 -> RetrievalHit（正文留空，最终 topK 再按行偏移回读），追加到 hits 并登记行偏移/时间戳。
+    dense 与 cands 对齐时顺带填 dense_similarity。
+    """
+    for j, ((row, sim), (age_days, tw, ds_f, cw_f)) in enumerate(zip(cands, weights)):
         hit = RetrievalHit(
-            uid=str(obj.get("uid") or ""),
-            text=text,
-            source=str(source),
-            file_path=str(file_path),
-            created_at=str(created_at) if created_at else None,
-            meta=meta,
-            source_id=str(source_id) if source_id else None,
+            uid=cols.uid(row),
+            text="",
+            source=cols.source_name(row),
+            file_path="",
+            created_at=None,
+            meta={},
+            source_id=None,
             base_similarity=float(sim),
             depth_score=float(ds_f),
             age_days=float(age_days) if age_days is not None else None,
             cog_weight=float(cw_f),
             time_weight=float(tw),
-            final_score=float(sim),  # 初始=base；后续 rerank 再融合
+            final_score=float(sim),
+            dense_similarity=float(dense[j]) if dense is not None else None,
         )
+        if not hit.uid:
+            # 无 uid 的行去重要用 file_path/created_at/正文开头，这类少见行直接补齐
+            obj = read_line_obj(corpus_path, int(cols.line_off[row]))
+            if obj is None:
+                continue
+            _fill_from_obj(hit, obj)
+        off_of[id(hit)] = int(cols.line_off[row])
+        created = _nan_to_none(cols.created_at[row])
+        ts_of[id(hit)] = (created, created is not None)
         hits.append(hit)
 
-    # 去重（避免同一条记录被重复召回污染 topK）
-    # 现实中 corpus.jsonl 可能因为手工追加/异常运行产生重复行；ingest 也不会强制去重。
-    # 这里做最小侵入的去重：优先按 uid；uid 缺失则用 (source,file_path,created_at,text_head)。
-    before_n = len(hits)
-    best_by_key: Dict[str, RetrievalHit] = {}
-    for h in hits:
-        if h.uid:
-            key = f"uid:{h.uid}"
-        else:
-            head = (h.text or "")[:120]
-            key = f"fp:{h.source}|{h.file_path}|{h.created_at or ''}|{head}"
 
-        prev = best_by_key.get(key)
-        if prev is None:
-            best_by_key[key] = h
+@dataclass
+class _DenseQuery:
+    """
+    一次查询的稠密分数：scores[j] 是第 start + j 行与 query 的 cosine（暴力内积，见 CorpusVectors.scores）。
+    混合分数 = (1 - alpha) * 词法分数 + alpha * max(0, 稠密分数)；与时间无关，矩阵路径的剪枝上下界照样成立。
+    """
+
+    scores: Any
+    start: int
+    alpha: float
+    top_n: int
+    min_dense: float
+
+    def at(self, rows: Any) -> Any:
+        import numpy as np
+
+        rows = np.asarray(rows, dtype=np.int64)
+        out = np.zeros(len(rows), dtype=np.float64)
+        ok = (rows >= self.start) & (rows < self.start + len(self.scores))
+        out[ok] = self.scores[rows[ok] - self.start]
+        return out
+
+    def top_rows(self) -> Any:
+        """
+        稠密 topN 中分数 >= min_dense 的行号（升序）；min_dense 用来挡住哈希向量的碰撞噪声。
+        """
+        import numpy as np
+
+        k = min(max(0, int(self.top_n)), len(self.scores))
+        if k <= 0 or self.alpha <= 0:
+            return np.zeros(0, dtype=np.int64)
+        top = np.argpartition(-self.scores, k - 1)[:k]
+        top = top[self.scores[top] >= max(float(self.min_dense), 1e-9)]
+        return np.sort(top).astype(np.int64) + int(self.start)
+
+    def blend(self, lexical: Any, dense: Any) -> Any:
+        import numpy as np
+
+        return (1.0 - self.alpha) * lexical + self.alpha * np.maximum(dense, 0.0)
+
+
+def _blend_dense(
+    corpus_path: Path,
+    cols: CorpusColumns,
+    dense: _DenseQuery,
+    q_tokens: Collection[str],
+    hits: List[RetrievalHit],
+    off_of: Dict[int, int],
+    ts_of: Dict[int, Tuple[Optional[float], bool]],
+    *,
+    min_similarity: float,
+    lexical_cosine: bool,
+    weight_cfg: Dict[str, Any],
+) -> List[RetrievalHit]:
+    """
+    非矩阵路径（倒排索引 / 正文扫描）的混合打分，口径同 _matrix_candidates：
+    - 词法候选：按行偏移找回行号，补上稠密分数
+    - 稠密 topN 里词法没召回的行作为新候选；它们的词法分数低于阈值才没召回：cosine 时按 token id 精确补算，bm25 记 0
+    - 融合后的分数再过一遍 min_similarity；cog/time 权重照常在 rerank 阶段乘上去
+    """
+    import numpy as np
+
+    line_off = cols.np_column("line_off")
+    offs = np.asarray([off_of.get(id(h), -1) for h in hits], dtype=np.int64)
+    rows = np.searchsorted(line_off, offs.astype(np.uint64)) if len(hits) else np.zeros(0, dtype=np.int64)
+    found = (offs >= 0) & (rows < cols.n)
+    found[found] = line_off[rows[found]] == offs[found].astype(np.uint64)
+    rows = np.where(found, rows, -1)
+    d_sims = dense.at(rows)
+    for h, d in zip(hits, d_sims.tolist()):
+        h.dense_similarity = d
+        h.base_similarity = float(dense.blend(float(h.base_similarity), d))
+
+    q_ids = token_id_set(q_tokens)
+    nq = len(set(q_tokens))
+    seen = set(rows.tolist())
+    extra: List[Tuple[int, float]] = []
+    for row in dense.top_rows().tolist():
+        if row in seen or not cols.is_valid(row):
             continue
-        # 保留更高 base_similarity 的那个；若相同，保留已有（保持稳定）
-        if float(h.base_similarity) > float(prev.base_similarity):
-            best_by_key[key] = h
+        lex = 0.0
+        if lexical_cosine and q_ids:
+            ids = cols.token_ids(row)
+            inter = count_common(ids, q_ids) if len(ids) else 0
+            lex = min(1.0, inter / math.sqrt(nq * len(ids))) if inter else 0.0
+        extra.append((row, lex))
+    if extra:
+        extra_rows = [row for row, _ in extra]
+        extra_d = dense.at(extra_rows).tolist()
+        blended = [(row, float(dense.blend(lex, d))) for (row, lex), d in zip(extra, extra_d)]
+        _append_column_hits(
+            corpus_path, cols, blended, _column_weights(cols, extra_rows, **weight_cfg), hits, off_of, ts_of, dense=extra_d
+        )
 
-    hits = list(best_by_key.values())
+    out = [h for h in hits if float(h.base_similarity) >= float(min_similarity)]
+    for h in out:
+        h.final_score = float(h.base_similarity)
+    return out
+
+
+def _dedup_hits(hits: List[RetrievalHit], certified: bool) -> List[RetrievalHit]:
+    """
+    去重（避免同一条记录被重复召回污染 topK）
+    现实中 corpus.jsonl 可能因为手工追加/异常运行产生重复行。
+    这里做最小侵入的去重：优先按 uid；uid 缺失则用 (source,file_path,created_at,text_head)。
+    新鲜索引已认证“uid 全部非空且唯一”时（ingest 不再写重复 uid），去重必然是空操作，直接跳过。
+    """
+    before_n = len(hits)
+    if not certified:
+        best_by_key: Dict[str, RetrievalHit] = {}
+        for h in hits:
+            if h.uid:
+                key = f"uid:{h.uid}"
+            else:
+                head = (h.text or "")[:120]
+                key = f"fp:{h.source}|{h.file_path}|{h.created_at or ''}|{head}"
+
+            prev = best_by_key.get(key)
+            if prev is None:
+                best_by_key[key] = h
+                continue
+            # 保留更高 base_similarity 的那个；若相同，保留已有（保持稳定）
+            if float(h.base_similarity) > float(prev.base_similarity):
+                best_by_key[key] = h
+
+        hits = list(best_by_key.values())
     after_n = len(hits)
     # region agent log
     debug_log(
         hypothesis_id="H7",
         location="core/retrieval.py:retrieve_from_corpus",
         message="dedup",
-        data={"before": int(before_n), "after": int(after_n), "dropped": int(before_n - after_n)},
+        data={
+            "before": int(before_n),
+            "after": int(after_n),
+            "dropped": int(before_n - after_n),
+            "skipped": bool(certified),
+        },
     )
     # endregion agent log
+    return hits
 
-    # 只在排序阶段融合（按你的公式）
-    rerank_with_weights(hits, enable_cog=cog_enabled, enable_decay=decay_enabled)
 
-    top = hits[: int(top_k)]
+def _log_top(
+    top: List[RetrievalHit], *, mode: str, sim_name: str, decay_enabled: bool, depth_alpha: float
+) -> List[RetrievalHit]:
     if top:
         log_telemetry(
-            f"retrieve topK: mode={mode} decay={decay_enabled} alpha={depth_alpha} k={len(top)}"
+            f"retrieve topK: mode={mode} sim={sim_name} decay={decay_enabled} alpha={depth_alpha} k={len(top)}"
         )
         for i, h in enumerate(top, 1):
             log_telemetry(
@@ -420,6 +1336,7 @@ def retrieve_from_corpus(
                         f"#{i}",
                         f"final={h.final_score:.4f}",
                         f"sim={h.base_similarity:.3f}",
+                        *([f"dense={h.dense_similarity:.3f}"] if h.dense_similarity is not None else []),
                         f"depth={h.depth_score:.3f}",
                         f"cog={h.cog_weight:.3f}",
                         f"age_days={(f'{h.age_days:.1f}' if h.age_days is not None else 'NA')}",
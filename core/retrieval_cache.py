@@ -0,0 +1,168 @@
+"""
+retrieve_from_corpus 的查询结果缓存（进程内 LRU + 可选磁盘）。
+
+- key：规范化后的 query token 集合 + 检索参数 + 打分/权重相关的环境配置（见 retrieval._cache_key）
+- 版本：corpus 的 (size, mtime_ns, inode)；ingest 追加或 compact 重写后旧条目自动失效
+- 值：去重后的候选（命中的静态字段 + 原始时间戳 + 行偏移），不含随时间变化的 time_weight；
+  命中时按当前时间重算 time_weight 再重排，不会返回过期的时间衰减。
+  矩阵路径按 top_k 剪掉任何时刻都排不进前 top_k 的候选，所以 top_k 也在 key 里
+- 磁盘层（SB_RETRIEVAL_CACHE_DIR 非空时启用）：每个 key 一个 JSON 文件，进程重启后可复用；
+  文件数超过上限时删掉最旧的一批
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import env_int, env_str, log_telemetry
+from .settings import settings
+from .utils.io_helper import atomic_write_text
+
+# 单个候选：(RetrievalHit 的静态字段, created_at epoch 秒或 None, 是否有 created_at, corpus 行偏移或 None)
+Candidate = Tuple[Dict[str, Any], Optional[float], bool, Optional[int]]
+
+
+def corpus_stamp(corpus_path: Path) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = Path(corpus_path).stat()
+        return int(st.st_size), int(st.st_mtime_ns), int(st.st_ino)
+    except Exception:
+        return None
+
+
+class RetrievalCache:
+    def __init__(self, *, max_entries: int = 256, disk_dir: Optional[Path] = None, disk_max_files: int = 2000) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_files = max(1, int(disk_max_files))
+        self._mu = threading.Lock()
+        self._lru: "OrderedDict[tuple, Tuple[tuple, List[Candidate]]]" = OrderedDict()
+        self._counters: Dict[str, int] = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    # ---------- 对外接口 ----------
+
+    def get(self, key: tuple, stamp: tuple) -> Optional[List[Candidate]]:
+        with self._mu:
+            hit = self._lru.get(key)
+            if hit is not None and hit[0] == stamp:
+                self._lru.move_to_end(key)
+                self._counters["hits"] += 1
+                return hit[1]
+            if hit is not None:
+                # corpus 已变：旧条目作废
+                del self._lru[key]
+
+        cands = self._disk_get(key, stamp)
+        with self._mu:
+            if cands is not None:
+                self._counters["disk_hits"] += 1
+                self._put_locked(key, stamp, cands)
+            else:
+                self._counters["misses"] += 1
+        return cands
+
+    def put(self, key: tuple, stamp: tuple, cands: List[Candidate]) -> None:
+        with self._mu:
+            self._put_locked(key, stamp, cands)
+            self._counters["stores"] += 1
+        self._disk_put(key, stamp, cands)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._mu:
+            out: Dict[str, Any] = dict(self._counters)
+            out["entries"] = len(self._lru)
+        lookups = out["hits"] + out["disk_hits"] + out["misses"]
+        out["hit_rate"] = round((out["hits"] + out["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return out
+
+    def clear(self) -> None:
+        with self._mu:
+            self._lru.clear()
+            for k in self._counters:
+                self._counters[k] = 0
+
+    def log_stats(self, outcome: str) -> None:
+        s = self.stats()
+        log_telemetry(
+            f"retrieval cache {outcome}: hit_rate={s['hit_rate']} hits={s['hits']} "
+            f"disk_hits={s['disk_hits']} misses={s['misses']} entries={s['entries']}"
+        )
+
+    # ---------- 内部 ----------
+
+    def _put_locked(self, key: tuple, stamp: tuple, cands: List[Candidate]) -> None:
+        self._lru[key] = (stamp, cands)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _disk_path(self, key: tuple) -> Optional[Path]:
+        if self.disk_dir is None:
+            return None
+        digest = hashlib.sha1(json.dumps(key, ensure_ascii=False).encode("utf-8")).hexdigest()
+        return self.disk_dir / f"{digest}.json"
+
+    def _disk_get(self, key: tuple, stamp: tuple) -> Optional[List[Candidate]]:
+        path = self._disk_path(key)
+        if path is None or not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("key") != json.loads(json.dumps(key)) or tuple(data.get("stamp") or ()) != tuple(stamp):
+                return None
+            return [(c[0], c[1], bool(c[2]), c[3]) for c in data.get("cands") or []]
+        except Exception:
+            return None
+
+    def _disk_put(self, key: tuple, stamp: tuple, cands: List[Candidate]) -> None:
+        path = self._disk_path(key)
+        if path is None:
+            return
+        try:
+            payload = {"key": key, "stamp": list(stamp), "cands": [list(c) for c in cands]}
+            atomic_write_text(path, json.dumps(payload, ensure_ascii=False, separators=(",", ":")))
+            self._disk_prune()
+        except Exception as e:
+            log_telemetry(f"retrieval cache disk write failed: {e}")
+
+    def _disk_prune(self) -> None:
+        files = list(self.disk_dir.glob("*.json")) if self.disk_dir is not None else []
+        if len(files) <= self.disk_max_files:
+            return
+        files.sort(key=lambda p: p.stat().st_mtime)
+        for p in files[: len(files) - self.disk_max_files + max(1, self.disk_max_files // 10)]:
+            try:
+                p.unlink()
+            except Exception:
+                pass
+
+
+_CACHE: Optional[RetrievalCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """
+    进程级共享缓存（首次调用时按环境变量初始化）。
+    """
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            disk = env_str("SB_RETRIEVAL_CACHE_DIR", "")
+            disk_dir: Optional[Path] = None
+            if disk:
+                disk_dir = Path(disk).expanduser()
+                if not disk_dir.is_absolute():
+                    disk_dir = settings.ROOT_DIR / disk_dir
+            _CACHE = RetrievalCache(
+                max_entries=env_int("SB_RETRIEVAL_CACHE_SIZE", "256"),
+                disk_dir=disk_dir,
+                disk_max_files=env_int("SB_RETRIEVAL_CACHE_DISK_MAX", "2000"),
+            )
+        return _CACHE
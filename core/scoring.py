@@ -0,0 +1,102 @@
+"""
+检索相似度打分器（可插拔，SB_SIMILARITY 选择）：
+
+- cosine（默认）：binary token overlap 的 cosine，与 base_similarity 完全一致
+- bm25：带 tf 饱和与文档长度归一化的 BM25，df/avgdl 取 corpus.stats.json
+
+两者输出都落在 [0,1]，rerank_with_weights 与 min_similarity 阈值无需改动。
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Collection, Dict, Optional
+
+from .config import env_float, env_str
+from .corpus_index import CorpusStats
+
+
+class CosineScorer:
+    name = "cosine"
+    needs_stats = False
+
+    def score(
+        self,
+        query_tokens: Collection[str],
+        matched_tf: Dict[str, int],
+        *,
+        doc_len: int,
+        doc_uniq: int,
+    ) -> float:
+        inter = len(matched_tf)
+        if inter <= 0 or not query_tokens or doc_uniq <= 0:
+            return 0.0
+        return float(min(1.0, inter / math.sqrt(len(query_tokens) * int(doc_uniq))))
+
+
+class BM25Scorer:
+    """
+    BM25（Okapi），按 query 去重 token 求和后除以理论上界 Σ idf*(k1+1) 归一化到 [0,1)。
+    """
+
+    name = "bm25"
+    needs_stats = True
+
+    def __init__(self, stats: Optional[CorpusStats], *, k1: float = 1.2, b: float = 0.75) -> None:
+        self.stats = stats or CorpusStats()
+        self.k1 = float(k1)
+        self.b = float(b)
+        self._idf_cache: Dict[str, float] = {}
+
+    def idf(self, tok: str) -> float:
+        hit = self._idf_cache.get(tok)
+        if hit is not None:
+            return hit
+        n = max(0, int(self.stats.n_docs))
+        df = min(n, max(0, int(self.stats.df.get(tok, 0))))
+        val = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+        self._idf_cache[tok] = val
+        return val
+
+    def score(
+        self,
+        query_tokens: Collection[str],
+        matched_tf: Dict[str, int],
+        *,
+        doc_len: int,
+        doc_uniq: int,
+    ) -> float:
+        if not matched_tf or not query_tokens:
+            return 0.0
+
+        avgdl = float(self.stats.avgdl) if self.stats.avgdl > 0 else float(max(1, doc_len))
+        norm = self.k1 * (1.0 - self.b + self.b * float(doc_len) / avgdl)
+
+        raw = 0.0
+        for tok, tf in matched_tf.items():
+            tf_f = float(tf)
+            raw += self.idf(tok) * tf_f * (self.k1 + 1.0) / (tf_f + norm)
+
+        upper = sum(self.idf(tok) for tok in query_tokens) * (self.k1 + 1.0)
+        if upper <= 0:
+            return 0.0
+        return float(min(1.0, raw / upper))
+
+
+def similarity_mode() -> str:
+    m = env_str("SB_SIMILARITY", "cosine").lower()
+    return "bm25" if m == "bm25" else "cosine"
+
+
+def get_scorer(mode: Optional[str] = None, *, stats: Optional[CorpusStats] = None):
+    """
+    按 SB_SIMILARITY（或显式 mode）返回打分器；未知值一律按 cosine。
+    """
+    m = (mode or similarity_mode()).strip().lower()
+    if m == "bm25":
+        return BM25Scorer(
+            stats,
+            k1=env_float("SB_BM25_K1", "1.2"),
+            b=env_float("SB_BM25_B", "0.75"),
+        )
+    return CosineScorer()
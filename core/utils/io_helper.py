@@ -1,5 +1,6 @@
+import os
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 def read_text_file(path: Path) -> str:
     """
@@ -20,3 +21,74 @@ def ensure_dir(path: Path) -> Path:
         path.mkdir(parents=True, exist_ok=True)
     return path
 
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """
+    原子写入：先写同目录临时文件并 fsync，再 os.replace 覆盖。
+    崩溃时要么是旧内容，要么是新内容，不会出现半截文件。
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def iter_last_lines(path: Path, max_lines: int, *, block_size: int = 64 * 1024) -> List[str]:
+    """
+    真正的 tail：从文件末尾按块向前 seek，只读取最后 max_lines 行所需的字节。
+
+    - 按字节切分 b"\\n"（UTF-8 多字节字符的续字节不可能是 0x0A，块边界不会切坏字符），
+      整行凑齐后再逐行 decode
+    - 返回顺序与文件顺序一致（旧 -> 新）；末尾无换行的最后一行也算一行
+    - max_lines <= 0：返回全部行
+    - 文件不存在/读取失败：返回 []；单行 decode 失败则跳过该行
+    """
+    try:
+        if int(max_lines) <= 0:
+            with open(path, "rb") as f:
+                raw_lines = f.read().split(b"\n")
+            if raw_lines and raw_lines[-1] == b"":
+                raw_lines.pop()
+            return _decode_lines(raw_lines)
+
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            need = int(max_lines)
+            bs = max(1, int(block_size))
+
+            blocks: List[bytes] = []
+            newlines = 0
+            # 多读一个换行作为“可能不完整的开头”，凑够 need+1 个换行即可停
+            while pos > 0 and newlines <= need:
+                step = min(bs, pos)
+                pos -= step
+                f.seek(pos)
+                block = f.read(step)
+                blocks.append(block)
+                newlines += block.count(b"\n")
+    except Exception:
+        return []
+
+    tail = b"".join(reversed(blocks))
+
+    raw_lines = tail.split(b"\n")
+    if raw_lines and raw_lines[-1] == b"":
+        raw_lines.pop()
+    if pos > 0:
+        # 第一段是被块边界截断的半行，丢弃
+        raw_lines = raw_lines[1:]
+    return _decode_lines(raw_lines[-int(max_lines):])
+
+
+def _decode_lines(raw_lines: List[bytes]) -> List[str]:
+    out: List[str] = []
+    for raw in raw_lines:
+        try:
+            out.append(raw.decode("utf-8").rstrip("\r"))
+        except UnicodeDecodeError:
+            continue
+    return out
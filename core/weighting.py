@@ -188,3 +188,68 @@ def score_time(
     return float(_clamp(fl))
 
 
+
+
+# ---------- 批量版本（NumPy，可选依赖） ----------
+
+def numpy_available() -> bool:
+    try:
+        import numpy  # noqa: F401
+    except Exception:
+        return False
+    return True
+
+
+def score_time_batch(
+    epoch_seconds: Any,
+    now: Any = None,
+    window_days: float = 15.0,
+    half_life_days: float = 3.0,
+    floor: float = 0.05,
+):
+    """
+    score_time 的向量化版本：输入 epoch 秒数组（NaN=时间缺失），输出同形状 float64 数组。
+    口径与 score_time 逐元素一致（缺失→1；未来时间按 age=0；窗口/半衰期/floor 规则相同）。
+    now 可为 datetime 或 epoch 秒；缺省为当前 UTC 时间。需要 NumPy。
+    """
+    import numpy as np
+
+    ts = np.asarray(epoch_seconds, dtype=np.float64)
+    if now is None:
+        now = datetime.now(timezone.utc)
+    if isinstance(now, datetime):
+        if now.tzinfo is None:
+            now = now.replace(tzinfo=timezone.utc)
+        now_s = float(now.timestamp())
+    else:
+        now_s = float(now)
+
+    missing = np.isnan(ts)
+    age_days = np.maximum((now_s - ts) / 86400.0, 0.0)
+
+    w_days = float(window_days or 0.0)
+    hl = float(half_life_days or 0.0)
+    fl = float(_clamp(float(floor if floor is not None else 0.0)))
+
+    if w_days <= 0:
+        out = np.full(ts.shape, fl, dtype=np.float64)
+    elif hl <= 0:
+        out = np.where(age_days <= w_days, 1.0, fl)
+    else:
+        with np.errstate(invalid="ignore"):
+            inside = np.clip(np.exp(-math.log(2.0) * age_days / hl), 0.0, 1.0)
+        out = np.where(age_days <= w_days, inside, fl)
+
+    return np.where(missing, 1.0, out)
+
+
+def compute_cog_weight_batch(depth_scores: Any, alpha: float = 0.0):
+    """
+    compute_cog_weight 的向量化版本：1 + alpha*(clamp(depth)-0.5)，下限 0.1。
+    NaN 输入与标量版一致地落到下限 0.1（调用方应先处理缺失值）。需要 NumPy。
+    """
+    import numpy as np
+
+    ds = np.clip(np.asarray(depth_scores, dtype=np.float64), 0.0, 1.0)
+    a = float(alpha or 0.0)
+    return np.fmax(1.0 + a * (ds - 0.5), 0.1)
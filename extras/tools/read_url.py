@@ -20,12 +20,13 @@ def read_url(url: str, *, max_chars: int = 8000, timeout: int = 20) -> str:
     jina_url = f"https://r.jina.ai/{source_url}"
 
     try:
-        import requests
+        from infra.http import get_client
     except Exception:
         return "工具不可用：缺少 requests 依赖。"
 
     try:
-        resp = requests.get(jina_url, timeout=int(timeout))
+        # 工具调用在对话路径上：最多重试 1 次，避免用户久等
+        resp = get_client().get(jina_url, timeout=int(timeout), max_retries=1)
         if resp.status_code != 200:
             return f"工具不可用：读取失败（HTTP {resp.status_code}）。"
         text = (resp.text or "").strip()
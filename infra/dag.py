@@ -0,0 +1,129 @@
+# dag.py
+"""
+极简的步骤依赖图执行器（给 scheduler 用）。
+
+- 每个 Step 声明依赖；依赖全部结束（无论成败）后才启动，互不依赖的步骤并行
+- 步骤异常只记为 fail，不向外抛；超时记为 timeout（线程无法强杀，步骤会在后台跑完，结果被忽略）
+- strict=True 的步骤在任一依赖 timeout / skipped 时跳过：依赖可能仍在后台写数据
+- 非 strict 的步骤也不会与仍在后台运行的超时依赖并发：启动时该依赖的线程还没结束就跳过
+  （已经跑完则照常启动，此时它写的数据是完整的）
+- 返回每个步骤的记录：status / 开始时间 / 耗时 / 结果摘要 / 错误
+"""
+
+from __future__ import annotations
+
+import json
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+TERMINAL = ("ok", "fail", "timeout", "skipped")
+
+
+@dataclass
+class Step:
+    name: str
+    fn: Callable[[], Any]
+    deps: Tuple[str, ...] = ()
+    timeout: float = 0.0  # <= 0 表示不限时
+    strict: bool = False
+    record: Dict[str, Any] = field(default_factory=dict)
+
+
+def _summarize(result: Any, limit: int = 2000) -> Any:
+    try:
+        s = json.dumps(result, ensure_ascii=False, default=str)
+    except Exception:
+        s = json.dumps(repr(result), ensure_ascii=False)
+    if len(s) > limit:
+        return s[:limit] + "…"
+    return json.loads(s)
+
+
+def run_dag(steps: List[Step], *, log: Optional[Callable[[str], None]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    执行依赖图，返回 {step_name: record}（按 steps 顺序）。
+    """
+    log = log or (lambda _line: None)
+    by_name = {s.name: s for s in steps}
+    for s in steps:
+        missing = [d for d in s.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"step {s.name} 依赖不存在: {missing}")
+
+    status: Dict[str, str] = {}
+    pending = [s for s in steps]
+    running: Dict[Future, Tuple[Step, float, float]] = {}
+    timed_out: Dict[str, Future] = {}  # 超时但线程仍可能在后台运行的步骤
+
+    # 每个步骤独占一个线程：超时的步骤在后台继续占线程，不影响其他步骤启动
+    pool = ThreadPoolExecutor(max_workers=max(1, len(steps)), thread_name_prefix="dag")
+    try:
+        while pending or running:
+            # 1) 启动所有依赖已结束的步骤
+            for s in list(pending):
+                if any(status.get(d) not in TERMINAL for d in s.deps):
+                    continue
+                pending.remove(s)
+                bad = [d for d in s.deps if status[d] in ("timeout", "skipped")]
+                busy = [d for d in s.deps if d in timed_out and not timed_out[d].done()]
+                if s.strict and bad:
+                    status[s.name] = "skipped"
+                    s.record = {"status": "skipped", "reason": f"依赖未完成: {','.join(bad)}"}
+                    log(f"step.skip {s.name} (deps not finished: {','.join(bad)})")
+                    continue
+                if busy:
+                    status[s.name] = "skipped"
+                    s.record = {"status": "skipped", "reason": f"超时依赖仍在后台运行: {','.join(busy)}"}
+                    log(f"step.skip {s.name} (timed-out deps still running: {','.join(busy)})")
+                    continue
+                log(f"step.start {s.name}")
+                t0 = time.perf_counter()
+                deadline = t0 + s.timeout if s.timeout and s.timeout > 0 else float("inf")
+                s.record = {"status": "running", "started_at": datetime.now().isoformat(timespec="seconds")}
+                running[pool.submit(s.fn)] = (s, t0, deadline)
+
+            if not running:
+                if pending:
+                    # 只剩依赖永远无法满足的步骤（有环）
+                    for s in pending:
+                        status[s.name] = "skipped"
+                        s.record = {"status": "skipped", "reason": "依赖有环"}
+                    pending = []
+                break
+
+            # 2) 等任一步骤结束或最近的超时到期
+            nearest = min(deadline for _, _, deadline in running.values())
+            wait_s = None if nearest == float("inf") else max(0.0, nearest - time.perf_counter())
+            done, _ = wait(list(running.keys()), timeout=wait_s, return_when=FIRST_COMPLETED)
+
+            now = time.perf_counter()
+            for fut in list(running.keys()):
+                s, t0, deadline = running[fut]
+                if fut in done:
+                    elapsed = now - t0
+                    exc = fut.exception()
+                    if exc is None:
+                        status[s.name] = "ok"
+                        s.record.update({"status": "ok", "seconds": round(elapsed, 3), "result": _summarize(fut.result())})
+                        log(f"step.ok {s.name} seconds={elapsed:.2f}")
+                    else:
+                        tb = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+                        status[s.name] = "fail"
+                        s.record.update({"status": "fail", "seconds": round(elapsed, 3), "error": f"{type(exc).__name__}: {exc}"})
+                        log(f"step.fail {s.name} seconds={elapsed:.2f}\n{tb}")
+                    del running[fut]
+                elif now >= deadline:
+                    status[s.name] = "timeout"
+                    s.record.update({"status": "timeout", "seconds": round(now - t0, 3), "timeout": s.timeout})
+                    log(f"step.timeout {s.name} after {s.timeout:g}s (still running in background)")
+                    timed_out[s.name] = fut
+                    del running[fut]
+    finally:
+        # 不等待超时步骤的后台线程
+        pool.shutdown(wait=False)
+
+    return {s.name: s.record for s in steps}
@@ -0,0 +1,254 @@
+# http.py
+"""
+connectors / 工具共用的 HTTP 客户端。
+
+- 连接池：一个进程共享一个 requests.Session（keep-alive），按需调大连接池
+- 限速：按 host 的令牌桶（线程安全），多线程/多账号共用同一配额
+- 重试：429 / 5xx / 连接错误按指数退避重试；响应带 Retry-After 时以其为准
+- 超时：所有请求都有默认超时（SB_HTTP_TIMEOUT）
+- 指标：按 host 记录请求数、重试、错误、耗时，metrics() 取快照
+
+配置（环境变量）：
+  SB_HTTP_TIMEOUT=30
+  SB_HTTP_MAX_RETRIES=4
+  SB_HTTP_BACKOFF_BASE=1.0
+  SB_HTTP_BACKOFF_MAX=60
+  SB_HTTP_RATE_LIMITS=api.notion.com=3      # host=每秒请求数，逗号分隔
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.config import env_float, env_int, env_str
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+DEFAULT_RATE_LIMITS = "api.notion.com=3"
+
+
+class RateLimiter:
+    """
+    令牌桶：平均 rate 次/秒，最多积攒 burst 个令牌。acquire() 阻塞到拿到令牌为止。
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = max(1e-6, float(rate))
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        返回本次等待的秒数。
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                need = (1.0 - self._tokens) / self.rate
+            time.sleep(need)
+            waited += need
+
+
+def _parse_rate_limits(spec: str) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        host, rate = part.split("=", 1)
+        try:
+            out[host.strip().lower()] = float(rate.strip())
+        except Exception:
+            continue
+    return out
+
+
+def _retry_after_seconds(resp: requests.Response) -> Optional[float]:
+    v = (resp.headers.get("Retry-After") or "").strip()
+    if not v:
+        return None
+    try:
+        return max(0.0, float(v))
+    except Exception:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(v).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+class HttpClient:
+    def __init__(
+        self,
+        *,
+        timeout: float = 30.0,
+        max_retries: int = 4,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        pool_size: int = 16,
+        rate_limits: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.timeout = float(timeout)
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._mu = threading.Lock()
+        self._limiters: Dict[str, RateLimiter] = {}
+        for host, rate in (rate_limits or {}).items():
+            self.set_rate(host, rate)
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+
+    # ---------- 配置 ----------
+
+    def set_rate(self, host: str, rate: Optional[float], burst: int = 1) -> None:
+        """
+        设置某个 host 的限速（次/秒）；rate 为空或 <= 0 表示不限速。
+        """
+        host = (host or "").strip().lower()
+        if not host:
+            return
+        with self._mu:
+            if rate is None or float(rate) <= 0:
+                self._limiters.pop(host, None)
+            else:
+                self._limiters[host] = RateLimiter(float(rate), burst=burst)
+
+    def limiter_for(self, host: str) -> Optional[RateLimiter]:
+        with self._mu:
+            return self._limiters.get((host or "").lower())
+
+    # ---------- 请求 ----------
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        retry_on: Iterable[int] = RETRY_STATUS,
+        max_retries: Optional[int] = None,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """
+        发送请求：限速 → 请求 → 可重试状态/连接错误按退避重试。
+        重试耗尽时返回最后一次响应（由调用方判断 status_code）；连接错误耗尽则抛出。
+        """
+        host = (urlsplit(url).hostname or "").lower()
+        retries = self.max_retries if max_retries is None else max(0, int(max_retries))
+        retry_set = set(int(s) for s in retry_on)
+        kwargs.setdefault("timeout", self.timeout)
+
+        attempt = 0
+        while True:
+            limiter = self.limiter_for(host)
+            if limiter is not None:
+                limiter.acquire()
+
+            t0 = time.perf_counter()
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(host, None, time.perf_counter() - t0, error=True)
+                if attempt >= retries:
+                    raise
+                delay = self._backoff(attempt)
+                print(f"⚠️ [http] {host} {type(e).__name__}，{delay:.1f}s 后重试（{attempt + 1}/{retries}）")
+            else:
+                self._record(host, resp.status_code, time.perf_counter() - t0)
+                if resp.status_code not in retry_set or attempt >= retries:
+                    return resp
+                ra = _retry_after_seconds(resp)
+                delay = min(self.backoff_max, ra) if ra is not None else self._backoff(attempt)
+                print(f"⚠️ [http] {host} HTTP {resp.status_code}，{delay:.1f}s 后重试（{attempt + 1}/{retries}）")
+
+            self._record_retry(host)
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self.backoff_max, self.backoff_base * (2 ** attempt) + random.random() * self.backoff_base)
+
+    # ---------- 指标 ----------
+
+    def _host_metrics(self, host: str) -> Dict[str, Any]:
+        m = self._metrics.get(host)
+        if m is None:
+            m = {"requests": 0, "errors": 0, "retries": 0, "status": {}, "total_s": 0.0, "max_s": 0.0}
+            self._metrics[host] = m
+        return m
+
+    def _record(self, host: str, status: Optional[int], elapsed: float, *, error: bool = False) -> None:
+        with self._mu:
+            m = self._host_metrics(host)
+            m["requests"] += 1
+            m["total_s"] += float(elapsed)
+            m["max_s"] = max(m["max_s"], float(elapsed))
+            if error or status is None or status >= 400:
+                m["errors"] += 1
+            if status is not None:
+                key = str(status)
+                m["status"][key] = m["status"].get(key, 0) + 1
+
+    def _record_retry(self, host: str) -> None:
+        with self._mu:
+            self._host_metrics(host)["retries"] += 1
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        with self._mu:
+            out: Dict[str, Dict[str, Any]] = {}
+            for host, m in self._metrics.items():
+                snap = dict(m)
+                snap["status"] = dict(m["status"])
+                snap["avg_s"] = (m["total_s"] / m["requests"]) if m["requests"] else 0.0
+                out[host] = snap
+            return out
+
+    def reset_metrics(self) -> None:
+        with self._mu:
+            self._metrics.clear()
+
+
+_CLIENT: Optional[HttpClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    """
+    进程级共享客户端（首次调用时按环境变量初始化）。
+    """
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = HttpClient(
+                timeout=env_float("SB_HTTP_TIMEOUT", "30"),
+                max_retries=env_int("SB_HTTP_MAX_RETRIES", "4"),
+                backoff_base=env_float("SB_HTTP_BACKOFF_BASE", "1.0"),
+                backoff_max=env_float("SB_HTTP_BACKOFF_MAX", "60"),
+                rate_limits=_parse_rate_limits(env_str("SB_HTTP_RATE_LIMITS", DEFAULT_RATE_LIMITS)),
+            )
+        return _CLIENT
@@ -0,0 +1,202 @@
+# session_store.py
+"""
+按 chat_id 管理 SecondBrain 会话（LRU + 空闲超时）。
+
+- 最多保留 max_sessions 个会话；超出时淘汰最久未使用的
+- 超过 idle_seconds 未活动的会话也会被淘汰
+- 有在途消息的会话不会被淘汰，保证同一 chat 内的顺序：lock_for 给会话的在途计数 +1（在 await 锁之前），
+  这一轮处理完调用 release 再 -1；排队等锁的消息也算在途
+- 淘汰只在事件循环线程进行（release 里顺带做），与 lock_for 不会交错；get 可在线程池里调用，但不淘汰
+- spill_dir 非空时，淘汰时把对话历史（不含 system prompt）写成 JSON（同步完成，之后该 chat 的新会话才可能建立），
+  下次该 chat 来消息时重建 SecondBrain 并恢复历史
+- 每次淘汰 / 恢复后通过 log_telemetry 输出计数（SB_TELEMETRY=1 时可见）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from core.config import log_telemetry
+from core.utils.io_helper import atomic_write_text
+
+
+@dataclass
+class _Session:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    brain: Any = None
+    last_used: float = 0.0
+    inflight: int = 0
+
+
+class SessionStore:
+    def __init__(
+        self,
+        factory: Callable[[int], Any],
+        *,
+        max_sessions: int = 500,
+        idle_seconds: float = 3600.0,
+        spill_dir: Optional[Path] = None,
+    ) -> None:
+        self.factory = factory
+        self.max_sessions = max(1, int(max_sessions))
+        self.idle_seconds = float(idle_seconds)
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+
+        self._mu = threading.Lock()
+        self._sessions: "OrderedDict[int, _Session]" = OrderedDict()
+        self._counters: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expired": 0,
+            "spilled": 0,
+            "rehydrated": 0,
+        }
+
+    # ---------- 对外接口 ----------
+
+    def lock_for(self, chat_id: int) -> asyncio.Lock:
+        """
+        该 chat 的 asyncio.Lock，并把会话的在途计数 +1（需在事件循环线程调用）。
+        每次调用都必须对应一次 release(chat_id)，一般放在 finally 里。
+        """
+        with self._mu:
+            sess = self._sessions.get(chat_id)
+            if sess is None:
+                sess = _Session()
+                self._sessions[chat_id] = sess
+            self._sessions.move_to_end(chat_id)
+            sess.last_used = time.monotonic()
+            sess.inflight += 1
+            return sess.lock
+
+    def release(self, chat_id: int) -> None:
+        """
+        这一轮处理完：在途计数 -1，并顺带淘汰超额/空闲会话（需在事件循环线程调用）。
+        """
+        with self._mu:
+            sess = self._sessions.get(chat_id)
+            if sess is not None and sess.inflight > 0:
+                sess.inflight -= 1
+                sess.last_used = time.monotonic()
+        self.evict()
+
+    def get(self, chat_id: int) -> Any:
+        """
+        取（或新建/从磁盘恢复）该 chat 的 SecondBrain。
+        新建会读取上下文文件，可放在线程池里调用；调用方应持有 lock_for 的锁（在途会话不会被淘汰）。
+        """
+        with self._mu:
+            sess = self._sessions.get(chat_id)
+            if sess is None:
+                sess = _Session()
+                self._sessions[chat_id] = sess
+            self._sessions.move_to_end(chat_id)
+            sess.last_used = time.monotonic()
+            brain = sess.brain
+            if brain is not None:
+                self._counters["hits"] += 1
+            else:
+                self._counters["misses"] += 1
+
+        if brain is None:
+            brain = self.factory(chat_id)
+            if self._rehydrate(chat_id, brain):
+                with self._mu:
+                    self._counters["rehydrated"] += 1
+                self.log_stats("rehydrate")
+            with self._mu:
+                # 同一 chat 由 lock_for 串行，这里不会出现两个线程同时新建
+                sess.brain = brain
+        return brain
+
+    def evict(self) -> int:
+        """
+        按 LRU / 空闲超时淘汰会话，返回淘汰个数（需在事件循环线程调用，见模块说明）。
+        """
+        now = time.monotonic()
+        victims = []
+        with self._mu:
+            for chat_id in list(self._sessions.keys()):
+                sess = self._sessions[chat_id]
+                over = len(self._sessions) > self.max_sessions
+                idle = self.idle_seconds > 0 and (now - sess.last_used) > self.idle_seconds
+                if not over and not idle:
+                    # OrderedDict 按最近使用排序，后面的只会更新
+                    break
+                if sess.inflight > 0:
+                    continue
+                del self._sessions[chat_id]
+                self._counters["evictions"] += 1
+                if idle and not over:
+                    self._counters["expired"] += 1
+                victims.append((chat_id, sess))
+
+        for chat_id, sess in victims:
+            if sess.brain is not None and self._spill(chat_id, sess.brain):
+                with self._mu:
+                    self._counters["spilled"] += 1
+        if victims:
+            self.log_stats("evict")
+        return len(victims)
+
+    def stats(self) -> Dict[str, int]:
+        with self._mu:
+            out = dict(self._counters)
+            out["sessions"] = len(self._sessions)
+            out["loaded"] = sum(1 for s in self._sessions.values() if s.brain is not None)
+        return out
+
+    def log_stats(self, outcome: str) -> None:
+        s = self.stats()
+        log_telemetry(
+            f"session store {outcome}: sessions={s['sessions']} loaded={s['loaded']} hits={s['hits']} "
+            f"misses={s['misses']} evictions={s['evictions']} expired={s['expired']} "
+            f"spilled={s['spilled']} rehydrated={s['rehydrated']}"
+        )
+
+    def clear(self) -> None:
+        with self._mu:
+            self._sessions.clear()
+
+    # ---------- 落盘 / 恢复 ----------
+
+    def _spill_path(self, chat_id: int) -> Optional[Path]:
+        if self.spill_dir is None:
+            return None
+        return self.spill_dir / f"session_{int(chat_id)}.json"
+
+    def _spill(self, chat_id: int, brain: Any) -> bool:
+        path = self._spill_path(chat_id)
+        if path is None:
+            return False
+        try:
+            payload = {"chat_id": int(chat_id), "mode": brain.mode, "messages": brain.export_history()}
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_text(path, json.dumps(payload, ensure_ascii=False, separators=(",", ":")))
+            return True
+        except Exception as e:
+            print(f"⚠️ [session_store] 会话落盘失败 chat_id={chat_id}: {e}")
+            return False
+
+    def _rehydrate(self, chat_id: int, brain: Any) -> bool:
+        path = self._spill_path(chat_id)
+        if path is None or not path.exists():
+            return False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            if payload.get("mode") == brain.mode:
+                brain.import_history(payload.get("messages") or [])
+            path.unlink()
+            return True
+        except Exception as e:
+            print(f"⚠️ [session_store] 会话恢复失败 chat_id={chat_id}: {e}")
+            return False
@@ -0,0 +1,142 @@
+"""
+对话入口的离线负载测试（假 LLM，不联网；只读 data/ 构建上下文，不写任何文件）。
+
+用法：
+  python3 scripts/bench_chat.py tg --chats 1,8,32 --msgs 3 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+_ROOT = Path(__file__).resolve().parents[1]
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+
+class _FakeLLM:
+    """
+    只模拟阻塞延迟的 chat model：invoke 睡 latency 秒后回显最后一条消息。
+    """
+
+    def __init__(self, latency: float) -> None:
+        self.latency = float(latency)
+
+    def invoke(self, messages: List[Any]) -> Any:
+        from langchain_core.messages import AIMessage
+
+        time.sleep(self.latency)
+        return AIMessage(content=f"echo: {messages[-1].content}")
+
+    async def astream(self, messages: List[Any]) -> Any:
+        from langchain_core.messages import AIMessageChunk
+
+        # 流式：首 token 很快到达，其余均匀分布在 latency 内
+        words = f"echo: {messages[-1].content}".split(" ")
+        for i, w in enumerate(words):
+            await asyncio.sleep(self.latency / max(1, len(words)))
+            yield AIMessageChunk(content=w if i == 0 else " " + w)
+
+
+class _FakeChat:
+    def __init__(self, chat_id: int) -> None:
+        self.id = chat_id
+
+
+class _FakeMessage:
+    def __init__(self, chat_id: int, text: str) -> None:
+        self.chat = _FakeChat(chat_id)
+        self.text = text
+        self.from_user = None
+        self.replies: List[str] = []
+
+    async def reply_text(self, text: str) -> "_FakeMessage":
+        self.replies.append(text)
+        return self
+
+    async def edit_text(self, text: str) -> None:
+        self.replies[-1] = text
+
+
+class _FakeUpdate:
+    def __init__(self, chat_id: int, text: str) -> None:
+        self.message = _FakeMessage(chat_id, text)
+
+
+def bench_tg(chats: List[int], msgs: int, latency: float) -> List[Dict[str, Any]]:
+    """
+    每个 chat 串行发 msgs 条消息、各 chat 之间并发，统计总耗时与吞吐。
+    期望：吞吐随 chat 数线性增长，直到 TG_MAX_CONCURRENCY 封顶。
+    """
+    from apps import tg_bot
+    from core.brain import SecondBrain
+
+    def _fake_brain(chat_id: int) -> SecondBrain:
+        brain = SecondBrain(mode="friend", enable_tools=False, retrieval=False)
+        brain._llm = _FakeLLM(latency)
+        return brain
+
+    store = tg_bot._SESSIONS
+    store.factory = _fake_brain
+    store.spill_dir = None
+    store.max_sessions = max(store.max_sessions, max(int(n) for n in chats))
+
+    async def _run(n_chats: int) -> float:
+        async def _one_chat(chat_id: int) -> None:
+            for j in range(int(msgs)):
+                upd = _FakeUpdate(chat_id, f"msg {j}")
+                await tg_bot._handle_message(upd, None)
+                assert "".join(upd.message.replies[-1:]) == f"echo: msg {j}", upd.message.replies
+
+        # 预热：建好 SecondBrain（上下文加载不计入）
+        for cid in range(1, n_chats + 1):
+            store.get(cid)
+        t0 = time.perf_counter()
+        await asyncio.gather(*[_one_chat(cid) for cid in range(1, n_chats + 1)])
+        return time.perf_counter() - t0
+
+    rows: List[Dict[str, Any]] = []
+    for n in chats:
+        store.clear()
+        tg_bot._SEMAPHORE = None
+        elapsed = asyncio.run(_run(int(n)))
+        total = int(n) * int(msgs)
+        rows.append({
+            "chats": int(n),
+            "messages": total,
+            "elapsed_s": round(elapsed, 3),
+            "msg_per_s": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+        })
+    return rows
+
+
+def _print_rows(rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        return
+    cols = list(rows[0].keys())
+    print(" | ".join(cols))
+    for r in rows:
+        print(" | ".join(str(r[c]) for c in cols))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    ap_tg = sub.add_parser("tg", help="tg_bot handler：假 LLM 下的多 chat 并发吞吐")
+    ap_tg.add_argument("--chats", default="1,8,32", help="逗号分隔的并发 chat 数")
+    ap_tg.add_argument("--msgs", type=int, default=3, help="每个 chat 串行发送的消息数")
+    ap_tg.add_argument("--latency", type=float, default=0.2, help="假 LLM 每次调用的延迟（秒）")
+    ap_tg.add_argument("--stream", action="store_true", help="走 TG_STREAM=1 的流式回复路径（astream_answer）")
+
+    args = ap.parse_args()
+    if args.cmd == "tg":
+        # 压测消息不落对话日志（显式设置，.env 的 load_dotenv 不会覆盖）
+        os.environ["TG_SAVE_DIALOG"] = "0"
+        os.environ["TG_STREAM"] = "1" if args.stream else "0"
+        counts = [int(x) for x in str(args.chats).split(",") if x.strip()]
+        _print_rows(bench_tg(counts, msgs=args.msgs, latency=args.latency))
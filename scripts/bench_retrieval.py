@@ -0,0 +1,411 @@
+"""
+检索热路径的离线基准（合成语料，不读写 data/）。
+
+用法：
+  python3 scripts/bench_retrieval.py tail --sizes-mb 1,8,64 --max-scan 4000
+  python3 scripts/bench_retrieval.py weights --n 200000
+  python3 scripts/bench_retrieval.py tokens --n 100000 --queries 20
+  python3 scripts/bench_retrieval.py matrix --n 100000 --queries 50
+  python3 scripts/bench_retrieval.py dense --n 100000 --queries 20
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+_ROOT = Path(__file__).resolve().parents[1]
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from core.utils.io_helper import iter_last_lines
+
+
+_WORDS_EN = ["btc", "eth", "sol", "bonk", "hype", "aster", "long", "short", "framework", "thesis", "python", "agent"]
+_WORDS_ZH = ["复盘", "策略", "逻辑", "假设", "结论", "流动性", "牛市", "仓位", "止损", "学习", "笔记", "测试"]
+
+
+def _synthetic_line(rng: random.Random, i: int) -> str:
+    words = [rng.choice(_WORDS_EN + _WORDS_ZH) for _ in range(rng.randint(20, 120))]
+    obj = {
+        "uid": f"{i:040x}",
+        "source": rng.choice(["notion", "x"]),
+        "file_path": f"data/raw/x/bench/{i}.md",
+        "created_at": None,
+        "ingested_at": "2025-12-22T00:00:00+00:00",
+        "weight": round(rng.random(), 4),
+        "text": " ".join(words),
+        "meta": {},
+    }
+    return json.dumps(obj, ensure_ascii=False) + "\n"
+
+
+def _write_corpus(path: Path, size_mb: float, seed: int = 7) -> int:
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    n = 0
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            ln = _synthetic_line(rng, n)
+            f.write(ln)
+            written += len(ln.encode("utf-8"))
+            n += 1
+    return n
+
+
+def _best_of(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(max(1, int(repeat))):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_tail(sizes_mb: List[float], max_scan: int, repeat: int) -> List[Dict[str, Any]]:
+    """
+    对比：旧实现（read_text + splitlines + 切片） vs 反向分块 tail。
+    期望：前者随文件大小线性增长，后者基本恒定。
+    """
+    rows: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as td:
+        for mb in sizes_mb:
+            path = Path(td) / f"corpus_{mb}mb.jsonl"
+            n_lines = _write_corpus(path, mb)
+
+            def _full_read() -> List[str]:
+                return path.read_text(encoding="utf-8").splitlines()[-int(max_scan):]
+
+            def _tail() -> List[str]:
+                return iter_last_lines(path, int(max_scan))
+
+            assert _full_read() == _tail()
+            rows.append({
+                "size_mb": mb,
+                "lines": n_lines,
+                "full_read_ms": round(_best_of(_full_read, repeat) * 1000, 2),
+                "tail_ms": round(_best_of(_tail, repeat) * 1000, 2),
+            })
+            os.remove(path)
+    return rows
+
+
+def bench_weights(n: int, repeat: int, seed: int = 11) -> List[Dict[str, Any]]:
+    """
+    score_time / compute_cog_weight：逐条标量 vs NumPy 批量。
+    先做一致性校验（含 NaN 缺失、未来时间、窗口边界两侧、各类退化参数），再计时。
+    """
+    import numpy as np
+    from datetime import datetime, timedelta, timezone
+
+    from core.weighting import compute_cog_weight, compute_cog_weight_batch, score_time, score_time_batch
+
+    rng = random.Random(seed)
+    now = datetime(2025, 12, 22, tzinfo=timezone.utc)
+    dts: List[Any] = []
+    for _ in range(int(n)):
+        r = rng.random()
+        if r < 0.05:
+            dts.append(None)
+        else:
+            dts.append(now - timedelta(seconds=rng.uniform(-3 * 86400, 60 * 86400)))
+    epochs = np.array([d.timestamp() if d is not None else np.nan for d in dts], dtype=np.float64)
+    depths = [rng.uniform(-0.2, 1.2) for _ in range(int(n))]
+
+    configs = [(15.0, 3.0, 0.05), (30.0, 3.0, 0.0), (0.0, 3.0, 0.2), (10.0, 0.0, 0.3), (7.0, 2.0, 1.5)]
+    for w, hl, fl in configs:
+        scalar = [score_time(d, now=now, window_days=w, half_life_days=hl, floor=fl) for d in dts]
+        batch = score_time_batch(epochs, now, window_days=w, half_life_days=hl, floor=fl)
+        if not np.allclose(batch, scalar, rtol=1e-9, atol=1e-12):
+            raise AssertionError(f"score_time_batch 与标量版不一致: window={w} half_life={hl} floor={fl}")
+    for alpha in (0.0, 0.5, -2.0, 8.0):
+        scalar = [compute_cog_weight(x, alpha=alpha) for x in depths]
+        if not np.allclose(compute_cog_weight_batch(depths, alpha=alpha), scalar):
+            raise AssertionError(f"compute_cog_weight_batch 与标量版不一致: alpha={alpha}")
+
+    ds_arr = np.array(depths)
+    return [
+        {
+            "fn": "score_time",
+            "n": int(n),
+            "scalar_ms": round(_best_of(lambda: [score_time(d, now=now) for d in dts], repeat) * 1000, 2),
+            "batch_ms": round(_best_of(lambda: score_time_batch(epochs, now), repeat) * 1000, 2),
+        },
+        {
+            "fn": "compute_cog_weight",
+            "n": int(n),
+            "scalar_ms": round(_best_of(lambda: [compute_cog_weight(x, alpha=0.5) for x in depths], repeat) * 1000, 2),
+            "batch_ms": round(_best_of(lambda: compute_cog_weight_batch(ds_arr, alpha=0.5), repeat) * 1000, 2),
+        },
+    ]
+
+
+def _write_corpus_lines(path: Path, n: int, seed: int = 7) -> None:
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(int(n)):
+            f.write(_synthetic_line(rng, i))
+
+
+def _cpu_per_query(fn: Callable[[str], Any], queries: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(max(1, int(repeat))):
+        t0 = time.process_time()
+        for q in queries:
+            fn(q)
+        best = min(best, time.process_time() - t0)
+    return best / max(1, len(queries))
+
+
+def bench_tokens(n: int, n_queries: int, repeat: int, seed: int = 13) -> List[Dict[str, Any]]:
+    """
+    列存扫描路径（无倒排索引）的 binary cosine：逐条分词 vs ingest 预存的 int32 token id 求交。
+    先校验两条路径返回的 (row, sim) 完全一致，再按 process_time 统计每个 query 的 CPU 时间。
+    """
+    from core.corpus_columns import load_fresh_columns, sync_columns
+    from core.retrieval import _score_texts, _score_token_ids, _tokenize
+    from core.scoring import CosineScorer
+
+    rng = random.Random(seed)
+    queries = [" ".join(rng.choice(_WORDS_EN + _WORDS_ZH) for _ in range(rng.randint(2, 6))) for _ in range(int(n_queries))]
+    min_sim = 0.05
+    scorer = CosineScorer()
+
+    with tempfile.TemporaryDirectory() as td:
+        corpus = Path(td) / "corpus.jsonl"
+        _write_corpus_lines(corpus, n)
+        t0 = time.perf_counter()
+        sync_columns(corpus)
+        build_s = time.perf_counter() - t0
+        cols = load_fresh_columns(corpus)
+        assert cols is not None
+
+        def _old(q: str) -> List[Any]:
+            q_tokens = set(_tokenize(q))
+            rows = ((i, cols.text(i).strip()) for i in range(cols.n) if cols.is_valid(i))
+            return [(i, sim) for i, _, sim in _score_texts(((i, t) for i, t in rows if t), q_tokens, scorer, min_similarity=min_sim)]
+
+        def _new(q: str) -> List[Any]:
+            return _score_token_ids(cols, 0, set(_tokenize(q)), min_similarity=min_sim)
+
+        for q in queries:
+            if _old(q) != _new(q):
+                raise AssertionError(f"预分词路径与逐条分词结果不一致: {q!r}")
+
+        old_s = _cpu_per_query(_old, queries, repeat)
+        new_s = _cpu_per_query(_new, queries, repeat)
+        return [{
+            "chunks": int(n),
+            "queries": len(queries),
+            "columns_build_s": round(build_s, 2),
+            "tokenize_ms_per_q": round(old_s * 1000, 2),
+            "token_ids_ms_per_q": round(new_s * 1000, 2),
+            "speedup": round(old_s / new_s, 1) if new_s > 0 else 0.0,
+        }]
+
+
+def bench_matrix(n: int, n_queries: int, repeat: int, top_k: int = 6, seed: int = 17) -> List[Dict[str, Any]]:
+    """
+    cosine 打分（max_scan 覆盖全部 chunk）：逐行 token id 求交 vs CSR 稀疏矩阵-向量乘；
+    retrieve_from_corpus 对比三种配置：CSR 矩阵（倒排索引也新鲜，默认即走矩阵）、
+    只有倒排索引 + 列存、只有列存扫描。先校验候选 (row, sim) 逐位一致、各配置 topK 完全一致（含时间衰减），
+    再统计每个 query 的 CPU 时间（结果缓存关闭）。
+    """
+    from datetime import datetime, timezone
+
+    from core.corpus_columns import load_fresh_columns, sync_columns
+    from core.corpus_index import index_path_for, sync_index
+    from core.corpus_matrix import load_fresh_matrix, matrix_dir_for, sync_matrix
+    from core.retrieval import _matrix_candidates, _score_token_ids, _tokenize, retrieve_from_corpus
+
+    rng = random.Random(seed)
+    queries = [" ".join(rng.choice(_WORDS_EN + _WORDS_ZH) for _ in range(rng.randint(2, 6))) for _ in range(int(n_queries))]
+    min_sim = 0.05
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    os.environ["SB_RETRIEVAL_CACHE"] = "0"
+
+    with tempfile.TemporaryDirectory() as td:
+        corpus = Path(td) / "corpus.jsonl"
+        rng_c = random.Random(7)
+        with open(corpus, "w", encoding="utf-8") as f:
+            for i in range(int(n)):
+                obj = json.loads(_synthetic_line(rng_c, i))
+                # 一半行带时间戳，让时间衰减参与排序
+                if i % 2 == 0:
+                    obj["created_at"] = datetime.fromtimestamp(now.timestamp() - rng_c.random() * 40 * 86400, tz=timezone.utc).isoformat()
+                f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+        sync_index(corpus)
+        sync_columns(corpus)
+        t0 = time.perf_counter()
+        sync_matrix(corpus)
+        build_s = time.perf_counter() - t0
+        cols = load_fresh_columns(corpus)
+        mat = load_fresh_matrix(corpus)
+        assert cols is not None and mat is not None
+        cfg = dict(
+            now_dt=now, decay_enabled=False, decay_window_days=15.0, decay_half_life_days=3.0,
+            decay_floor=0.05, cog_enabled=False, depth_alpha=0.0,
+        )
+
+        def _ids(q: str) -> List[Any]:
+            return _score_token_ids(cols, 0, set(_tokenize(q)), min_similarity=min_sim)
+
+        def _csr(q: str) -> List[Any]:
+            return _matrix_candidates(mat, cols, set(_tokenize(q)), start=0, min_similarity=min_sim, keep=0, weight_cfg=cfg)[0]
+
+        for q in queries:
+            if _ids(q) != _csr(q):
+                raise AssertionError(f"CSR 路径与逐行求交结果不一致: {q!r}")
+
+        def _retrieve(q: str) -> List[Any]:
+            return [
+                (h.uid, h.final_score, h.time_weight)
+                for h in retrieve_from_corpus(corpus_path=corpus, query=q, top_k=top_k, max_scan=0, min_similarity=min_sim, now=now)
+            ]
+
+        rows: List[Dict[str, Any]] = []
+        for decay in ("0", "1"):
+            os.environ["SB_DECAY_ENABLED"] = decay
+            with_csr = {q: _retrieve(q) for q in queries}
+            csr_s = _cpu_per_query(_retrieve, queries, repeat)
+            meta = matrix_dir_for(corpus) / "meta.json"
+            index = index_path_for(corpus)
+            meta.rename(meta.with_name("meta.json.off"))
+            try:
+                for q in queries:
+                    if _retrieve(q) != with_csr[q]:
+                        raise AssertionError(f"retrieve_from_corpus 的 topK 不一致（倒排索引, decay={decay}）: {q!r}")
+                index_s = _cpu_per_query(_retrieve, queries, 1)
+                index.rename(index.with_name(index.name + ".off"))
+                try:
+                    for q in queries:
+                        if _retrieve(q) != with_csr[q]:
+                            raise AssertionError(f"retrieve_from_corpus 的 topK 不一致（扫描, decay={decay}）: {q!r}")
+                    scan_s = _cpu_per_query(_retrieve, queries, 1)
+                finally:
+                    index.with_name(index.name + ".off").rename(index)
+            finally:
+                meta.with_name("meta.json.off").rename(meta)
+            rows.append({
+                "chunks": int(n),
+                "decay": decay,
+                "queries": len(queries),
+                "matrix_build_s": round(build_s, 2),
+                "token_ids_ms_per_q": round(_cpu_per_query(_ids, queries, 1) * 1000, 2),
+                "csr_ms_per_q": round(_cpu_per_query(_csr, queries, repeat) * 1000, 2),
+                "retrieve_scan_ms": round(scan_s * 1000, 2),
+                "retrieve_index_ms": round(index_s * 1000, 2),
+                "retrieve_csr_ms": round(csr_s * 1000, 2),
+                "speedup_vs_index": round(index_s / csr_s, 1) if csr_s > 0 else 0.0,
+            })
+        os.environ.pop("SB_DECAY_ENABLED", None)
+        return rows
+
+
+def bench_dense(n: int, n_queries: int, repeat: int, top_k: int = 6, seed: int = 19) -> List[Dict[str, Any]]:
+    """
+    语义检索：sync_vectors 的向量化吞吐、暴力检索延迟，以及 retrieve_from_corpus 纯词法 vs 混合打分的 CPU 时间。
+    向量器按当前环境（SB_EMBED_MODEL / SB_EMBED_DIM）选择，结果缓存关闭。
+    """
+    from core.corpus_columns import sync_columns
+    from core.corpus_matrix import sync_matrix
+    from core.corpus_vectors import load_fresh_vectors, sync_vectors
+    from core.embedding import get_embedder
+    from core.retrieval import retrieve_from_corpus
+
+    rng = random.Random(seed)
+    queries = [" ".join(rng.choice(_WORDS_EN + _WORDS_ZH) for _ in range(rng.randint(2, 6))) for _ in range(int(n_queries))]
+    os.environ["SB_RETRIEVAL_CACHE"] = "0"
+    embedder = get_embedder()
+
+    with tempfile.TemporaryDirectory() as td:
+        corpus = Path(td) / "corpus.jsonl"
+        _write_corpus_lines(corpus, n)
+        sync_columns(corpus)
+        sync_matrix(corpus)
+        t0 = time.perf_counter()
+        sync_vectors(corpus, embedder)
+        build_s = time.perf_counter() - t0
+        vecs = load_fresh_vectors(corpus, embedder.name)
+        assert vecs is not None
+        q_vecs = {q: embedder.embed([q])[0] for q in queries}
+
+        def _search(q: str) -> Any:
+            return vecs.search(q_vecs[q], 50)
+
+        def _retrieve(q: str) -> Any:
+            return retrieve_from_corpus(corpus_path=corpus, query=q, top_k=top_k, max_scan=0, min_similarity=0.05)
+
+        os.environ["SB_EMBED"] = "0"
+        lexical_s = _cpu_per_query(_retrieve, queries, repeat)
+        os.environ["SB_EMBED"] = "1"
+        try:
+            hybrid_s = _cpu_per_query(_retrieve, queries, repeat)
+        finally:
+            os.environ.pop("SB_EMBED", None)
+        return [{
+            "chunks": int(n),
+            "embedder": embedder.name,
+            "embed_chunks_per_s": round(n / build_s, 1) if build_s > 0 else 0.0,
+            "vectors_mb": round(vecs.n * vecs.dim * 2 / 1024 / 1024, 1),
+            "search_ms_per_q": round(_cpu_per_query(_search, queries, repeat) * 1000, 2),
+            "retrieve_lexical_ms": round(lexical_s * 1000, 2),
+            "retrieve_hybrid_ms": round(hybrid_s * 1000, 2),
+        }]
+
+
+def _print_rows(rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        return
+    cols = list(rows[0].keys())
+    print(" | ".join(cols))
+    for r in rows:
+        print(" | ".join(str(r[c]) for c in cols))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    ap_tail = sub.add_parser("tail", help="corpus tail 读取：全文读取 vs 反向分块")
+    ap_tail.add_argument("--sizes-mb", default="1,8,64", help="逗号分隔的合成 corpus 大小（MB）")
+    ap_tail.add_argument("--max-scan", type=int, default=4000)
+    ap_tail.add_argument("--repeat", type=int, default=3)
+
+    ap_w = sub.add_parser("weights", help="时间衰减/认知权重：标量 vs NumPy 批量（含一致性校验）")
+    ap_w.add_argument("--n", type=int, default=200000)
+    ap_w.add_argument("--repeat", type=int, default=3)
+
+    ap_tok = sub.add_parser("tokens", help="扫描路径相似度：逐条分词 vs 预存 int32 token id 求交（含一致性校验）")
+    ap_tok.add_argument("--n", type=int, default=100000, help="合成 chunk 数")
+    ap_tok.add_argument("--queries", type=int, default=20)
+    ap_tok.add_argument("--repeat", type=int, default=1)
+
+    ap_mat = sub.add_parser("matrix", help="扫描路径相似度：逐行 token id 求交 vs CSR 稀疏矩阵-向量乘（含一致性校验）")
+    ap_mat.add_argument("--n", type=int, default=100000, help="合成 chunk 数")
+    ap_mat.add_argument("--queries", type=int, default=50)
+    ap_mat.add_argument("--repeat", type=int, default=3)
+
+    ap_dense = sub.add_parser("dense", help="语义检索：向量化吞吐 / 暴力检索延迟 / 纯词法 vs 混合打分")
+    ap_dense.add_argument("--n", type=int, default=100000, help="合成 chunk 数")
+    ap_dense.add_argument("--queries", type=int, default=20)
+    ap_dense.add_argument("--repeat", type=int, default=3)
+
+    args = ap.parse_args()
+    if args.cmd == "dense":
+        _print_rows(bench_dense(args.n, n_queries=args.queries, repeat=args.repeat))
+    if args.cmd == "matrix":
+        _print_rows(bench_matrix(args.n, n_queries=args.queries, repeat=args.repeat))
+    if args.cmd == "tokens":
+        _print_rows(bench_tokens(args.n, n_queries=args.queries, repeat=args.repeat))
+    if args.cmd == "weights":
+        _print_rows(bench_weights(args.n, repeat=args.repeat))
+    if args.cmd == "tail":
+        sizes = [float(x) for x in str(args.sizes_mb).split(",") if x.strip()]
+        _print_rows(bench_tail(sizes, max_scan=args.max_scan, repeat=args.repeat))
@@ -0,0 +1,275 @@
+"""
+corpus 压缩：去掉被新版本取代的旧 chunk 与重复行，原子重写 data/corpus.jsonl。
+
+规则：
+- 文件的当前 chunk 集合以 sync_state 里该文件的 uids 为准（ingest 只追加变化的块，
+  当前块可能分散在多次追加里，不能按“最后一批”判断）：uid 不在集合里的行是被取代的旧版本，丢弃
+- state 没有记录 uids 的文件（本系列之前的旧版 state）：旧版 ingest 每次把变化文件的全部 chunk 连续追加，
+  所以只留该 file_path 的“最新一批”——相邻、同 file_path、ingested_at 与上一行相差不超过 BATCH_GAP_SECONDS 的行
+- 同一 (file_path, uid) 只留最新一行
+- 无 uid 的行按 (source, file_path, created_at, 正文开头) 去重
+- 坏行（非 JSON）丢弃
+- 行的相对顺序不变
+
+重写后：重建倒排索引/列存/CSR 矩阵（及启用时的稠密向量），更新 sync_state 的 corpus_bytes 与 profile_state 的游标（行号与字节偏移）。
+不要与 ingest 同时运行（scheduler 是串行的）；重写前若发现 corpus 已被改动会放弃。
+
+用法：
+  python3 scripts/compact.py            # 执行
+  python3 scripts/compact.py --dry-run  # 只统计
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+_ROOT = Path(__file__).resolve().parents[1]
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from core.corpus_columns import sync_columns
+from core.corpus_index import sync_index
+from core.config import env_bool
+from core.corpus_matrix import sync_matrix
+from core.corpus_vectors import sync_vectors
+from core.utils.io_helper import atomic_write_text
+
+CORPUS_PATH = "data/corpus.jsonl"
+SYNC_STATE = "state/sync_state.json"
+PROFILE_STATE = "state/profile_state.json"
+
+BATCH_GAP_SECONDS = 5.0
+
+
+def _parse_ts(s: Any) -> Optional[float]:
+    if not s:
+        return None
+    try:
+        return datetime.fromisoformat(str(s).replace("Z", "+00:00")).timestamp()
+    except Exception:
+        return None
+
+
+def _latest_batches(rows: List[Tuple[bytes, Optional[Dict[str, Any]]]]) -> Tuple[List[int], Dict[str, int]]:
+    """
+    切分批次（旧版 state 的文件用）：返回 (每行的批次号, file_path -> 最新批次号)。
+    """
+    batch_of: List[int] = [-1] * len(rows)
+    latest: Dict[str, int] = {}
+    batch_id = -1
+    prev_fp: Optional[str] = None
+    prev_ts: Optional[float] = None
+    for i, (_, obj) in enumerate(rows):
+        if obj is None:
+            prev_fp, prev_ts = None, None
+            continue
+        fp = obj.get("file_path") or ""
+        ts = _parse_ts(obj.get("ingested_at"))
+        same = (
+            fp
+            and fp == prev_fp
+            and ts is not None
+            and prev_ts is not None
+            and 0.0 <= ts - prev_ts <= BATCH_GAP_SECONDS
+        )
+        if not same:
+            batch_id += 1
+        batch_of[i] = batch_id
+        if fp:
+            latest[fp] = batch_id
+        prev_fp, prev_ts = fp, ts
+    return batch_of, latest
+
+
+
+def _read_lines(path: str) -> List[Tuple[bytes, Optional[Dict[str, Any]]]]:
+    rows: List[Tuple[bytes, Optional[Dict[str, Any]]]] = []
+    with open(path, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                raw += b"\n"
+            try:
+                obj = json.loads(raw.decode("utf-8"))
+                rows.append((raw, obj if isinstance(obj, dict) else None))
+            except Exception:
+                rows.append((raw, None))
+    return rows
+
+
+def plan_keep(
+    rows: List[Tuple[bytes, Optional[Dict[str, Any]]]],
+    live: Optional[Dict[str, Set[str]]] = None,
+) -> List[bool]:
+    """
+    返回与 rows 等长的 keep 标记。live：file_path -> 当前 chunk uid 集合（见 live_chunk_sets）；
+    不在 live 里的 file_path 按旧版规则只留最新一批。
+    """
+    live = live or {}
+    n = len(rows)
+    batch_of, latest_batch = _latest_batches(rows)
+
+    # 1) 每个 (file_path, uid) 的最新一行
+    newest: Dict[Tuple[str, str], int] = {}
+    for i, (_, obj) in enumerate(rows):
+        if obj is not None and obj.get("uid"):
+            newest[(obj.get("file_path") or "", str(obj["uid"]))] = i
+
+    # 2) 只留当前 chunk 集合（或旧版 state 下的最新一批）里、且是最新的行；无 uid 的行按内容去重
+    keep = [False] * n
+    seen: set = set()
+    for i, (_, obj) in enumerate(rows):
+        if obj is None:
+            continue
+        fp = obj.get("file_path") or ""
+        if fp and fp not in live and latest_batch.get(fp) != batch_of[i]:
+            continue
+        uid = obj.get("uid")
+        if uid:
+            uid = str(uid)
+            if fp in live and uid not in live[fp]:
+                continue
+            keep[i] = newest[(fp, uid)] == i
+            continue
+        head = (obj.get("text") or "")[:120]
+        key = f"fp:{obj.get('source') or ''}|{fp}|{obj.get('created_at') or ''}|{head}"
+        if key in seen:
+            continue
+        seen.add(key)
+        keep[i] = True
+    return keep
+
+
+def _load_json(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else None
+    except Exception:
+        return None
+
+
+def live_chunk_sets(sync_state: Optional[Dict[str, Any]]) -> Dict[str, Set[str]]:
+    """
+    sync_state.files 里记录了 uids 的文件 -> 当前 chunk uid 集合。
+    """
+    out: Dict[str, Set[str]] = {}
+    files = (sync_state or {}).get("files") or {}
+    for fp, entry in files.items():
+        if isinstance(entry, dict) and isinstance(entry.get("uids"), list):
+            out[fp] = {str(u) for u in entry["uids"]}
+    return out
+
+
+def _line_at_offset(rows: List[Tuple[bytes, Optional[Dict[str, Any]]]], offset: int) -> Optional[int]:
+    pos = 0
+    for i, (raw, _) in enumerate(rows):
+        if pos == offset:
+            return i
+        pos += len(raw)
+    return len(rows) if pos == offset else None
+
+
+def _update_dependent_state(
+    rows: List[Tuple[bytes, Optional[Dict[str, Any]]]], keep: List[bool], new_bytes: int
+) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+
+    sync_state = _load_json(SYNC_STATE)
+    if sync_state is not None:
+        sync_state["corpus_bytes"] = int(new_bytes)
+        atomic_write_text(Path(SYNC_STATE), json.dumps(sync_state, ensure_ascii=False, indent=2))
+        out["sync_state"] = {"corpus_bytes": int(new_bytes)}
+
+    # profile 游标：旧行号 -> 保留行里排在它之前的行数（顺序不变，未消费的行仍在游标之后）
+    # 字节游标（corpus_offset）优先；指向的旧位置换算成新文件里的偏移与 inode
+    profile_state = _load_json(PROFILE_STATE)
+    if profile_state is not None and ("last_line" in profile_state or "corpus_offset" in profile_state):
+        old = int(profile_state.get("last_line") or 0)
+        if profile_state.get("corpus_offset") is not None:
+            at = _line_at_offset(rows, int(profile_state["corpus_offset"]))
+            if at is not None:
+                old = at
+        old = min(max(0, old), len(rows))
+        new = sum(1 for k in keep[:old] if k)
+        st = Path(CORPUS_PATH).stat()
+        profile_state.update({
+            "last_line": new,
+            "corpus_offset": sum(len(raw) for (raw, _), k in zip(rows[:old], keep[:old]) if k),
+            "corpus_inode": int(st.st_ino),
+            "corpus_size": int(st.st_size),
+        })
+        atomic_write_text(Path(PROFILE_STATE), json.dumps(profile_state, ensure_ascii=False, indent=2))
+        out["profile_state"] = {"last_line": [old, new], "corpus_offset": profile_state["corpus_offset"]}
+    return out
+
+
+def compact(dry_run: bool = False) -> Dict[str, Any]:
+    corpus = Path(CORPUS_PATH)
+    if not corpus.exists():
+        return {"corpus": CORPUS_PATH, "skipped": "corpus 不存在"}
+
+    st0 = corpus.stat()
+    rows = _read_lines(CORPUS_PATH)
+    keep = plan_keep(rows, live_chunk_sets(_load_json(SYNC_STATE)))
+
+    kept = [raw for (raw, _), k in zip(rows, keep) if k]
+    new_bytes = sum(len(r) for r in kept)
+    result: Dict[str, Any] = {
+        "corpus": CORPUS_PATH,
+        "lines_before": len(rows),
+        "lines_after": len(kept),
+        "bad_lines": sum(1 for _, obj in rows if obj is None),
+        "bytes_before": int(st0.st_size),
+        "bytes_after": int(new_bytes),
+        "bytes_reclaimed": int(st0.st_size) - int(new_bytes),
+        "dry_run": bool(dry_run),
+    }
+    if dry_run or len(kept) == len(rows):
+        return result
+
+    tmp = corpus.with_name(f".{corpus.name}.compact.tmp")
+    with open(tmp, "wb") as f:
+        for raw in kept:
+            f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+
+    st1 = corpus.stat()
+    if (st1.st_size, st1.st_ino, st1.st_mtime_ns) != (st0.st_size, st0.st_ino, st0.st_mtime_ns):
+        tmp.unlink()
+        raise RuntimeError("compact 期间 corpus 被修改（ingest 在运行？），已放弃")
+    os.replace(tmp, corpus)
+
+    # 先更新依赖状态（corpus 已是新内容），再重建旁路存储（inode 变化 -> 全量重建）
+    result.update(_update_dependent_state(rows, keep, new_bytes))
+    try:
+        result["index"] = sync_index(corpus)
+    except Exception as e:
+        print(f"⚠️ [compact] 倒排索引重建失败（检索将回退扫描）: {e}")
+    try:
+        result["columns"] = sync_columns(corpus)
+    except Exception as e:
+        print(f"⚠️ [compact] 列存重建失败（读取将回退 JSONL）: {e}")
+    try:
+        result["matrix"] = sync_matrix(corpus)
+    except Exception as e:
+        print(f"⚠️ [compact] CSR 矩阵重建失败（扫描将回退逐行求交）: {e}")
+    if env_bool("SB_EMBED", "0"):
+        try:
+            result["vectors"] = sync_vectors(corpus)
+        except Exception as e:
+            print(f"⚠️ [compact] 向量重建失败（检索只用词法分数）: {e}")
+    return result
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dry-run", action="store_true", help="only report what would be removed")
+    args = ap.parse_args()
+    print(json.dumps(compact(dry_run=args.dry_run), ensure_ascii=False, indent=2))
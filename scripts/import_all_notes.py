@@ -1,8 +1,14 @@
 import os
-import time
-import requests
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 
+_ROOT = Path(__file__).resolve().parents[1]
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from infra.http import get_client
+
 # 🔴 请把你的 Notes 数据库 ID 填在这里！
 TARGET_DATABASE_ID = "64645e465929452f8d3b0d5a0b53ba43"
 headers = {}
@@ -19,7 +25,7 @@ def fetch_page_content(page_id):
         if next_cursor: params["start_cursor"] = next_cursor
         
         try:
-            resp = requests.get(block_url, headers=headers, params=params)
+            resp = get_client().get(block_url, headers=headers, params=params)
             if resp.status_code != 200: break
             data = resp.json()
             
@@ -77,7 +83,7 @@ def import_all():
         payload = {"page_size": 50} # 每次取50篇
         if next_cursor: payload["start_cursor"] = next_cursor
         
-        resp = requests.post(query_url, json=payload, headers=headers)
+        resp = get_client().post(query_url, json=payload, headers=headers)
         if resp.status_code != 200:
             print(f"❌ 读取数据库失败: {resp.text}")
             break
@@ -118,7 +124,7 @@ def import_all():
             
             print(" ✅ 完成")
             total_count += 1
-            time.sleep(0.5) # 休息一下，温柔一点
+            # 不再固定 sleep：共享 HTTP 客户端对 api.notion.com 限速（默认 3 rps），429 按 Retry-After 退避
 
         has_more = data.get("has_more", False)
         next_cursor = data.get("next_cursor")
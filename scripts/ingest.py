@@ -6,13 +6,19 @@ import sys
 from pathlib import Path
 from dataclasses import dataclass, asdict
 from datetime import datetime, timezone
-from typing import Iterable, List, Dict, Any, Optional, Tuple
+from typing import Iterable, List, Dict, Any, Optional, Set, Tuple
 
 _ROOT = Path(__file__).resolve().parents[1]
 if str(_ROOT) not in sys.path:
     sys.path.insert(0, str(_ROOT))
 
 from core.weighting import score_depth, compute_cog_weight
+from core.corpus_columns import columns_dir_for, sync_columns
+from core.corpus_index import index_path_for, load_fresh_index, stats_path_for, sync_index
+from core.config import env_bool
+from core.corpus_matrix import matrix_dir_for, sync_matrix
+from core.corpus_vectors import sync_vectors, vectors_dir_for
+from core.utils.io_helper import atomic_write_text
 
 DATA_DIR = "data/raw"
 STATE_PATH = "state/sync_state.json"
@@ -27,6 +33,25 @@ def sha256_file(path: str) -> str:
             h.update(chunk)
     return h.hexdigest()
 
+def file_stat(path: str) -> Dict[str, int]:
+    st = os.stat(path)
+    return {"size": int(st.st_size), "mtime_ns": int(st.st_mtime_ns), "ino": int(st.st_ino)}
+
+def entry_hash(entry: Any) -> Optional[str]:
+    """
+    sync_state.files 的值：旧版是哈希字符串，新版是 {"sha256", "size", "mtime_ns", "ino"}。
+    """
+    if isinstance(entry, dict):
+        return entry.get("sha256")
+    if isinstance(entry, str):
+        return entry
+    return None
+
+def stat_unchanged(entry: Any, st: Dict[str, int]) -> bool:
+    if not isinstance(entry, dict) or not entry.get("sha256"):
+        return False
+    return all(entry.get(k) == st[k] for k in ("size", "mtime_ns", "ino"))
+
 def load_state() -> Dict[str, Any]:
     if not os.path.exists(STATE_PATH):
         return {"files": {}, "updated_at": None}
@@ -35,8 +60,8 @@ def load_state() -> Dict[str, Any]:
 
 def save_state(state: Dict[str, Any]) -> None:
     state["updated_at"] = datetime.now(timezone.utc).isoformat()
-    with open(STATE_PATH, "w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+    # 提交点：临时文件 + fsync + rename，崩溃时 state 要么是旧的要么是新的
+    atomic_write_text(Path(STATE_PATH), json.dumps(state, ensure_ascii=False, indent=2))
 
 def iter_files(root: str) -> Iterable[str]:
     for dirpath, _, filenames in os.walk(root):
@@ -206,16 +231,135 @@ class MemoryChunk:
     meta: Dict[str, Any]
 
 def make_uid(source: str, file_path: str, idx: int, text: str) -> str:
+    """
+    chunk 版本的身份：哈希完整正文，正文任何改动都得到新 uid。
+    因此“uid 已在 corpus”即“完全相同的块已写过”，corpus 里不会出现同 uid 的不同版本。
+    （旧版只哈希前 200 字；≤200 字的块 uid 不变，更长的块在文件下次变化时按新 uid 重写一次）
+    """
     h = hashlib.sha1()
     h.update(source.encode("utf-8"))
     h.update(file_path.encode("utf-8"))
     h.update(str(idx).encode("utf-8"))
-    h.update(text[:200].encode("utf-8", errors="ignore"))
+    h.update(text.encode("utf-8", errors="ignore"))
     return h.hexdigest()
 
+# ---------- crash-safe corpus append ----------
+# 协议：先追加 corpus 并 fsync，再原子写 state（记录 corpus_bytes = 已提交的字节数）。
+# 若在两者之间崩溃，corpus 末尾会多出“未提交”的行，而 state 里这些文件仍是旧哈希；
+# 下次运行先把 corpus 截回 corpus_bytes，再正常重新 ingest，不会产生重复行。
+
+def recover_corpus(state: Dict[str, Any]) -> int:
+    """
+    截掉上次未提交的 corpus 尾部，返回截掉的字节数。
+    旧版 state 没有 corpus_bytes 时无法判断，原样保留。
+    """
+    committed = state.get("corpus_bytes")
+    if committed is None or not os.path.exists(OUT_CORPUS):
+        return 0
+    size = os.path.getsize(OUT_CORPUS)
+    if size <= int(committed):
+        # 变短/相等：正常，或被 compact 等外部流程重写过（以实际文件为准）
+        return 0
+    with open(OUT_CORPUS, "r+b") as f:
+        f.truncate(int(committed))
+        f.flush()
+        os.fsync(f.fileno())
+    print(f"⚠️ [ingest] corpus 末尾有 {size - int(committed)} 字节未提交（上次中断），已截断")
+    return size - int(committed)
+
+def existing_uids(corpus_path: str) -> Set[str]:
+    """
+    corpus 里已有的 uid：新鲜索引可直接给出；否则扫一遍 JSONL。
+    """
+    idx = load_fresh_index(Path(corpus_path))
+    if idx is not None:
+        return {str(d[1]) for d in idx.docs if d and d[1]}
+    uids: Set[str] = set()
+    if not os.path.exists(corpus_path):
+        return uids
+    with open(corpus_path, "rb") as f:
+        for raw in f:
+            try:
+                uid = json.loads(raw.decode("utf-8")).get("uid")
+            except Exception:
+                uid = None
+            if uid:
+                uids.add(uid)
+    return uids
+
+def append_chunks(chunks: List["MemoryChunk"]) -> int:
+    """
+    追加并 fsync，返回追加后的 corpus 字节数（即待提交的 corpus_bytes）。
+    """
+    with open(OUT_CORPUS, "a", encoding="utf-8") as f:
+        for mc in chunks:
+            obj = asdict(mc)
+            f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    return os.path.getsize(OUT_CORPUS)
+
 # ---------- main ingest ----------
 
-def ingest(full: bool = False) -> Dict[str, Any]:
+def _process_file(
+    path: str, prev: Any, full: bool, ingested_at: str, verify: bool = False
+) -> Tuple[str, Dict[str, Any], Optional[List[MemoryChunk]]]:
+    """
+    单个 raw 文件：(stat 快速判断) → 哈希 → 解析 → 切块 → 打分。
+    返回 (rel, state_entry, chunks)；未变化时 chunks 为 None。
+    state_entry["uids"] 是该文件当前的完整 chunk 集合（按顺序），compact 据此判断哪些行仍然有效；
+    state_entry["hashed"] 仅用于本次统计，写 state 前会去掉。
+    纯函数（只读文件），可在子进程中执行。
+    """
+    rel = path.replace("\\", "/")
+    st = file_stat(path)
+
+    # 快速路径：size/mtime_ns/inode 与上次一致则视为未变化，不读文件内容
+    if (not full) and (not verify) and stat_unchanged(prev, st):
+        return rel, {**prev, "hashed": False}, None
+
+    file_hash = sha256_file(path)
+    entry = {"sha256": file_hash, **st, "hashed": True}
+
+    if (not full) and entry_hash(prev) == file_hash:
+        if isinstance(prev, dict) and "uids" in prev:
+            entry["uids"] = prev["uids"]
+        return rel, entry, None  # unchanged（内容未变，只刷新 stat）
+
+    source = guess_source(rel)
+    items = extract_items(path, source)
+
+    out: List[MemoryChunk] = []
+    for item_text, extra in items:
+        # split into chunks
+        chunks = chunk_text(item_text)
+        for i, ck in enumerate(chunks):
+            # 激活：使用人格引擎的深度评分逻辑
+            ds = score_depth(ck, meta=extra)
+            w = compute_weight(source, ck)
+            # 认知权重 (基于深度评分)
+            cw = compute_cog_weight(ds, alpha=0.5) # 默认开启 0.5 强度加成
+
+            uid = make_uid(source, rel, i, ck)
+            out.append(MemoryChunk(
+                uid=uid,
+                source=source,
+                file_path=rel,
+                created_at=extra.get("created_at"),
+                ingested_at=ingested_at,
+                weight=w,
+                text=ck,
+                meta={**extra, "depth_score": ds, "cog_weight": cw},
+            ))
+    entry["uids"] = [mc.uid for mc in out]
+    return rel, entry, out
+
+
+def _process_file_args(args: Tuple[Any, ...]) -> Tuple[str, Dict[str, Any], Optional[List[MemoryChunk]]]:
+    return _process_file(*args)
+
+
+def ingest(full: bool = False, workers: int = 1, verify: bool = False) -> Dict[str, Any]:
     # Card 6：确保 data/ 目录存在（尤其是 data/corpus.jsonl 的父目录）
     try:
         os.makedirs(os.path.dirname(OUT_CORPUS), exist_ok=True)
@@ -223,67 +367,137 @@ def ingest(full: bool = False) -> Dict[str, Any]:
         pass
 
     state = load_state()
-    seen_files: Dict[str, str] = state.get("files", {})
+    recovered = recover_corpus(state)
+    seen_files: Dict[str, Any] = state.get("files", {})
 
     new_chunks: List[MemoryChunk] = []
 
-    for path in iter_files(DATA_DIR):
-        rel = path.replace("\\", "/")
-        file_hash = sha256_file(path)
-
-        if (not full) and rel in seen_files and seen_files[rel] == file_hash:
-            continue  # unchanged
-
-        source = guess_source(rel)
-        items = extract_items(path, source)
-
-        for item_text, extra in items:
-            # split into chunks
-            chunks = chunk_text(item_text)
-            for i, ck in enumerate(chunks):
-                # 激活：使用人格引擎的深度评分逻辑
-                ds = score_depth(ck, meta=extra)
-                w = compute_weight(source, ck)
-                # 认知权重 (基于深度评分)
-                cw = compute_cog_weight(ds, alpha=0.5) # 默认开启 0.5 强度加成
-                
-                uid = make_uid(source, rel, i, ck)
-                new_chunks.append(MemoryChunk(
-                    uid=uid,
-                    source=source,
-                    file_path=rel,
-                    created_at=extra.get("created_at"),
-                    ingested_at=now_iso(),
-                    weight=w,
-                    text=ck,
-                    meta={**extra, "depth_score": ds, "cog_weight": cw},
-                ))
-
+    # 本次运行统一的 ingested_at：串行/并行输出逐字节一致
+    ingested_at = now_iso()
+    tasks = [
+        (path, seen_files.get(path.replace("\\", "/")), full, ingested_at, verify)
+        for path in iter_files(DATA_DIR)
+    ]
+
+    workers = max(1, int(workers or 1))
+    if workers > 1 and len(tasks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # map 按提交顺序返回结果：追加 corpus / 更新 state 的顺序与串行完全一致
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(tasks) // (workers * 8))
+            results = list(pool.map(_process_file_args, tasks, chunksize=chunksize))
+    else:
+        results = [_process_file_args(t) for t in tasks]
+
+    hashed_files = 0
+    for rel, entry, chunks in results:
+        if chunks:
+            new_chunks.extend(chunks)
+        if entry.pop("hashed", False):
+            hashed_files += 1
         # update state for this file
-        seen_files[rel] = file_hash
+        seen_files[rel] = entry
+
+    # 不写已存在的块（--full 重跑、文件改动后没变的块）：uid 哈希完整正文，uid 已存在即完全重复，
+    # 所以 corpus 的 uid 始终唯一。文件的当前 chunk 集合记在 state 的 uids 里（可能分散在多次追加中），
+    # 不在集合里的旧版本由 compact 清理
+    skipped = 0
+    if new_chunks:
+        seen_uids = existing_uids(OUT_CORPUS)
+        unique: List[MemoryChunk] = []
+        for mc in new_chunks:
+            if mc.uid in seen_uids:
+                skipped += 1
+                continue
+            seen_uids.add(mc.uid)
+            unique.append(mc)
+        new_chunks = unique
 
-    # append to corpus.jsonl
+    # append to corpus.jsonl（fsync 后再提交 state）
     if new_chunks:
-        with open(OUT_CORPUS, "a", encoding="utf-8") as f:
-            for mc in new_chunks:
-                obj = asdict(mc)
-                f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+        corpus_bytes = append_chunks(new_chunks)
+    else:
+        corpus_bytes = os.path.getsize(OUT_CORPUS) if os.path.exists(OUT_CORPUS) else 0
 
     state["files"] = seen_files
+    state["corpus_bytes"] = int(corpus_bytes)
     save_state(state)
 
+    # 旁路存储（倒排索引 / 列存）增量追上 corpus；失败不影响 ingest，读取侧会回退 JSONL
+    index_info: Dict[str, Any] = {}
+    try:
+        index_info = sync_index(Path(OUT_CORPUS))
+    except Exception as e:
+        print(f"⚠️ [ingest] 倒排索引更新失败（检索将回退扫描）: {e}")
+
+    columns_info: Dict[str, Any] = {}
+    try:
+        columns_info = sync_columns(Path(OUT_CORPUS))
+    except Exception as e:
+        print(f"⚠️ [ingest] 列存更新失败（读取将回退 JSONL）: {e}")
+
+    matrix_info: Dict[str, Any] = {}
+    try:
+        matrix_info = sync_matrix(Path(OUT_CORPUS))
+    except Exception as e:
+        print(f"⚠️ [ingest] CSR 矩阵更新失败（扫描将回退逐行求交）: {e}")
+
+    # 稠密向量只给新增行算（SB_EMBED=1 才维护）；失败时检索只用词法分数
+    vectors_info: Dict[str, Any] = {}
+    if env_bool("SB_EMBED", "0"):
+        try:
+            vectors_info = sync_vectors(Path(OUT_CORPUS))
+        except Exception as e:
+            print(f"⚠️ [ingest] 向量更新失败（检索只用词法分数）: {e}")
+
     return {
         "added_chunks": len(new_chunks),
+        "skipped_duplicates": skipped,
+        "recovered_bytes": recovered,
+        "scanned_files": len(tasks),
+        "hashed_files": hashed_files,
         "corpus": OUT_CORPUS,
         "state": STATE_PATH,
+        "index": index_info.get("index"),
+        "columns": columns_info.get("columns"),
+        "matrix": matrix_info.get("matrix"),
+        "vectors": vectors_info.get("vectors"),
+        "unique_uids": bool(index_info.get("unique_uids", False)),
     }
 
+def rebuild_sidecars() -> Dict[str, Any]:
+    """
+    从 corpus.jsonl（唯一事实来源）全量重建倒排索引、列存、CSR 矩阵（SB_EMBED=1 时还有稠密向量）。
+    """
+    corpus = Path(OUT_CORPUS)
+    for p in (
+        index_path_for(corpus),
+        stats_path_for(corpus),
+        columns_dir_for(corpus) / "meta.json",
+        matrix_dir_for(corpus) / "meta.json",
+        vectors_dir_for(corpus) / "meta.json",
+    ):
+        if p.exists():
+            p.unlink()
+    out = {"index": sync_index(corpus), "columns": sync_columns(corpus), "matrix": sync_matrix(corpus)}
+    if env_bool("SB_EMBED", "0"):
+        out["vectors"] = sync_vectors(corpus)
+    return out
+
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--full", action="store_true", help="force re-ingest all files")
+    ap.add_argument("--verify", action="store_true", help="ignore the size/mtime fast path and re-hash every file")
+    ap.add_argument("--workers", type=int, default=1, help="parallel hash/parse/score processes (output identical to serial)")
+    ap.add_argument("--rebuild-sidecars", action="store_true", help="rebuild index/columns/matrix from corpus.jsonl and exit")
     args = ap.parse_args()
 
-    result = ingest(full=args.full)
+    if args.rebuild_sidecars:
+        print(json.dumps(rebuild_sidecars(), ensure_ascii=False, indent=2))
+        sys.exit(0)
+
+    result = ingest(full=args.full, workers=args.workers, verify=args.verify)
     print(json.dumps(result, ensure_ascii=False, indent=2))
 
 
@@ -4,6 +4,9 @@ import time
 import random
 import sys
 import re
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime, timezone
 from dotenv import load_dotenv
@@ -12,6 +15,11 @@ _ROOT = Path(__file__).resolve().parents[1]
 if str(_ROOT) not in sys.path:
     sys.path.insert(0, str(_ROOT))
 
+from core.corpus_columns import load_fresh_columns
+from core.llm_provider import normalize_reply
+from core.weighting import compute_cog_weight, score_time
+from core.utils.io_helper import atomic_write_text
+
 CORPUS_PATH = "data/corpus.jsonl"
 PROFILE_PATH = "data/user_profile.md"
 PROFILE_STATE = "state/profile_state.json"
@@ -47,6 +55,104 @@ def _infer_dt_from_notion_filename(file_path: str):
         ts = ts + "+00:00"
     return _parse_dt(ts)
 
+def env_float(name: str, default: str = "0") -> float:
+    try:
+        return float(os.getenv(name, default) or default)
+    except Exception:
+        return float(default)
+
+
+def _parse_quotas(spec: str):
+    """
+    SB_PROFILE_SOURCE_QUOTAS="notion=25,x=8" -> {"notion": 25, "x": 8}（未列出的 source 不限额）
+    """
+    out = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        k, v = part.split("=", 1)
+        try:
+            out[k.strip().lower()] = max(0, int(v.strip()))
+        except Exception:
+            continue
+    return out
+
+
+def _num(v, default: float) -> float:
+    try:
+        f = float(v)
+    except Exception:
+        return default
+    return f if f == f else default
+
+
+def evidence_score(obj, now=None) -> float:
+    """
+    证据分 = weight × 认知权重 × 时间权重（复用 ingest / retrieval 的同一套信号）。
+    - weight：ingest 的来源/内容启发式
+    - 认知权重：cog_weight 优先；只有 depth_score 时按 compute_cog_weight(alpha=0.5)（与 ingest 一致）
+    - 时间权重：score_time（created_at，Notion 文件名兜底）。画像看的是长期特征，
+      默认参数比检索平缓得多（SB_PROFILE_DECAY_*：窗口 365 天、半衰期 90 天、下限 0.2）
+    """
+    meta = obj.get("meta") if isinstance(obj.get("meta"), dict) else {}
+    w = _num(obj.get("weight"), 0.4)
+
+    cw = obj.get("cog_weight", meta.get("cog_weight"))
+    if cw is not None:
+        cog = _num(cw, 1.0)
+    else:
+        ds = obj.get("depth_score", meta.get("depth_score"))
+        cog = compute_cog_weight(_num(ds, 0.5), alpha=0.5) if ds is not None else 1.0
+
+    dt = _parse_dt(obj.get("created_at")) if obj.get("created_at") else None
+    if dt is None:
+        dt = _infer_dt_from_notion_filename(obj.get("file_path") or "")
+    tw = score_time(
+        dt,
+        now=now,
+        window_days=env_float("SB_PROFILE_DECAY_WINDOW_DAYS", "365"),
+        half_life_days=env_float("SB_PROFILE_DECAY_HALF_LIFE_DAYS", "90"),
+        floor=env_float("SB_PROFILE_DECAY_FLOOR", "0.2"),
+    )
+    return max(0.0, w) * max(0.0, cog) * tw
+
+
+class EvidenceSelector:
+    """
+    流式 top-K：每个 source 一个容量为 min(quota, top_n) 的小根堆，内存 O(top_n × source 数)。
+    最终从各堆合并取分数最高的 top_n 条（同分保留更早的行）。
+    """
+
+    def __init__(self, top_n: int, quotas=None, now=None) -> None:
+        self.top_n = max(0, int(top_n))
+        self.quotas = quotas or {}
+        self.now = now or datetime.now(timezone.utc)
+        self._heaps = {}
+        self._seq = 0
+        self.seen = 0
+
+    def push(self, obj) -> None:
+        if not (obj.get("text") or "").strip():
+            return
+        self.seen += 1
+        src = str(obj.get("source") or "unknown").lower()
+        cap = min(self.top_n, self.quotas.get(src, self.top_n))
+        if cap <= 0:
+            return
+        self._seq += 1
+        item = (evidence_score(obj, now=self.now), -self._seq, obj)
+        heap = self._heaps.setdefault(src, [])
+        if len(heap) < cap:
+            heapq.heappush(heap, item)
+        elif item[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, item)
+
+    def result(self):
+        items = [it for heap in self._heaps.values() for it in heap]
+        items.sort(key=lambda it: (it[0], it[1]), reverse=True)
+        return [obj for _, _, obj in items[: self.top_n]]
+
+
 def _is_overload_error(e: Exception) -> bool:
     msg = str(e)
     return ("503" in msg) or ("overloaded" in msg.lower()) or ("UNAVAILABLE" in msg)
@@ -73,41 +179,124 @@ def _load_state():
         return json.load(f)
 
 def _save_state(state):
-    with open(PROFILE_STATE, "w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+    atomic_write_text(Path(PROFILE_STATE), json.dumps(state, ensure_ascii=False, indent=2))
 
-def _read_new_chunks(max_items=40):
-    # 1. 如果文件不存在，直接返回空列表和0
-    if not os.path.exists(CORPUS_PATH):
-        # 兼容旧目录
-        if os.path.exists("outputs/corpus.jsonl"):
-            return _read_new_chunks_from_path("outputs/corpus.jsonl", max_items=max_items)
-        return [], 0
+def _at_line_start(path: str, offset: int) -> bool:
+    if offset <= 0:
+        return True
+    with open(path, "rb") as f:
+        f.seek(offset - 1)
+        return f.read(1) == b"\n"
 
-    # 2. 读取旧的状态
-    state = _load_state()
-    last_line = int(state.get("last_line", 0))
 
-    # 3. 读取文件所有行
-    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-
-    # 【关键修复】无论是否有新内容，先确定现在的总行数
-    new_last_line = len(lines)
-
-    # 4. 截取新增加的行
-    new_lines = lines[last_line:]
+def _offset_of_line(path: str, line_no: int):
+    """
+    第 line_no 行的起始字节偏移（按块数换行，不解析 JSON）。
+    文件行数不足时返回 (文件末尾, 实际行数)。
+    """
+    cols = load_fresh_columns(Path(path))
+    if cols is not None and 0 <= line_no < cols.n:
+        return int(cols.line_off[line_no]), line_no
+
+    offset = 0
+    seen = 0
+    with open(path, "rb") as f:
+        while seen < line_no:
+            block = f.read(1024 * 1024)
+            if not block:
+                break
+            pos = 0
+            while seen < line_no:
+                nl = block.find(b"\n", pos)
+                if nl < 0:
+                    break
+                seen += 1
+                pos = nl + 1
+            offset += pos if seen >= line_no else len(block)
+    return offset, seen
+
+
+def _resolve_cursor(state, st):
+    """
+    从 state 得到本次读取的起点 (byte_offset, line_no)。
+    - 新版 state：corpus_offset + corpus_inode 与当前文件一致、文件没有比上次记录的 corpus_size 短、
+      且游标落在行首时直接 seek（corpus 只追加，变短说明被截断过，哪怕之后又长回来、游标恰好落在行首）
+    - corpus 被重写（inode 变化，如未经 compact 修正的外部改写）或截断：按 last_line 重新定位
+    - 旧版 state（只有 last_line）：按行号定位一次，之后改用字节游标
+    """
+    last_line = int(state.get("last_line", 0))
+    off = state.get("corpus_offset")
+    if off is not None:
+        off = int(off)
+        size = int(st.st_size)
+        if (
+            int(state.get("corpus_inode") or 0) == int(st.st_ino)
+            and off <= size
+            and size >= int(state.get("corpus_size") or 0)
+            and _at_line_start(CORPUS_PATH, off)
+        ):
+            return off, last_line
+        print("⚠️ [profile] corpus 已被重写或截断，按 last_line 重新定位游标")
+
+    if last_line <= 0:
+        return 0, 0
+    return _offset_of_line(CORPUS_PATH, last_line)
+
+
+def _locate_cursor(state):
+    """
+    stat 当前 corpus 并解析游标，返回 (stat, start, last_line)；一次运行只调用一次。
+    """
+    st = os.stat(CORPUS_PATH)
+    start, last_line = _resolve_cursor(state, st)
+    return st, start, last_line
 
-    chunks = []
-    for ln in new_lines:
-        try:
-            obj = json.loads(ln)
-            chunks.append(obj)
-        except:
-            pass
 
-    # 【关键修复】必须把 chunks 和 new_last_line 都返回出去
-    return chunks, new_last_line
+def _read_new_chunks(max_items=40, resolved=None):
+    """
+    从字节游标处流式读取新增行，返回 (chunks, cursor)。
+    resolved：调用方已算好的 (stat, start, last_line)，避免重复定位游标。
+    所有新增行都过一遍 EvidenceSelector，只保留得分最高的 max_items 条（按得分降序），
+    SB_PROFILE_SOURCE_QUOTAS 限制每个 source 最多入选多少条。
+    cursor 为要写回 state 的新游标：last_line / corpus_offset / corpus_inode / corpus_size。
+    """
+    # 1. 如果文件不存在，直接返回空列表
+    if not os.path.exists(CORPUS_PATH):
+        # 兼容旧目录
+        if os.path.exists("outputs/corpus.jsonl"):
+            chunks, new_last_line = _read_new_chunks_from_path("outputs/corpus.jsonl", max_items=max_items)
+            return chunks, {"last_line": new_last_line}
+        return [], {"last_line": int(_load_state().get("last_line", 0))}
+
+    # 2. 读取旧的状态，定位起点
+    st, start, last_line = resolved or _locate_cursor(_load_state())
+
+    # 3. seek 到起点，只读新增部分；末尾没有换行的半行（可能正在写入）留到下次
+    selector = EvidenceSelector(40 if max_items is None else int(max_items), quotas=_parse_quotas(os.getenv("SB_PROFILE_SOURCE_QUOTAS", "")))
+    n_new = 0
+    end = start
+    with open(CORPUS_PATH, "rb") as f:
+        f.seek(start)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            end += len(raw)
+            n_new += 1
+            try:
+                obj = json.loads(raw.decode("utf-8"))
+            except Exception:
+                continue
+            if isinstance(obj, dict):
+                selector.push(obj)
+    chunks = selector.result()
+
+    cursor = {
+        "last_line": last_line + n_new,
+        "corpus_offset": end,
+        "corpus_inode": int(st.st_ino),
+        "corpus_size": int(st.st_size),
+    }
+    return chunks, cursor
 
 
 def _read_new_chunks_from_path(path: str, max_items=40):
@@ -122,8 +311,11 @@ def _read_new_chunks_from_path(path: str, max_items=40):
         lines = f.readlines()
     new_last_line = len(lines)
     new_lines = lines[last_line:]
+    limit = 40 if max_items is None else int(max_items)
     chunks = []
     for ln in new_lines:
+        if len(chunks) >= limit:
+            break
         try:
             obj = json.loads(ln)
         except Exception:
@@ -132,30 +324,307 @@ def _read_new_chunks_from_path(path: str, max_items=40):
         if not t:
             continue
         chunks.append(t)
-        if len(chunks) >= int(max_items or 40):
-            break
     return chunks, new_last_line
 
-def update_user_profile():
+PROFILE_SYSTEM = (
+    "你是“用户画像更新器”。你的任务：根据新增证据，更新 user_profile.md。\n"
+    "规则：\n"
+    "1) 输出必须是 Markdown（不是 JSON）。\n"
+    "2) 尽量保持稳定，只做增量更新，不要因为少量证据推翻旧结论。\n"
+    "3) 任何新增结论都要在“证据日志”里写明来源（source/file/created_at）。\n"
+    "4) 文风：简洁、像备忘录。\n"
+    "请使用固定结构：\n"
+    "# 核心性格与偏好\n"
+    "# 决策与学习风格\n"
+    "# 交易风格与风险偏好\n"
+    "# 常见盲点与纠偏提醒\n"
+    "# 近期关注与假设（可变化）\n"
+    "# 证据日志（自动追加）\n"
+)
+
+MAP_SYSTEM = (
+    "你是“用户画像增量提取器”。你只看到一批新增证据（整体证据被拆成多批并行处理）。\n"
+    "任务：对照旧画像，列出这批证据带来的新发现、需要修正或强化的结论。\n"
+    "规则：\n"
+    "1) 输出 Markdown 要点，按画像的固定小标题分组；没有内容的小标题省略。\n"
+    "2) 每条要点后用括号注明来源（source/file/created_at）。\n"
+    "3) 不要复述旧画像，不要输出完整画像；这批证据没有新信息时只输出“无”。\n"
+)
+
+
+def _format_evidence(chunks) -> str:
+    # 压缩 evidence
+    evidence = []
+    for c in chunks:
+        text = (c.get("text") or "").strip().replace("\n", " ")
+        text = text[:500]
+        evidence.append(
+            f"- source={c.get('source')} weight={c.get('weight')} file={c.get('file_path')} created_at={c.get('created_at')}\n"
+            f"  text={text}"
+        )
+    return "\n".join(evidence)
+
+
+def _get_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.2)
+
+
+def _write_profile(new_profile: str) -> None:
+    # Card 6：确保 data/ 目录存在
+    try:
+        os.makedirs(os.path.dirname(PROFILE_PATH), exist_ok=True)
+    except Exception:
+        pass
+
+    with open(PROFILE_PATH, "w", encoding="utf-8") as f:
+        f.write(new_profile + "\n")
+
+
+def _read_old_profile() -> str:
+    if not os.path.exists(PROFILE_PATH):
+        return ""
+    with open(PROFILE_PATH, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+# ---------- map-reduce（积压较多时） ----------
+# 新增行按 token 预算切批 → 每批并发产出“画像增量” → 最后一次 reduce 合并成完整画像。
+# 每批完成即写检查点（state/profile_batches.json）；崩溃/503 重试耗尽后再次运行会跳过已完成的批次。
+# 只有 reduce 写入画像后才推进 profile_state 游标并删除检查点。
+
+PROFILE_BATCHES = "state/profile_batches.json"
+
+
+def _est_tokens(text: str) -> int:
+    # 粗估：中英混排约 2 字符 / token（偏保守，宁可多切一批）
+    return len(text) // 2 + 1
+
+
+def _plan_batches(start: int, budget: int):
+    """
+    从 start 起扫描新增行，按估算 token 数切成 [start, end) 字节区间。
+    返回 (batches, end_offset, n_new_lines)。
+    """
+    batches = []
+    cur = {"start": start, "end": start, "lines": 0, "chunks": 0, "est_tokens": 0, "delta": None}
+    end = start
+    n_new = 0
+    with open(CORPUS_PATH, "rb") as f:
+        f.seek(start)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            n_new += 1
+            try:
+                obj = json.loads(raw.decode("utf-8"))
+            except Exception:
+                obj = None
+            cost = 0
+            if isinstance(obj, dict) and (obj.get("text") or "").strip():
+                cost = _est_tokens(_format_evidence([obj]))
+            if cost and cur["chunks"] and cur["est_tokens"] + cost > budget:
+                batches.append(cur)
+                cur = {"start": end, "end": end, "lines": 0, "chunks": 0, "est_tokens": 0, "delta": None}
+            end += len(raw)
+            cur["end"] = end
+            cur["lines"] += 1
+            if cost:
+                cur["chunks"] += 1
+                cur["est_tokens"] += cost
+    if cur["chunks"]:
+        batches.append(cur)
+    elif batches:
+        # 末尾只剩空行/坏行：并入上一批，保证区间连续覆盖到 end
+        batches[-1]["end"] = end
+        batches[-1]["lines"] += cur["lines"]
+    return batches, end, n_new
+
+
+def _load_checkpoint():
+    if not os.path.exists(PROFILE_BATCHES):
+        return None
+    try:
+        with open(PROFILE_BATCHES, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else None
+    except Exception:
+        return None
+
+
+def _save_checkpoint(ckpt) -> None:
+    atomic_write_text(Path(PROFILE_BATCHES), json.dumps(ckpt, ensure_ascii=False, indent=2))
+
+
+def _batch_chunks(batch):
+    chunks = []
+    with open(CORPUS_PATH, "rb") as f:
+        f.seek(int(batch["start"]))
+        remaining = int(batch["end"]) - int(batch["start"])
+        while remaining > 0:
+            raw = f.readline()
+            if not raw:
+                break
+            remaining -= len(raw)
+            try:
+                obj = json.loads(raw.decode("utf-8"))
+            except Exception:
+                continue
+            if isinstance(obj, dict) and (obj.get("text") or "").strip():
+                chunks.append(obj)
+    return chunks
+
+
+def _map_batch(llm, old_profile: str, batch) -> str:
+    chunks = _batch_chunks(batch)
+    user = (
+        f"【旧画像】\n{old_profile if old_profile else '(空)'}\n\n"
+        f"【本批新增证据（{len(chunks)} 条）】\n{_format_evidence(chunks)}\n\n"
+        "请输出这批证据带来的画像增量。"
+    )
+    resp = _retry(lambda: llm.invoke(f"{MAP_SYSTEM}\n\n{user}"))
+    return normalize_reply(resp.content).strip() or "无"
+
+
+def update_user_profile_batched(resolved=None) -> bool:
+    load_dotenv()
+    if not os.getenv("GOOGLE_API_KEY"):
+        print("❌ 缺少 GOOGLE_API_KEY，无法更新画像")
+        return False
+    if not os.path.exists(CORPUS_PATH):
+        print("💤 没有 corpus，跳过画像更新。")
+        return False
+
+    st, start, last_line = resolved or _locate_cursor(_load_state())
+
+    # 检查点只在“起点与 corpus 都没变”时复用（compact 换了 inode 就重新规划）
+    ckpt = _load_checkpoint()
+    if not (
+        ckpt
+        and int(ckpt.get("start", -1)) == int(start)
+        and int(ckpt.get("corpus_inode", -1)) == int(st.st_ino)
+        and int(ckpt.get("end", 0)) <= int(st.st_size)
+    ):
+        budget = env_int("SB_PROFILE_BATCH_TOKENS", "16000")
+        batches, end, n_new = _plan_batches(start, max(1000, budget))
+        ckpt = {
+            "start": int(start),
+            "end": int(end),
+            "corpus_inode": int(st.st_ino),
+            "last_line": int(last_line),
+            "new_lines": int(n_new),
+            "batches": batches,
+        }
+        _save_checkpoint(ckpt)
+    else:
+        done = sum(1 for b in ckpt["batches"] if b.get("delta") is not None)
+        print(f"↩️ [profile] 从检查点继续：{done}/{len(ckpt['batches'])} 批已完成")
+
+    batches = ckpt["batches"]
+    if not batches:
+        print("💤 没有新增 chunk，跳过画像更新。")
+        return False
+
+    old_profile = _read_old_profile()
+    llm = _get_llm()
+
+    # map：并发产出每批增量；每完成一批立刻写检查点
+    todo = [b for b in batches if b.get("delta") is None]
+    if todo:
+        lock = threading.Lock()
+        errors = []
+        workers = max(1, env_int("SB_PROFILE_MAP_CONCURRENCY", "3"))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futs = {pool.submit(_map_batch, llm, old_profile, b): b for b in todo}
+            for fut in as_completed(futs):
+                b = futs[fut]
+                try:
+                    delta = fut.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                with lock:
+                    b["delta"] = delta
+                    _save_checkpoint(ckpt)
+                done = sum(1 for x in batches if x.get("delta") is not None)
+                print(f"🧩 [profile] map {done}/{len(batches)} 批完成")
+        if errors:
+            raise RuntimeError(f"画像 map 阶段有 {len(errors)} 批失败（已完成的批次已存检查点，重跑会继续）: {errors[0]}")
+
+    # reduce：旧画像 + 全部增量 -> 完整画像
+    deltas = [b["delta"] for b in batches if (b.get("delta") or "").strip() not in ("", "无")]
+    n_chunks = sum(int(b.get("chunks") or 0) for b in batches)
+    if deltas:
+        delta_block = "\n\n".join(f"## 第 {i} 批\n{d}" for i, d in enumerate(deltas, 1))
+        user = (
+            f"【旧画像】\n{old_profile if old_profile else '(空)'}\n\n"
+            f"【新增证据的分批增量（共 {ckpt.get('new_lines')} 行 corpus，{n_chunks} 条证据，{len(batches)} 批）】\n{delta_block}\n\n"
+            "请把这些增量合并进旧画像，输出更新后的完整 user_profile.md 内容。"
+        )
+        resp = _retry(lambda: llm.invoke(f"{PROFILE_SYSTEM}\n\n{user}"))
+        new_profile = normalize_reply(resp.content).strip()
+        if not new_profile:
+            print("❌ 模型输出为空，跳过写入（检查点保留，重跑只需 reduce）。")
+            return False
+        _write_profile(new_profile)
+
+    # 提交：推进游标，删除检查点
+    state = _load_state()
+    state.update({
+        "last_line": int(ckpt["last_line"]) + int(ckpt.get("new_lines") or 0),
+        "corpus_offset": int(ckpt["end"]),
+        "corpus_inode": int(st.st_ino),
+        "corpus_size": int(st.st_size),
+    })
+    _save_state(state)
+    try:
+        os.remove(PROFILE_BATCHES)
+    except Exception:
+        pass
+
+    print(f"✅ user_profile.md 已更新（map-reduce：{len(batches)} 批 / {n_chunks} 条证据）")
+    return bool(deltas)
+
+
+def _should_batch(resolved) -> bool:
+    """
+    自动切换 map-reduce：显式开启、存在未完成检查点、或积压字节数超过阈值。
+    resolved 为 _locate_cursor 的结果（corpus 不存在时为 None）。
+    """
+    if env_bool("SB_PROFILE_MAP_REDUCE", "0") or os.path.exists(PROFILE_BATCHES):
+        return True
+    if resolved is None:
+        return False
+    st, start, _ = resolved
+    return int(st.st_size) - int(start) > env_int("SB_PROFILE_MAP_REDUCE_MIN_BYTES", str(512 * 1024))
+
+
+def update_user_profile(batched=None):
     # 延迟加载：避免在某些环境 import 脚本时就触发大依赖加载/权限问题
     load_dotenv()
-    from langchain_google_genai import ChatGoogleGenerativeAI
 
     if not os.getenv("GOOGLE_API_KEY"):
         print("❌ 缺少 GOOGLE_API_KEY，无法更新画像")
         return False
         
     state = _load_state()
-    chunks, new_last_line = _read_new_chunks()
+    # 游标只解析一次（corpus 被改写时的提示也只打印一次），分批/单次两条路径共用
+    resolved = _locate_cursor(state) if os.path.exists(CORPUS_PATH) else None
+    if batched is None:
+        batched = _should_batch(resolved)
+    if batched:
+        return update_user_profile_batched(resolved)
+
+    # 新增证据按 weight × 认知权重 × 时间权重 取 top N（可按 source 限额），避免提示词过长
+    top_n = env_int("SB_PROFILE_EVIDENCE_TOP_N", "40")
+    chunks, cursor = _read_new_chunks(max_items=top_n, resolved=resolved)
     old_last_line = int(state.get("last_line", 0))
-    raw_new_line_count = new_last_line - old_last_line
+    raw_new_line_count = int(cursor.get("last_line", old_last_line)) - old_last_line
 
     if not chunks:
         print("💤 没有新增 chunk，跳过画像更新。")
         return False
 
-    # 精简版：不做权重/衰减 rerank，只做“最多取前 N 条新增证据”避免提示词过长
-    top_n = env_int("SB_PROFILE_EVIDENCE_TOP_N", "40")
     chunks = chunks[: int(top_n)]
 
     old_profile = ""
@@ -163,38 +632,15 @@ def update_user_profile():
         with open(PROFILE_PATH, "r", encoding="utf-8") as f:
             old_profile = f.read().strip()
             state = _load_state()
-            state["last_line"] = new_last_line
+            state.update(cursor)
             _save_state(state)
 
 
-    # 压缩 evidence
-    evidence = []
-    for c in chunks:
-        text = (c.get("text") or "").strip().replace("\n", " ")
-        text = text[:500]
-        evidence.append(
-            f"- source={c.get('source')} weight={c.get('weight')} file={c.get('file_path')} created_at={c.get('created_at')}\n"
-            f"  text={text}"
-        )
-    evidence_block = "\n".join(evidence)
-
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.2)
-
-    system = (
-        "你是“用户画像更新器”。你的任务：根据新增证据，更新 user_profile.md。\n"
-        "规则：\n"
-        "1) 输出必须是 Markdown（不是 JSON）。\n"
-        "2) 尽量保持稳定，只做增量更新，不要因为少量证据推翻旧结论。\n"
-        "3) 任何新增结论都要在“证据日志”里写明来源（source/file/created_at）。\n"
-        "4) 文风：简洁、像备忘录。\n"
-        "请使用固定结构：\n"
-        "# 核心性格与偏好\n"
-        "# 决策与学习风格\n"
-        "# 交易风格与风险偏好\n"
-        "# 常见盲点与纠偏提醒\n"
-        "# 近期关注与假设（可变化）\n"
-        "# 证据日志（自动追加）\n"
-    )
+    evidence_block = _format_evidence(chunks)
+
+    llm = _get_llm()
+
+    system = PROFILE_SYSTEM
 
     user = (
         f"【旧画像】\n{old_profile if old_profile else '(空)'}\n\n"
@@ -203,25 +649,23 @@ def update_user_profile():
     )
     prompt = f"{system}\n\n{user}"
     resp = _retry(lambda: llm.invoke(prompt))
-    new_profile = (resp.content or "").strip()
+    new_profile = normalize_reply(resp.content).strip()
 
     if not new_profile:
         print("❌ 模型输出为空，跳过写入。")
         return False
 
-    # Card 6：确保 data/ 目录存在
-    try:
-        os.makedirs(os.path.dirname(PROFILE_PATH), exist_ok=True)
-    except Exception:
-        pass
-
-    with open(PROFILE_PATH, "w", encoding="utf-8") as f:
-        f.write(new_profile + "\n")
+    _write_profile(new_profile)
 
     print(f"✅ user_profile.md 已更新（吸收 {len(chunks)} 条高权重证据）")
     return True
 
 if __name__ == "__main__":
-    update_user_profile()
+    import argparse
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batched", action="store_true", help="force map-reduce mode for a large backlog")
+    args = ap.parse_args()
+    update_user_profile(batched=True if args.batched else None)
 
 
@@ -0,0 +1,21 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+_ROOT = Path(__file__).resolve().parents[1]
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    脚本（ingest / compact / profile_update）都用相对路径 data/、state/：切到临时目录里跑。
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("SB_EMBED", raising=False)
+    (tmp_path / "data" / "raw" / "notion").mkdir(parents=True)
+    (tmp_path / "state").mkdir()
+    return tmp_path
+
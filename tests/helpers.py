@@ -0,0 +1,15 @@
+from pathlib import Path
+
+
+def write_raw(root: Path, rel: str, text: str) -> Path:
+    p = root / "data" / "raw" / rel
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_text(text, encoding="utf-8")
+    return p
+
+
+def long_text(n_words: int, tail: str = "") -> str:
+    """
+    8 字符/词：450 词切成 4 个 chunk（chunk_text 每块 1200 字符、重叠 120），末块约 360 字符。
+    """
+    return " ".join(f"word{i:03d}" for i in range(n_words)) + tail
@@ -0,0 +1,85 @@
+import hashlib
+import json
+
+from scripts import compact, ingest
+from tests.helpers import long_text, write_raw
+
+
+def _rows():
+    with open(ingest.OUT_CORPUS, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_tail_edit_then_compact_keeps_all_current_chunks(workdir):
+    p = write_raw(workdir, "notion/page.md", long_text(450))
+    ingest.ingest()
+    edited = long_text(450, " edited")
+    p.write_text(edited, encoding="utf-8")
+    ingest.ingest()
+
+    res = compact.compact()
+    assert (res["lines_before"], res["lines_after"]) == (5, 4)
+    assert [r["text"] for r in _rows()] == ingest.chunk_text(edited)
+
+    # 再 ingest 不应补写任何块（state 的哈希未变，chunk 集合与 corpus 一致）
+    again = ingest.ingest(full=True)
+    assert again["added_chunks"] == 0 and again["unique_uids"] is True
+
+
+def test_compact_drops_chunks_removed_from_file(workdir):
+    p = write_raw(workdir, "notion/page.md", long_text(450))
+    write_raw(workdir, "notion/other.md", "another note " * 10)
+    ingest.ingest()
+    p.write_text(long_text(100), encoding="utf-8")  # 4 块 -> 1 块
+    ingest.ingest()
+
+    res = compact.compact()
+    rows = _rows()
+    assert res["lines_after"] == 2
+    assert [r["file_path"] for r in rows] == ["data/raw/notion/other.md", "data/raw/notion/page.md"]
+    assert rows[1]["text"] == long_text(100)
+
+
+def _legacy_batch(rel, text, ts):
+    """
+    旧版 ingest 的写法：变化文件的全部 chunk 连续追加，uid 只哈希正文前 200 字。
+    """
+    out = []
+    for i, ck in enumerate(ingest.chunk_text(text)):
+        h = hashlib.sha1()
+        for part in ("notion", rel, str(i), ck[:200]):
+            h.update(part.encode("utf-8"))
+        out.append({"uid": h.hexdigest(), "source": "notion", "file_path": rel, "created_at": None,
+                    "ingested_at": ts, "weight": 0.5, "text": ck, "meta": {}})
+    return out
+
+
+def test_legacy_state_without_chunk_sets_drops_superseded_batches(workdir):
+    page, other = "data/raw/notion/page.md", "data/raw/notion/other.md"
+    rows = (
+        _legacy_batch(page, long_text(450), "2025-01-01T00:00:00+00:00")
+        + _legacy_batch(other, "another note " * 10, "2025-01-01T00:00:01+00:00")
+        + _legacy_batch(page, long_text(450, " edited"), "2025-02-01T00:00:00+00:00")
+    )
+    with open(ingest.OUT_CORPUS, "w", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    # 旧版 state：值是哈希字符串，没有 uids
+    with open(ingest.STATE_PATH, "w", encoding="utf-8") as f:
+        json.dump({"files": {page: "h1", other: "h2"}}, f)
+
+    res = compact.compact()
+    assert (res["lines_before"], res["lines_after"]) == (9, 5)
+    kept = _rows()
+    assert [r["file_path"] for r in kept] == [other] + [page] * 4
+    assert [r["text"] for r in kept[1:]] == ingest.chunk_text(long_text(450, " edited"))
+
+
+def test_plan_keep_prefers_newest_row_per_uid():
+    def row(uid, text, fp="f"):
+        obj = {"uid": uid, "file_path": fp, "text": text}
+        return (json.dumps(obj).encode() + b"\n", obj)
+
+    rows = [row("a", "old"), row("b", "x"), (b"not json\n", None), row("a", "new"), row("c", "gone")]
+    keep = compact.plan_keep(rows, {"f": {"a", "b"}})
+    assert keep == [False, True, False, True, False]
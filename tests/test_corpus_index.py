@@ -0,0 +1,95 @@
+"""
+倒排索引分段格式：增量只追加新分段、读取侧合并后与全量重建一致、分段过多时合并重写。
+"""
+
+import json
+import shutil
+
+from core import corpus_index
+from core.corpus_index import index_path_for, load_fresh_index, load_stats, segments_dir_for, sync_index
+
+
+def _append(path, texts, start=0):
+    with open(path, "a", encoding="utf-8") as f:
+        for i, text in enumerate(texts, start):
+            f.write(json.dumps({"uid": f"u{i}", "text": text}, ensure_ascii=False) + "\n")
+
+
+def _rebuilt(tmp_path, corpus):
+    """
+    把同一份 corpus 复制到别处一次性建索引，作为对照。
+    """
+    ref = tmp_path / "ref" / "corpus.jsonl"
+    ref.parent.mkdir()
+    shutil.copyfile(corpus, ref)
+    sync_index(ref)
+    return load_fresh_index(ref), load_stats(ref)
+
+
+def _segments(corpus):
+    return json.loads(index_path_for(corpus).read_text(encoding="utf-8"))["segments"]
+
+
+def test_append_writes_new_segment_without_touching_old_ones(tmp_path):
+    corpus = tmp_path / "corpus.jsonl"
+    _append(corpus, ["仓位 风险 策略", "bitcoin trend framework", ""])
+    assert sync_index(corpus)["rebuilt"] is True
+    first = _segments(corpus)[0]
+    seg_path = segments_dir_for(corpus) / first["file"]
+    before = (seg_path.stat().st_mtime_ns, seg_path.read_bytes())
+
+    assert load_fresh_index(corpus) is not None  # 预热读取侧缓存
+    _append(corpus, ["止损 原则 仓位", "bitcoin 仓位"], start=3)
+    res = sync_index(corpus)
+
+    assert res["rebuilt"] is False and res["added_lines"] == 2 and res["segments"] == 2
+    assert (seg_path.stat().st_mtime_ns, seg_path.read_bytes()) == before
+    assert _segments(corpus)[1]["first_doc"] == 3
+
+    idx = load_fresh_index(corpus)
+    ref_idx, ref_stats = _rebuilt(tmp_path, corpus)
+    assert idx.docs == ref_idx.docs
+    assert idx.postings == ref_idx.postings
+    assert idx.unique_uids is True
+    stats = load_stats(corpus)
+    assert (stats.n_docs, stats.total_tokens, stats.df) == (ref_stats.n_docs, ref_stats.total_tokens, ref_stats.df)
+    assert abs(stats.avgdl - ref_stats.avgdl) < 1e-9
+
+
+def test_segments_merge_past_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(corpus_index, "MAX_SEGMENTS", 3)
+    corpus = tmp_path / "corpus.jsonl"
+    _append(corpus, ["仓位 风险"])
+    sync_index(corpus)
+    for i in range(1, 4):
+        _append(corpus, [f"复盘 word{i}"], start=i)
+        sync_index(corpus)
+
+    segs = _segments(corpus)
+    assert len(segs) == 1 and segs[0]["n_docs"] == 4
+    assert sorted(p.name for p in segments_dir_for(corpus).iterdir()) == [segs[0]["file"]]
+
+    ref_idx, _ = _rebuilt(tmp_path, corpus)
+    idx = load_fresh_index(corpus)
+    assert idx.docs == ref_idx.docs and idx.postings == ref_idx.postings
+
+
+def test_duplicate_uid_in_new_segment_clears_unique_flag(tmp_path):
+    corpus = tmp_path / "corpus.jsonl"
+    _append(corpus, ["仓位 风险", "复盘 止损"])
+    assert sync_index(corpus)["unique_uids"] is True
+    _append(corpus, ["仓位 again"], start=1)
+    assert sync_index(corpus)["unique_uids"] is False
+    assert load_fresh_index(corpus).unique_uids is False
+
+
+def test_missing_segment_triggers_rebuild(tmp_path):
+    corpus = tmp_path / "corpus.jsonl"
+    _append(corpus, ["仓位 风险"])
+    sync_index(corpus)
+    _append(corpus, ["复盘 止损"], start=1)
+    sync_index(corpus)
+    (segments_dir_for(corpus) / _segments(corpus)[1]["file"]).unlink()
+
+    assert sync_index(corpus)["rebuilt"] is True
+    assert len(_segments(corpus)) == 1 and len(load_fresh_index(corpus).docs) == 2
@@ -0,0 +1,52 @@
+"""
+超时步骤的线程无法强杀：下游步骤不能与仍在后台运行的超时依赖并发。
+"""
+
+import threading
+import time
+
+from infra.dag import Step, run_dag
+
+
+def test_step_skipped_while_timed_out_dep_still_running():
+    release = threading.Event()
+    ran = []
+    steps = [
+        Step("sync", lambda: release.wait(5), timeout=0.05),
+        Step("ingest", lambda: ran.append("ingest"), deps=("sync",)),
+        Step("profile", lambda: ran.append("profile"), deps=("ingest",), strict=True),
+    ]
+    try:
+        records = run_dag(steps)
+    finally:
+        release.set()
+    assert [records[n]["status"] for n in ("sync", "ingest", "profile")] == ["timeout", "skipped", "skipped"]
+    assert ran == []
+
+
+def test_step_runs_once_timed_out_dep_has_finished():
+    timed_out = threading.Event()
+    release = threading.Event()
+    finished = threading.Event()
+
+    def _slow_sync():
+        release.wait(5)
+        finished.set()
+
+    def _other_sync():
+        timed_out.wait(5)
+        release.set()  # 超时的 sync 在另一个依赖结束前跑完
+        finished.wait(5)
+        time.sleep(0.05)
+
+    def _log(line):
+        if line.startswith("step.timeout sync"):
+            timed_out.set()
+
+    steps = [
+        Step("sync", _slow_sync, timeout=0.05),
+        Step("other", _other_sync),
+        Step("ingest", lambda: "done", deps=("sync", "other")),
+    ]
+    records = run_dag(steps, log=_log)
+    assert [records[n]["status"] for n in ("sync", "other", "ingest")] == ["timeout", "ok", "ok"]
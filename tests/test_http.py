@@ -0,0 +1,175 @@
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from infra import http as http_mod
+from infra.http import HttpClient, RateLimiter
+
+
+class _Stub:
+    """
+    本地 HTTP 桩：每个路径按脚本依次返回 (status, headers)，脚本用完后一直返回最后一项。
+    """
+
+    def __init__(self):
+        self.scripts = {}
+        self.calls = {}
+        self.times = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.times.append(time.monotonic())
+                n = stub.calls.get(self.path, 0)
+                stub.calls[self.path] = n + 1
+                script = stub.scripts.get(self.path) or [(200, {})]
+                status, headers = script[min(n, len(script) - 1)]
+                body = f"{status}".encode()
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self.thread.start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    s = _Stub()
+    yield s
+    s.close()
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """
+    记录重试前的 sleep 时长而不真的等待（只替换 infra.http 里的 time.sleep）。
+    """
+    out = []
+
+    class _Time:
+        monotonic = staticmethod(time.monotonic)
+        perf_counter = staticmethod(time.perf_counter)
+        time = staticmethod(time.time)
+
+        @staticmethod
+        def sleep(s):
+            out.append(float(s))
+
+    monkeypatch.setattr(http_mod, "time", _Time)
+    return out
+
+
+def _client(**kw):
+    kw.setdefault("max_retries", 3)
+    kw.setdefault("backoff_base", 0.01)
+    kw.setdefault("backoff_max", 60.0)
+    kw.setdefault("timeout", 5.0)
+    return HttpClient(**kw)
+
+
+def test_429_retry_after_seconds(stub, delays):
+    stub.scripts["/a"] = [(429, {"Retry-After": "7"}), (200, {})]
+    resp = _client().get(stub.base + "/a")
+    assert resp.status_code == 200
+    assert stub.calls["/a"] == 2
+    assert delays == [7.0]
+
+
+def test_429_retry_after_http_date(stub, delays):
+    stub.scripts["/d"] = [(429, {"Retry-After": formatdate(time.time() + 30, usegmt=True)}), (200, {})]
+    resp = _client().get(stub.base + "/d")
+    assert resp.status_code == 200
+    assert len(delays) == 1 and 28.0 <= delays[0] <= 31.0
+
+
+def test_retry_after_is_capped_by_backoff_max(stub, delays):
+    stub.scripts["/cap"] = [(429, {"Retry-After": "3600"}), (200, {})]
+    assert _client(backoff_max=5.0).get(stub.base + "/cap").status_code == 200
+    assert delays == [5.0]
+
+
+def test_5xx_retries_until_exhausted(stub, delays):
+    stub.scripts["/e"] = [(503, {})]
+    client = _client(max_retries=3)
+    resp = client.get(stub.base + "/e")
+    assert resp.status_code == 503
+    assert stub.calls["/e"] == 4  # 首次 + 3 次重试
+    assert len(delays) == 3
+    # 指数退避：base * 2^attempt + [0, base) 抖动
+    for attempt, d in enumerate(delays):
+        assert 0.01 * 2 ** attempt <= d < 0.01 * 2 ** attempt + 0.01
+    m = client.metrics()["127.0.0.1"]
+    assert m["requests"] == 4 and m["retries"] == 3 and m["status"] == {"503": 4}
+
+
+def test_4xx_is_not_retried(stub, delays):
+    stub.scripts["/nf"] = [(404, {})]
+    stub.scripts["/bad"] = [(400, {})]
+    client = _client()
+    assert client.get(stub.base + "/nf").status_code == 404
+    assert client.get(stub.base + "/bad").status_code == 400
+    assert stub.calls == {"/nf": 1, "/bad": 1}
+    assert delays == []
+
+
+def test_connection_error_retries_then_raises(delays):
+    import socket
+
+    import requests
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]  # 关闭后无人监听
+    with pytest.raises(requests.ConnectionError):
+        _client(max_retries=2).get(f"http://127.0.0.1:{port}/")
+    assert len(delays) == 2
+
+
+def test_rate_limiter_spaces_requests(stub):
+    client = _client(rate_limits={"127.0.0.1": 20.0})
+    t0 = time.monotonic()
+    for _ in range(6):
+        assert client.get(stub.base + "/r").status_code == 200
+    elapsed = time.monotonic() - t0
+    # 20 次/秒、burst=1：首个请求立即发出，第 k 个请求最早在 k × 50ms 后到达
+    # （逐个间隔会受服务端收包抖动影响，只断言累计下限）
+    assert elapsed >= 5 * 0.05 * 0.9
+    assert all(t - t0 >= k * 0.05 * 0.9 for k, t in enumerate(stub.times))
+
+
+def test_rate_limiter_is_shared_across_threads():
+    limiter = RateLimiter(50.0, burst=2)
+    stamps = []
+    lock = threading.Lock()
+
+    def _worker():
+        for _ in range(5):
+            limiter.acquire()
+            with lock:
+                stamps.append(time.monotonic())
+
+    t0 = time.monotonic()
+    threads = [threading.Thread(target=_worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 20 个令牌：先用掉 burst 的 2 个，其余 18 个按 50/s 发放
+    assert len(stamps) == 20
+    assert time.monotonic() - t0 >= 18 / 50.0 * 0.9
@@ -0,0 +1,117 @@
+import json
+import os
+
+import pytest
+
+from scripts import compact, ingest, profile_update
+from tests.helpers import long_text, write_raw
+
+
+def _write_lines(path, lengths):
+    with open(path, "w", encoding="utf-8") as f:
+        for i, n in enumerate(lengths):
+            f.write(str(i % 10) * (n - 1) + "\n")
+
+
+def _cursor(path, last_line):
+    st = os.stat(path)
+    with open(path, "rb") as f:
+        offset = sum(len(raw) for _, raw in zip(range(last_line), f))
+    return {"last_line": last_line, "corpus_offset": offset, "corpus_inode": int(st.st_ino), "corpus_size": int(st.st_size)}
+
+
+def test_byte_cursor_used_while_corpus_only_grows(workdir):
+    path = workdir / profile_update.CORPUS_PATH
+    _write_lines(path, [10, 10, 10])
+    state = _cursor(path, 2)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("x" * 9 + "\n")
+    assert profile_update._resolve_cursor(state, os.stat(path)) == (20, 2)
+
+
+def test_truncate_and_regrow_same_inode_relocates_by_line(workdir):
+    path = workdir / profile_update.CORPUS_PATH
+    _write_lines(path, [10, 10, 10, 10])
+    state = _cursor(path, 3)  # offset 30，size 40
+    ino = os.stat(path).st_ino
+
+    # 原地截断后重新长出更短的行：offset 30 仍然落在行首，但文件比记录的 corpus_size 短
+    with open(path, "r+", encoding="utf-8") as f:
+        f.truncate(0)
+    with open(path, "a", encoding="utf-8") as f:
+        for n in (5, 5, 5, 15):
+            f.write("y" * (n - 1) + "\n")
+    st = os.stat(path)
+    assert st.st_ino == ino and st.st_size < state["corpus_size"]
+    assert profile_update._at_line_start(str(path), 30)
+    assert profile_update._resolve_cursor(state, st) == (15, 3)
+
+
+def test_offset_beyond_end_relocates_by_line(workdir):
+    path = workdir / profile_update.CORPUS_PATH
+    _write_lines(path, [10, 10])
+    state = {"last_line": 1, "corpus_offset": 50, "corpus_inode": int(os.stat(path).st_ino), "corpus_size": 20}
+    assert profile_update._resolve_cursor(state, os.stat(path)) == (10, 1)
+
+
+def test_compact_relocates_profile_cursor(workdir):
+    p = write_raw(workdir, "notion/page.md", long_text(450))
+    write_raw(workdir, "notion/other.md", "another note " * 10)
+    ingest.ingest()
+    corpus = workdir / ingest.OUT_CORPUS
+
+    # 画像已消费到当前末尾；之后文件改动追加新行、compact 删掉旧版本
+    with open(profile_update.PROFILE_STATE, "w", encoding="utf-8") as f:
+        json.dump(_cursor(corpus, 5), f)
+    p.write_text(long_text(100), encoding="utf-8")
+    ingest.ingest()
+    with open(corpus, "rb") as f:
+        unread = f.readlines()[5:]
+    compact.compact()
+
+    with open(profile_update.PROFILE_STATE, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    st = os.stat(corpus)
+    assert state["corpus_inode"] == st.st_ino and state["corpus_size"] == st.st_size
+    start, last_line = profile_update._resolve_cursor(state, st)
+    assert last_line == 1  # 已消费的 5 行里只有 other.md 那一行被保留
+    with open(corpus, "rb") as f:
+        f.seek(start)
+        assert f.readlines() == unread  # 未消费的行原样保留在游标之后
+
+
+def _stale_state(path):
+    state = _cursor(path, 2)
+    state["corpus_inode"] += 1  # 模拟 corpus 被外部改写
+    with open(profile_update.PROFILE_STATE, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+
+def test_batched_run_resolves_cursor_once(workdir, monkeypatch, capsys):
+    path = workdir / profile_update.CORPUS_PATH
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(4):
+            f.write(json.dumps({"uid": f"u{i}", "source": "notion", "text": f"note {i}"}) + "\n")
+    _stale_state(path)
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    monkeypatch.setenv("SB_PROFILE_MAP_REDUCE", "1")
+
+    class _Stop(Exception):
+        pass
+
+    def _no_llm():
+        raise _Stop()
+
+    monkeypatch.setattr(profile_update, "_get_llm", _no_llm)
+    with pytest.raises(_Stop):
+        profile_update.update_user_profile()
+    assert capsys.readouterr().out.count("corpus 已被重写或截断") == 1
+
+
+def test_explicit_zero_max_items_selects_nothing(workdir):
+    path = workdir / profile_update.CORPUS_PATH
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"uid": "u0", "source": "notion", "text": "note"}) + "\n")
+    chunks, cursor = profile_update._read_new_chunks(max_items=0)
+    assert chunks == [] and cursor["last_line"] == 1
+    assert len(profile_update._read_new_chunks(max_items=None)[0]) == 1
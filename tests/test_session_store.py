@@ -0,0 +1,83 @@
+import asyncio
+
+from infra.session_store import SessionStore
+
+
+class _Brain:
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.mode = "friend"
+        self.history = []
+
+    def export_history(self):
+        return list(self.history)
+
+    def import_history(self, messages):
+        self.history = list(messages)
+
+
+def test_inflight_session_is_not_evicted_until_released():
+    async def _run():
+        store = SessionStore(_Brain, max_sessions=1)
+        lock1 = store.lock_for(1)
+        async with lock1:
+            store.get(1)
+            # chat 2 在 chat 1 的一轮处理中途到来：超额，但 chat 1 仍在途
+            lock2 = store.lock_for(2)
+            async with lock2:
+                store.get(2)
+            store.release(2)
+            # 超额时跳过在途的 chat 1（虽然它最久未用），淘汰已处理完的 chat 2
+            assert store.stats()["sessions"] == 1
+            assert store.lock_for(1) is lock1  # 排队中的第二条消息拿到同一把锁
+        store.release(1)
+        store.evict()
+        assert store.stats()["evictions"] == 1  # 还有一条在途，仍不淘汰
+        store.release(1)
+        store.lock_for(3)
+        store.release(3)
+        # 两条都处理完后 chat 1 成为淘汰对象，chat 2、chat 1 各淘汰一次
+        assert store.stats()["sessions"] == 1
+        assert store.stats()["evictions"] == 2
+
+    asyncio.run(_run())
+
+
+def test_get_never_evicts_from_executor_thread():
+    async def _run():
+        store = SessionStore(_Brain, max_sessions=1)
+        loop = asyncio.get_running_loop()
+        for cid in (1, 2, 3):
+            store.lock_for(cid)
+            await loop.run_in_executor(None, store.get, cid)
+        assert store.stats()["sessions"] == 3
+        for cid in (1, 2, 3):
+            store.release(cid)
+        assert store.stats()["sessions"] == 1
+
+    asyncio.run(_run())
+
+
+def test_spilled_history_is_restored(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("SB_TELEMETRY", "1")
+
+    async def _run():
+        store = SessionStore(_Brain, max_sessions=1, spill_dir=tmp_path)
+        store.lock_for(1)
+        store.get(1).history = [{"role": "user", "content": "hi"}]
+        store.release(1)
+        store.lock_for(2)
+        store.get(2)
+        store.release(2)  # chat 1 被淘汰并落盘
+        assert (tmp_path / "session_1.json").exists()
+
+        store.lock_for(1)
+        brain = store.get(1)
+        store.release(1)
+        assert brain.history == [{"role": "user", "content": "hi"}]
+        assert store.stats()["rehydrated"] == 1
+
+    asyncio.run(_run())
+    out = capsys.readouterr().out
+    assert "session store evict: sessions=1 loaded=1 hits=0 misses=2 evictions=1 expired=0 spilled=1 rehydrated=0" in out
+    assert "session store rehydrate:" in out and "rehydrated=1" in out
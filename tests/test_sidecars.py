@@ -0,0 +1,186 @@
+"""
+旁路存储（倒排索引 / 列存 / CSR 矩阵 / 结果缓存）必须与直接扫 corpus.jsonl 的结果一致：
+首次 ingest、增量追加、崩溃截断恢复、compact 重写之后都要成立。
+"""
+
+import json
+import shutil
+from datetime import datetime, timezone
+
+import pytest
+
+from core.corpus_columns import load_fresh_columns
+from core.corpus_index import index_path_for, load_fresh_index
+from core.corpus_matrix import load_fresh_matrix, matrix_dir_for
+from core.retrieval import retrieve_from_corpus
+from scripts import compact, ingest
+from tests.helpers import long_text, write_raw
+
+NOW = datetime(2025, 12, 22, tzinfo=timezone.utc)
+
+QUERIES = ["仓位 风险 策略", "复盘 止损 原则", "bitcoin trend framework", "word120 word121 word300"]
+
+NOTES = {
+    "notion/2025-12-01 仓位.md": "仓位管理原则：单笔风险不超过 1%，因为连续亏损会放大回撤。策略是先定止损再定仓位。",
+    "notion/2025-12-05 复盘.md": "本周复盘：止损执行不到位，原则被情绪打破。下周只做趋势策略，降低仓位。",
+    "notion/2025-12-10 framework.md": "My framework for bitcoin: trend first, because mean reversion fails in strong trends. "
+    "Therefore the rule is to size down when volatility expands.",
+    "notion/long.md": long_text(450),
+    "x/alice/1.json": json.dumps([
+        {"id": "1", "text": "bitcoin trend is up, I think the framework still holds", "created_at": "2025-12-20T08:00:00Z"},
+        {"id": "2", "text": "风险控制第一，仓位第二，策略第三", "created_at": "2025-12-21T08:00:00Z"},
+    ], ensure_ascii=False),
+}
+
+
+@pytest.fixture
+def corpus(workdir, monkeypatch):
+    monkeypatch.setenv("SB_RETRIEVAL_CACHE", "0")
+    for rel, text in NOTES.items():
+        write_raw(workdir, rel, text)
+    ingest.ingest()
+    return workdir / ingest.OUT_CORPUS
+
+
+def _key(hits):
+    return [(h.uid, h.text, round(h.base_similarity, 9), round(h.final_score, 9)) for h in hits]
+
+
+def _retrieve(path, query):
+    return _key(retrieve_from_corpus(corpus_path=path, query=query, top_k=5, max_scan=10000, now=NOW))
+
+
+def _plain(corpus_path, tmp_path, query):
+    """
+    同一份 corpus 拷到没有任何旁路文件的目录里，强制走逐行扫描。
+    """
+    plain = tmp_path / "plain" / "corpus.jsonl"
+    plain.parent.mkdir(exist_ok=True)
+    shutil.copyfile(corpus_path, plain)
+    return _retrieve(plain, query)
+
+
+def _jsonl_rows(corpus_path):
+    out = []
+    offset = 0
+    with open(corpus_path, "rb") as f:
+        for raw in f:
+            out.append((offset, json.loads(raw)))
+            offset += len(raw)
+    return out
+
+
+def _assert_sidecars_match_jsonl(corpus_path):
+    rows = _jsonl_rows(corpus_path)
+    idx = load_fresh_index(corpus_path)
+    cols = load_fresh_columns(corpus_path)
+    mat = load_fresh_matrix(corpus_path)
+    assert idx is not None and cols is not None and mat is not None
+    assert len(idx.docs) == cols.n == mat.n == len(rows)
+    for i, (offset, obj) in enumerate(rows):
+        assert idx.docs[i][0] == offset and idx.docs[i][1] == obj["uid"]
+        assert cols.uid(i) == obj["uid"]
+    uids = [obj["uid"] for _, obj in rows]
+    assert idx.unique_uids is mat.unique_uids is (len(set(uids)) == len(uids))
+
+
+def _assert_paths_match_plain(corpus_path, tmp_path):
+    """
+    索引路径、列存+CSR 扫描、仅列存扫描三条路径都与纯 JSONL 扫描一致。
+    """
+    expected = {q: _plain(corpus_path, tmp_path, q) for q in QUERIES}
+    assert any(expected.values())
+    for q in QUERIES:
+        assert _retrieve(corpus_path, q) == expected[q], q
+
+    hidden = []
+    for p in (index_path_for(corpus_path), matrix_dir_for(corpus_path)):
+        moved = p.with_name(p.name + ".off")
+        p.rename(moved)
+        hidden.append((moved, p))
+        for q in QUERIES:
+            assert _retrieve(corpus_path, q) == expected[q], (q, p.name)
+    for moved, p in hidden:
+        moved.rename(p)
+
+
+def test_sidecars_match_jsonl_after_ingest(corpus, tmp_path):
+    _assert_sidecars_match_jsonl(corpus)
+    _assert_paths_match_plain(corpus, tmp_path)
+
+
+def test_sidecars_match_jsonl_after_append(corpus, workdir, tmp_path):
+    write_raw(workdir, "notion/2025-12-05 复盘.md", NOTES["notion/2025-12-05 复盘.md"] + " 补充：仓位过重。")
+    write_raw(workdir, "notion/long.md", long_text(450, " word300 extra"))
+    write_raw(workdir, "notion/2025-12-21 新.md", "新的策略框架：趋势 + 风险预算，止损放宽但仓位更小。")
+    before = load_fresh_columns(corpus).n
+    res = ingest.ingest()
+    assert res["added_chunks"] == 3
+    assert load_fresh_columns(corpus).n == before + 3
+    _assert_sidecars_match_jsonl(corpus)
+    _assert_paths_match_plain(corpus, tmp_path)
+
+
+def test_sidecars_match_jsonl_after_recovery_truncation(corpus, workdir, tmp_path, monkeypatch):
+    write_raw(workdir, "notion/2025-12-21 新.md", "新的策略框架：趋势 + 风险预算，止损放宽但仓位更小。")
+
+    # 崩溃：corpus 已追加、state 未提交；期间有人把旁路存储同步到了未提交的尾部
+    def _crash(state):
+        raise RuntimeError("crash before state commit")
+
+    with monkeypatch.context() as m:
+        m.setattr(ingest, "save_state", _crash)
+        with pytest.raises(RuntimeError):
+            ingest.ingest()
+    ingest.rebuild_sidecars()
+    assert load_fresh_index(corpus) is not None
+
+    res = ingest.ingest()
+    assert res["recovered_bytes"] > 0 and res["added_chunks"] == 1
+    _assert_sidecars_match_jsonl(corpus)
+    _assert_paths_match_plain(corpus, tmp_path)
+
+
+def test_sidecars_match_jsonl_after_compact(corpus, workdir, tmp_path):
+    write_raw(workdir, "notion/long.md", long_text(450, " word300 extra"))
+    write_raw(workdir, "notion/2025-12-05 复盘.md", "重写后的复盘：止损原则执行良好。")
+    ingest.ingest()
+    res = compact.compact()
+    assert res["lines_after"] < res["lines_before"]
+    _assert_sidecars_match_jsonl(corpus)
+    _assert_paths_match_plain(corpus, tmp_path)
+
+
+def test_many_sources_stay_valid_rows(workdir, tmp_path, monkeypatch):
+    monkeypatch.setenv("SB_RETRIEVAL_CACHE", "0")
+    corpus = workdir / ingest.OUT_CORPUS
+    with open(corpus, "w", encoding="utf-8") as f:
+        for i in range(300):
+            row = {"uid": f"u{i}", "source": f"src{i}", "text": f"仓位 风险 策略 第{i}条 word{i}", "created_at": "2025-12-01T00:00:00Z"}
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    ingest.rebuild_sidecars()
+
+    cols = load_fresh_columns(corpus)
+    assert all(cols.is_valid(i) for i in range(cols.n))
+    assert [cols.source_name(i) for i in (0, 255, 299)] == ["src0", "src255", "src299"]
+    _assert_sidecars_match_jsonl(corpus)
+    assert any(h[0] == "u299" for h in _retrieve(corpus, "word299"))
+    _assert_paths_match_plain(corpus, tmp_path)
+
+
+def test_retrieval_cache_never_serves_stale_results(corpus, workdir, tmp_path, monkeypatch):
+    monkeypatch.setenv("SB_RETRIEVAL_CACHE", "1")
+    q = "仓位 风险 策略"
+    first = _retrieve(corpus, q)
+    assert _retrieve(corpus, q) == first  # 命中缓存
+
+    write_raw(workdir, "notion/2025-12-21 新.md", "仓位 风险 策略：新的仓位与风险策略。")
+    ingest.ingest()
+    after_append = _retrieve(corpus, q)
+    assert after_append != first
+    assert after_append == _plain(corpus, tmp_path, q)
+
+    write_raw(workdir, "notion/2025-12-21 新.md", "与检索词无关的内容。")
+    ingest.ingest()
+    compact.compact()
+    assert _retrieve(corpus, q) == _plain(corpus, tmp_path, q) == first
@@ -0,0 +1,107 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core.weighting import compute_cog_weight, compute_cog_weight_batch, score_time, score_time_batch
+
+np = pytest.importorskip("numpy")
+
+NOW = datetime(2025, 12, 22, 12, 0, tzinfo=timezone.utc)
+
+
+def _to_epoch(ts):
+    """
+    列存口径：能解析的时间 -> epoch 秒，缺失/无法解析 -> NaN（批量版按“缺失”处理）。
+    """
+    if isinstance(ts, str):
+        try:
+            ts = datetime.fromisoformat(ts.strip().replace("Z", "+00:00"))
+        except Exception:
+            return math.nan
+    if not isinstance(ts, datetime):
+        return math.nan
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+TIMESTAMPS = [
+    None,
+    "",
+    "   ",
+    "not a date",
+    12345,
+    NOW,
+    NOW + timedelta(days=2),  # 未来时间 -> age=0
+    (NOW + timedelta(hours=5)).isoformat(),
+    NOW - timedelta(days=1),
+    (NOW - timedelta(days=3)).isoformat().replace("+00:00", "Z"),
+    (NOW - timedelta(days=6)).replace(tzinfo=None),  # naive 视为 UTC
+    NOW - timedelta(days=15),  # 窗口边界本身（<= 窗口算窗口内）
+    NOW - timedelta(days=15, seconds=1),
+    NOW - timedelta(days=14, hours=23, minutes=59),
+    NOW - timedelta(days=7),
+    NOW - timedelta(days=400),
+]
+
+CONFIGS = [
+    (15.0, 3.0, 0.05),
+    (15.0, 3.0, 0.0),
+    (15.0, 3.0, 1.5),  # floor 超过 1 -> clamp 到 1
+    (15.0, 3.0, -0.5),  # floor 为负 -> clamp 到 0
+    (7.0, 2.0, 0.3),
+    (0.0, 3.0, 0.2),  # 窗口 <= 0 -> 全局 floor
+    (10.0, 0.0, 0.3),  # 半衰期非法 -> 窗口内 1，窗口外 floor
+    (10.0, -1.0, 0.3),
+]
+
+
+@pytest.mark.parametrize("window,half_life,floor", CONFIGS)
+def test_score_time_batch_matches_scalar(window, half_life, floor):
+    expected = [
+        score_time(ts, now=NOW, window_days=window, half_life_days=half_life, floor=floor) for ts in TIMESTAMPS
+    ]
+    epochs = np.array([_to_epoch(ts) for ts in TIMESTAMPS], dtype=np.float64)
+    got = score_time_batch(epochs, NOW, window_days=window, half_life_days=half_life, floor=floor)
+    assert got.shape == (len(TIMESTAMPS),)
+    np.testing.assert_allclose(got, expected, rtol=1e-12, atol=0.0)
+
+
+def test_score_time_batch_window_edge_and_missing():
+    epochs = np.array([
+        math.nan,
+        (NOW - timedelta(days=15)).timestamp(),
+        (NOW - timedelta(days=15, seconds=1)).timestamp(),
+        (NOW + timedelta(days=1)).timestamp(),
+    ])
+    got = score_time_batch(epochs, NOW, window_days=15.0, half_life_days=3.0, floor=0.05)
+    assert got[0] == 1.0
+    assert got[1] == pytest.approx(2.0 ** -5)
+    assert got[2] == 0.05
+    assert got[3] == 1.0
+
+
+def test_score_time_batch_accepts_epoch_and_naive_now():
+    epochs = np.array([(NOW - timedelta(days=3)).timestamp()])
+    a = score_time_batch(epochs, NOW)
+    b = score_time_batch(epochs, NOW.timestamp())
+    c = score_time_batch(epochs, NOW.replace(tzinfo=None))
+    assert a[0] == b[0] == c[0] == pytest.approx(0.5)
+
+
+DEPTHS = [-0.5, 0.0, 0.1, 0.3, 0.5, 0.77, 1.0, 1.8, math.nan]
+
+
+@pytest.mark.parametrize("alpha", [0.0, None, 0.5, 1.0, -2.0, 8.0])
+def test_compute_cog_weight_batch_matches_scalar(alpha):
+    expected = [compute_cog_weight(d, alpha=alpha) for d in DEPTHS]
+    got = compute_cog_weight_batch(DEPTHS, alpha=alpha)
+    np.testing.assert_allclose(got, expected, rtol=1e-12, atol=0.0)
+
+
+def test_compute_cog_weight_batch_alpha_zero_and_floor():
+    finite = [d for d in DEPTHS if not math.isnan(d)]
+    assert compute_cog_weight_batch(finite, alpha=0.0).tolist() == [1.0] * len(finite)
+    # alpha=8：depth 0 -> 1 - 4 = -3，落到下限 0.1
+    assert compute_cog_weight_batch([0.0, 1.0], alpha=8.0).tolist() == [0.1, 5.0]